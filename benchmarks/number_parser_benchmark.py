@@ -0,0 +1,73 @@
+"""
+Compares NumberParser with the previous string_to_float, which set the process-wide locale for every value and
+converted it with locale.atof. Run from the project root:
+
+    python -m benchmarks.number_parser_benchmark
+
+The previous implementation needs the en_US.UTF-8 locale. If it isn't installed, pass another locale with --locale,
+in which case its results are only useful for timing
+"""
+import argparse
+import locale
+import random
+import timeit
+
+from rescape_region.helpers.sankey_helpers import number_parser
+
+
+def locale_string_to_float(locale_name):
+    """
+        Creates the previous implementation of string_to_float for the given locale
+    :param locale_name: The locale, en_US.UTF-8 originally
+    :return: The function
+    """
+
+    def string_to_float(flt):
+        locale.setlocale(locale.LC_NUMERIC, locale_name)
+        try:
+            return locale.atof(flt)
+        except (TypeError, ValueError):
+            return None
+
+    return string_to_float
+
+
+def create_values(count):
+    """
+        Creates values like those of the sample resources, e.g. '22,469,843' and '63.08'
+    :param count: The number of values
+    :return: The values
+    """
+    random.seed(count)
+    return [
+        f'{random.randint(0, 50000000):,}' if i % 4 else f'{random.random() * 1000:,.2f}'
+        for i in range(count)
+    ]
+
+
+def benchmark(count, repeat, locale_name):
+    values = create_values(count)
+    parser = number_parser()
+    string_to_float = locale_string_to_float(locale_name)
+    return dict(
+        values=count,
+        locale=min(timeit.repeat(lambda: [string_to_float(value) for value in values], number=1, repeat=repeat)),
+        parse=min(timeit.repeat(lambda: [parser.parse(value) for value in values], number=1, repeat=repeat)),
+        parse_column=min(timeit.repeat(lambda: parser.parse_column(values), number=1, repeat=repeat))
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--values', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--locale', default='en_US.UTF-8')
+    args = parser.parse_args()
+
+    print(f"{'values':>8} {'locale (s)':>11} {'parse (s)':>10} {'parse_column (s)':>17} {'speedup':>8}")
+    for count in args.values:
+        result = benchmark(count, args.repeat, args.locale)
+        print(
+            f"{result['values']:>8} {result['locale']:>11.4f} {result['parse']:>10.4f} "
+            f"{result['parse_column']:>17.4f} {result['locale'] / result['parse_column']:>7.1f}x"
+        )
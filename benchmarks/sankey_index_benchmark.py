@@ -0,0 +1,84 @@
+"""
+Compares index_sankey_graph with the previous implementation, which searched the node list for the source and target
+of every link. Run from the project root:
+
+    python -m benchmarks.sankey_index_benchmark
+"""
+import argparse
+import math
+import timeit
+
+from rescape_python_helpers import ramda as R
+
+from rescape_region.helpers.sankey_helpers import index_sankey_graph
+
+
+def index_sankey_graph_by_search(graph):
+    """
+        The previous implementation of index_sankey_graph, which is O(links * nodes)
+    :param graph:
+    :return:
+    """
+    nodes = R.prop('nodes', graph)
+    for (i, node) in enumerate(nodes):
+        node['node_index'] = i
+    for link in R.prop('links', graph):
+        link['source'] = nodes.index(R.prop('source_node', link))
+        link['target'] = nodes.index(R.prop('target_node', link))
+
+
+def create_synthetic_graph(link_count):
+    """
+        Creates a two stage graph with a link between every source and target, like create_links does
+        for consecutive stages
+    :param link_count: The approximate number of links
+    :return: dict with nodes and links
+    """
+    stage_size = max(1, int(math.sqrt(link_count)))
+
+    def create_node(stage, i):
+        return dict(
+            value=float(i),
+            type='Feature',
+            geometry=dict(type='Point', coordinates=[4.3517, 50.8503]),
+            name=f'{stage} {i}',
+            isGeneralized=True,
+            properties=['material', 'siteName', 'junctionStage'],
+            propertyValues=['Minerals', f'{stage} {i}', stage]
+        )
+
+    sources = [create_node('Source', i) for i in range(stage_size)]
+    targets = [create_node('Sink', i) for i in range(stage_size)]
+    return dict(
+        nodes=sources + targets,
+        links=[
+            dict(source_node=source, target_node=target, value=source['value'])
+            for source in sources for target in targets
+        ]
+    )
+
+
+def benchmark(link_count, repeat):
+    graph = create_synthetic_graph(link_count)
+    results = dict(
+        links=len(graph['links']),
+        nodes=len(graph['nodes']),
+        by_identity=min(timeit.repeat(lambda: index_sankey_graph(graph), number=1, repeat=repeat)),
+        by_search=min(timeit.repeat(lambda: index_sankey_graph_by_search(graph), number=1, repeat=repeat))
+    )
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'links':>8} {'nodes':>6} {'by search (s)':>14} {'by identity (s)':>16} {'speedup':>8}")
+    for link_count in args.links:
+        result = benchmark(link_count, args.repeat)
+        print(
+            f"{result['links']:>8} {result['nodes']:>6} {result['by_search']:>14.4f} {result['by_identity']:>16.4f} "
+            f"{result['by_search'] / result['by_identity']:>7.1f}x"
+        )
@@ -0,0 +1,60 @@
+"""
+Measures what a worker pays on boot to serve GraphQL: the time to import the schema modules and the time to build
+the schema with create_default_schema. Each run is a fresh interpreter, like a new worker. A second
+create_default_schema call in the same process shows the cost left once the memoized type factories are warm.
+Run from the project root:
+
+    python -m benchmarks.schema_startup_benchmark
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter and prints the timings in seconds as json
+MEASURE = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from rescape_region.schema_models import schema
+imported = time.perf_counter()
+schema.create_default_schema()
+built = time.perf_counter()
+schema.create_default_schema()
+rebuilt = time.perf_counter()
+print(json.dumps(dict(
+    django_setup=setup - start,
+    schema_import=imported - setup,
+    first_build=built - imported,
+    second_build=rebuilt - built
+)))
+'''
+
+
+def measure(settings_module):
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE],
+        env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module),
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+    # Only the last line is the timings, django.setup may log
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'settings'))
+    args = parser.parse_args()
+
+    runs = [measure(args.settings) for _ in range(args.repeat)]
+    print(f"{'phase':>14} {'median (s)':>11} {'min (s)':>9}")
+    for phase in ['django_setup', 'schema_import', 'first_build', 'second_build']:
+        timings = [run[phase] for run in runs]
+        print(f'{phase:>14} {statistics.median(timings):>11.4f} {min(timings):>9.4f}')
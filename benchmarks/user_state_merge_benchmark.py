@@ -0,0 +1,119 @@
+"""
+Compares the data merge of UpsertUserState with merge_user_state_data against the previous implementation on
+UserState documents of 1, 5 and 20MB. The previous implementation deep copied the new data, read the UserState,
+merged userRegions and userProjects by id with a deepmerge Merger, read the UserState again and deep merged the
+result into it with merge_data_fields_on_update. Reads are timed as the json decoding of the stored document, which
+dominates reading a large row. The update changes the zoom of one userRegion, as the map of the frontend does.
+Run from the project root:
+
+    python -m benchmarks.user_state_merge_benchmark
+"""
+import argparse
+import copy
+import json
+import timeit
+
+from deepmerge import Merger
+from deepmerge.strategy.dict import DictStrategies
+from deepmerge.strategy.list import ListStrategies
+from rescape_python_helpers import ramda as R
+
+from rescape_region.schema_models.user_state.user_state_merge import merge_user_state_data, \
+    user_scope_instances_by_id
+
+
+class OverrideNonNullListStrategies(ListStrategies):
+    @staticmethod
+    def strategy_override_non_null(config, path, base, nxt):
+        return nxt if nxt else base
+
+
+class OverrideNonNullMerger(Merger):
+    PROVIDED_TYPE_STRATEGIES = {
+        list: OverrideNonNullListStrategies,
+        dict: DictStrategies
+    }
+
+
+def previous_merge(stored, new_data):
+    """
+        The previous merge of UpsertUserState.mutate for an update that omits userProjects
+    :param stored: The json of the stored UserState.data
+    :param new_data: The new data
+    :return: The merged data
+    """
+    copied_new_data = copy.deepcopy(new_data)
+    old_user_state_data = json.loads(stored)
+    for user_scope_key in ['userProjects', 'userRegions']:
+        copied_new_data[user_scope_key] = R.values(R.merge_deep(
+            user_scope_instances_by_id(user_scope_key, old_user_state_data),
+            user_scope_instances_by_id(user_scope_key, copied_new_data),
+            OverrideNonNullMerger([(list, ['override_non_null']), (dict, ['merge'])], ['override'], ['override'])
+        ))
+    # fetch_and_merge read the UserState again
+    existing_data = json.loads(stored)
+    return R.merge_deep(
+        dict(data=existing_data),
+        dict(data=copied_new_data),
+        Merger([(list, ['override']), (dict, ['merge'])], ['override'], ['override'])
+    )['data']
+
+
+def structural_merge(stored, new_data):
+    return merge_user_state_data(json.loads(stored), new_data, merge_user_scopes=True)
+
+
+def create_user_state_data(size):
+    """
+        Creates UserState.data of about size bytes, with userRegions and userProjects that each have a viewport and
+        saved search locations
+    :param size: The size of the json in bytes
+    :return: The data
+    """
+
+    def user_scope(scope_key, id):
+        return {
+            scope_key: dict(id=id),
+            'mapbox': dict(viewport=dict(latitude=50.5915, longitude=2.0165, zoom=7)),
+            'userSearch': dict(userSearchLocations=[
+                dict(
+                    searchLocation=dict(id=id * 100 + i, name=f'Search location {i}'),
+                    activity=dict(isActive=i % 2 == 0),
+                    filters=dict(tags=[f'tag{j}' for j in range(10)], street=dict(nameContains=f'Street {i}'))
+                ) for i in range(20)
+            ])
+        }
+
+    data = dict(userRegions=[], userProjects=[])
+    # Each pair of user scopes is about 10KB
+    for id in range(1, size // 10000 + 1):
+        data['userRegions'].append(user_scope('region', id))
+        data['userProjects'].append(user_scope('project', id))
+    return data
+
+
+def benchmark(megabytes, repeat):
+    data = create_user_state_data(megabytes * 1000000)
+    stored = json.dumps(data)
+    new_data = dict(userRegions=[dict(region=dict(id=1), mapbox=dict(viewport=dict(zoom=15)))])
+    assert structural_merge(stored, new_data) == previous_merge(stored, new_data)
+    return dict(
+        size=len(stored) / 1000000,
+        previous=min(timeit.repeat(lambda: previous_merge(stored, new_data), number=1, repeat=repeat)),
+        structural=min(timeit.repeat(lambda: structural_merge(stored, new_data), number=1, repeat=repeat))
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megabytes', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size (MB)':>10} {'previous (s)':>13} {'structural (s)':>15} {'speedup':>8}")
+    for megabytes in args.megabytes:
+        result = benchmark(megabytes, args.repeat)
+        print(
+            f"{result['size']:>10.1f} {result['previous']:>13.4f} {result['structural']:>15.4f} "
+            f"{result['previous'] / result['structural']:>7.1f}x"
+        )
@@ -0,0 +1,169 @@
+import reversion
+from django.db import transaction, DatabaseError
+from django.db.models import JSONField
+from django.utils import timezone
+from rescape_python_helpers import ramda as R
+
+from rescape_region.helpers.unique_values import allocate_unique_props
+from rescape_region.models import Location
+from rescape_region.models.revision_mixin import REVISION_COLUMNS, next_version_numbers
+
+DEFAULT_BULK_UPSERT_CHUNK_SIZE = 500
+
+
+def editable_fields(model_class):
+    # The fields that instance data can set. The primary key only identifies the instance to update
+    return [field for field in model_class._meta.concrete_fields if field.editable and not field.primary_key]
+
+
+def update_fields(model_class, instances_data):
+    """
+        The fields that bulk_update must write for the given updates, so unchanged columns aren't rewritten
+    :param model_class: The model class
+    :param instances_data: The instance data dicts of the updates
+    :return: The list of field names
+    """
+    props = set(prop for instance_data in instances_data for prop in instance_data)
+    field_names = [
+        field.name for field in editable_fields(model_class) if field.name in props or field.attname in props
+    ]
+    if hasattr(model_class, 'geometry_update_values') and 'geojson' in props:
+        field_names.append('geometry')
+    return [*field_names, *REVISION_COLUMNS]
+
+
+def set_revision_columns(instance, now, version_numbers):
+    # What RevisionModelMixin.save maintains, which bulk_create and bulk_update bypass
+    instance.created_at = instance.created_at or getattr(instance, 'created_at_unrevisioned', None) or now
+    instance.updated_at = now
+    instance.version_number = version_numbers[str(instance.pk)] if instance.pk is not None else 1
+
+
+def prepare_instance(model_class, existing_instances, json_props, instance_data):
+    """
+        Builds the unsaved instance of an instance data dict or applies it to the existing instance
+    :param model_class: The model class
+    :param existing_instances: The existing instances of the chunk keyed by id
+    :param json_props: The json props whose values are deep merged into existing values
+    :param instance_data: The instance data. Foreign keys are given by their attname, e.g. region_id, as
+    input_type_parameters_for_update_or_create converts them. Props that aren't editable concrete fields are ignored
+    :return: The instance, with its fields validated
+    """
+    values = R.pick(R.chain(lambda field: [field.name, field.attname], editable_fields(model_class)), instance_data)
+    id = R.prop_or(None, 'id', instance_data)
+    if id is not None:
+        if id not in existing_instances:
+            raise model_class.DoesNotExist(f'{model_class.__name__} matching id {id} does not exist')
+        instance = existing_instances[id]
+        for prop, value in values.items():
+            setattr(instance, prop, R.merge_deep(getattr(instance, prop), value) if prop in json_props else value)
+    else:
+        instance = model_class(**values)
+    if hasattr(model_class, 'geometry_update_values') and (id is None or 'geojson' in values):
+        # What GeojsonGeometryMixin.save derives from the geojson
+        for prop, value in model_class.geometry_update_values(dict(geojson=instance.geojson)).items():
+            setattr(instance, prop, value)
+    # Validation that doesn't query the database. JSONFields are excluded since empty json counts as blank
+    instance.clean_fields(exclude=[
+        field.name for field in model_class._meta.concrete_fields if isinstance(field, JSONField)
+    ])
+    return instance
+
+
+def bulk_upsert_chunk(model_class, unique_props, json_props, chunk):
+    """
+        Creates and updates a chunk of instances with one query to read the existing instances, one bulk_create
+        and one bulk_update, all recorded in one revision. The unique props are allocated in the chunk's transaction,
+        so their locks are held until the instances are saved
+    :param model_class: The model class
+    :param unique_props: dict keyed by the props to make unique and valued by their additional_filter_props
+    :param json_props: The json props whose values are deep merged into existing values
+    :param chunk: A list of (index, instance_data)
+    :return: A list of (index, dict(id, key, error))
+    """
+    ids = [instance_data['id'] for _, instance_data in chunk if R.prop_or(None, 'id', instance_data) is not None]
+    prepared = []
+    errors = []
+    try:
+        with transaction.atomic(), reversion.create_revision():
+            chunk = list(zip(
+                [index for index, _ in chunk],
+                R.reduce(
+                    lambda instances_data, prop_and_filter_props: allocate_unique_props(
+                        model_class, *prop_and_filter_props, instances_data
+                    ),
+                    [instance_data for _, instance_data in chunk],
+                    list(unique_props.items())
+                )
+            ))
+            existing_instances = model_class.objects.in_bulk(ids) if ids else {}
+            for index, instance_data in chunk:
+                try:
+                    instance = prepare_instance(model_class, existing_instances, json_props, instance_data)
+                    prepared.append((index, instance))
+                except Exception as e:
+                    errors.append((index, dict(id=R.prop_or(None, 'id', instance_data), key=None, error=str(e))))
+
+            now = timezone.now()
+            version_numbers = next_version_numbers(model_class, list(existing_instances.keys()))
+            for _, instance in prepared:
+                set_revision_columns(instance, now, version_numbers)
+            created = [instance for _, instance in prepared if instance.pk is None]
+            updated = [instance for _, instance in prepared if instance.pk is not None]
+            if created:
+                # Postgres returns the primary keys of the created rows
+                model_class.objects.bulk_create(created)
+            if updated:
+                model_class.objects.bulk_update(updated, update_fields(model_class, [
+                    instance_data for _, instance_data in chunk if R.prop_or(None, 'id', instance_data) is not None
+                ]))
+            for _, instance in prepared:
+                reversion.add_to_revision(instance)
+    except DatabaseError as e:
+        # A conflicting concurrent write fails the whole chunk, whose revision is rolled back with it
+        failed_indices = set(index for index, _ in errors)
+        return errors + [
+            (index, dict(id=R.prop_or(None, 'id', instance_data), key=None, error=str(e)))
+            for index, instance_data in chunk if index not in failed_indices
+        ]
+    return errors + [
+        (index, dict(id=instance.pk, key=getattr(instance, 'key', None), error=None)) for index, instance in prepared
+    ]
+
+
+def bulk_upsert_with_revision(model_class, instances_data, unique_props=dict(key={}), json_props=['data'],
+                              chunk_size=DEFAULT_BULK_UPSERT_CHUNK_SIZE):
+    """
+        Creates the instances of instances_data without an id and updates those with an id, with a few queries per
+        chunk instead of several per instance as update_or_create_with_revision has. Each chunk's unique props are
+        allocated by allocate_unique_props and the chunk is written by bulk_create and bulk_update, all in a
+        transaction recorded as one revision. Updates deep merge the json props into the existing values, as
+        update_or_create_with_revision_and_jsonb_patch does. The revision columns and geometry that save maintains
+        are set on the instances, but since save isn't called no post_save signals are sent.
+        An invalid instance data dict doesn't stop the others. A chunk that fails in the database fails all of its rows
+    :param model_class: A RevisionModelMixin model registered with django-reversion
+    :param instances_data: dicts of field values. Mutations convert their input with
+    input_type_parameters_for_update_or_create, as the single upsert mutations do
+    :param unique_props: Default dict(key={}). The props to make unique, valued by their additional_filter_props,
+    which should match the unique_with of the field, e.g. R.pick(['deleted', 'user_id']) for Project keys
+    :param json_props: Default ['data']. The json props to deep merge on update
+    :param chunk_size: Default DEFAULT_BULK_UPSERT_CHUNK_SIZE. The number of instances written per chunk
+    :return: A list of dict(id, key, error) in the order of instances_data. error is None if the instance was saved,
+    else id is None for creates and key is None
+    """
+    indexed = list(enumerate(instances_data))
+    results = {}
+    for i in range(0, len(indexed), chunk_size):
+        results.update(dict(bulk_upsert_chunk(model_class, unique_props, json_props, indexed[i:i + chunk_size])))
+    return [results[index] for index, _ in indexed]
+
+
+def bulk_upsert_locations(locations_data, chunk_size=DEFAULT_BULK_UPSERT_CHUNK_SIZE):
+    """
+        bulk_upsert_with_revision of Locations, for imports such as of OSM locations
+    :param locations_data: dicts of Location field values. Those with an id are updates
+    :param chunk_size: Default DEFAULT_BULK_UPSERT_CHUNK_SIZE. The number of locations written per chunk
+    :return: A list of dict(id, key, error) in the order of locations_data
+    """
+    # The uniqueness of Location keys isn't scoped, as in the unique_with of raw_location_fields
+    return bulk_upsert_with_revision(Location, locations_data, unique_props=dict(key={}), chunk_size=chunk_size)
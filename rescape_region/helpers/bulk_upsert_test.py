@@ -0,0 +1,41 @@
+import pytest
+from reversion.models import Version
+from snapshottest import TestCase
+
+from rescape_region.helpers.bulk_upsert import bulk_upsert_locations
+from rescape_region.models import Location
+
+point = dict(type='Point', coordinates=[4.35, 50.85])
+
+
+@pytest.mark.django_db
+class BulkUpsertTestCase(TestCase):
+
+    def test_bulk_upsert_locations(self):
+        existing = Location.objects.create(key='grandPlace', name='Grand Place', data=dict(tags=['square']))
+
+        results = bulk_upsert_locations([
+            # Duplicate keys of the existing location and of each other are suffixed
+            dict(key='grandPlace', name='Grand Place Copy'),
+            dict(key='grandPlace', name='Grand Place Copy'),
+            dict(key='petitPlace', name='Petit Place', geojson=point),
+            # Updates deep merge data and keep their key
+            dict(id=existing.id, key='grandPlace', data=dict(tags=['market'], city='Brussels')),
+            # Row errors don't stop the other rows
+            dict(id=0, name='Missing'),
+            dict(key='noName'),
+        ], chunk_size=2)
+
+        assert [result['key'] for result in results[:4]] == ['grandPlace1', 'grandPlace2', 'petitPlace', 'grandPlace']
+        assert all(result['id'] and not result['error'] for result in results[:4])
+        assert all(result['error'] for result in results[4:])
+        assert results[3]['id'] == existing.id
+
+        existing.refresh_from_db()
+        assert existing.data == dict(tags=['square', 'market'], city='Brussels')
+        assert existing.version_number == 1
+        assert Location.objects.get(key='petitPlace').geometry is not None
+        # The chunks are each recorded as one revision
+        assert Version.objects.get_for_object(existing).count() == 1
+        assert Version.objects.get_for_object(Location.objects.get(key='grandPlace1')).first().revision_id == \
+               Version.objects.get_for_object(Location.objects.get(key='grandPlace2')).first().revision_id
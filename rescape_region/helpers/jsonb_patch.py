@@ -0,0 +1,141 @@
+import json
+
+import reversion
+from django.db import connection
+from django.db.models import Expression, F, JSONField
+from django.db.models.functions import Coalesce, Now
+from django.db.models.signals import post_save
+from rescape_graphene.graphql_helpers.schema_helpers import update_or_create_with_revision
+from rescape_python_helpers import ramda as R
+
+from rescape_region.models.revision_mixin import next_version_numbers
+
+# Postgres functions take at most 100 arguments, so the pairs of jsonb_build_object are chunked
+JSONB_BUILD_OBJECT_MAX_PAIRS = 50
+
+
+def jsonb_deep_merge_sql(existing_sql, existing_params, value, encoder=None):
+    """
+        SQL that deep merges value into the jsonb expression existing_sql with the semantics of R.merge_deep:
+        objects are merged key by key, arrays are appended to existing arrays and anything else, including a
+        value whose type differs from the existing one, replaces the existing value
+    :param existing_sql: SQL of the existing jsonb, e.g. a column, which may be NULL
+    :param existing_params: The params of existing_sql
+    :param value: The partial json value to merge in
+    :param encoder: Optional json encoder of the field
+    :return: (sql, params)
+    """
+    literal_sql = '%s::jsonb'
+    literal_params = [json.dumps(value, cls=encoder)]
+
+    if isinstance(value, list):
+        return (
+            f"(CASE WHEN jsonb_typeof({existing_sql}) = 'array' "
+            f"THEN {existing_sql} || {literal_sql} ELSE {literal_sql} END)",
+            [*existing_params, *existing_params, *literal_params, *literal_params]
+        )
+
+    if not isinstance(value, dict):
+        return literal_sql, literal_params
+
+    pair_sqls = []
+    pair_params = []
+    for key, child_value in value.items():
+        # The existing child is NULL if key is missing, which merges like a type mismatch
+        child_sql, child_params = jsonb_deep_merge_sql(
+            f'({existing_sql} -> %s::text)',
+            [*existing_params, key],
+            child_value,
+            encoder
+        )
+        pair_sqls.append(f'%s::text, {child_sql}')
+        pair_params.extend([key, *child_params])
+
+    build_object_sqls = [
+        f"jsonb_build_object({', '.join(pair_sqls[i:i + JSONB_BUILD_OBJECT_MAX_PAIRS])})"
+        for i in range(0, len(pair_sqls), JSONB_BUILD_OBJECT_MAX_PAIRS)
+    ]
+    merged_sql = ' || '.join([existing_sql, *build_object_sqls])
+    return (
+        f"(CASE WHEN jsonb_typeof({existing_sql}) = 'object' THEN {merged_sql} ELSE {literal_sql} END)",
+        [*existing_params, *existing_params, *pair_params, *literal_params]
+    )
+
+
+class JSONBDeepMerge(Expression):
+    """
+        An update expression that deep merges a partial json value into a jsonb column in the database,
+        as R.merge_deep would in Python, without reading the column. Postgres only
+    """
+
+    def __init__(self, field_name, value, encoder=None):
+        super().__init__(output_field=JSONField(encoder=encoder))
+        self.field = F(field_name)
+        self.value = value
+        self.encoder = encoder
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False):
+        expression = self.copy()
+        expression.field = self.field.resolve_expression(query, allow_joins, reuse, summarize, for_save)
+        return expression
+
+    def as_sql(self, compiler, connection):
+        field_sql, field_params = compiler.compile(self.field)
+        return jsonb_deep_merge_sql(field_sql, list(field_params), self.value, self.encoder)
+
+
+def update_or_create_with_revision_and_jsonb_patch(model_class, update_or_create_values, json_props=['data']):
+    """
+        Like update_or_create_with_revision, but when updating by id deep merges the given json props of
+        update_or_create_values['defaults'] into the existing values with R.merge_deep semantics. On Postgres the
+        merge is a JSONBDeepMerge in a single UPDATE, so the existing json is never read before it's written.
+        The updated instance is then read once to record its revision and be returned. Other databases merge
+        in Python. Creates are unchanged
+    :param model_class: A RevisionModelMixin model registered with django-reversion
+    :param update_or_create_values: The result of input_type_parameters_for_update_or_create
+    :param json_props: The json props of the model to merge. Default ['data']
+    :return: The tuple (instance, created)
+    """
+    id = R.prop_or(None, 'id', update_or_create_values)
+    defaults = R.prop_or({}, 'defaults', update_or_create_values)
+    patched_props = [prop for prop in json_props if prop in defaults]
+    if not id or not patched_props:
+        return update_or_create_with_revision(model_class, update_or_create_values)
+
+    if connection.vendor != 'postgresql':
+        existing = model_class.objects.get(id=id)
+        return update_or_create_with_revision(model_class, R.merge(update_or_create_values, dict(
+            defaults=R.merge(defaults, {prop: R.merge_deep(getattr(existing, prop), defaults[prop]) for prop in
+                                        patched_props})
+        )))
+
+    with reversion.create_revision():
+        updates = R.merge(defaults, {
+            prop: JSONBDeepMerge(prop, defaults[prop], model_class._meta.get_field(prop).encoder)
+            for prop in patched_props
+        })
+        if hasattr(model_class, 'geometry_update_values'):
+            # What GeojsonGeometryMixin.save derives from a replaced geojson
+            updates = R.merge(updates, model_class.geometry_update_values(defaults))
+        # What RevisionModelMixin.save maintains, which update bypasses
+        revision_columns = dict(
+            created_at=Coalesce(F('created_at'), Now()),
+            updated_at=Now(),
+            version_number=next_version_numbers(model_class, [id])[str(id)]
+        )
+        if not model_class.objects.filter(id=id).update(**R.merge(updates, revision_columns)):
+            # As when the existing data is read for merging in Python
+            raise model_class.DoesNotExist(f'{model_class.__name__} matching id {id} does not exist')
+
+        instance = model_class.objects.get(id=id)
+        reversion.add_to_revision(instance)
+        # Let receivers such as the resolver cache know of the save that update bypassed
+        post_save.send(
+            sender=model_class,
+            instance=instance,
+            created=False,
+            update_fields=frozenset([*updates.keys(), *revision_columns.keys()]),
+            raw=False,
+            using=instance._state.db
+        )
+    return instance, False
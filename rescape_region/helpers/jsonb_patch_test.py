@@ -0,0 +1,54 @@
+import copy
+
+import pytest
+from reversion.models import Version
+from rescape_python_helpers import ramda as R
+from snapshottest import TestCase
+
+from rescape_region.helpers.jsonb_patch import update_or_create_with_revision_and_jsonb_patch
+from rescape_region.models import Region
+
+existing_data = dict(
+    locations=dict(params=dict(city='Oslo', country='Norway'), ids=[1, 2]),
+    mapbox=dict(viewport=dict(latitude=59.9, longitude=10.7, zoom=7)),
+    colors=['red'],
+    name='Oslo',
+    count=3
+)
+
+patches = [
+    # Nested objects merge key by key
+    dict(locations=dict(params=dict(city='Bergen'))),
+    # Lists append to existing lists
+    dict(locations=dict(ids=[3]), colors=['blue', 'green']),
+    # Values of another type replace the existing value
+    dict(colors=dict(primary='red'), name=['Oslo', 'Bergen'], count=dict(value=3)),
+    # New keys, nulls and empty objects
+    dict(sankey=dict(stages=[dict(key='source')]), name=None, mapbox=dict()),
+]
+
+
+@pytest.mark.django_db
+class JSONBPatchTestCase(TestCase):
+
+    def test_merge_matches_merge_deep(self):
+        for patch in patches:
+            region, _ = update_or_create_with_revision_and_jsonb_patch(
+                Region,
+                dict(defaults=dict(key=f'oslo{patches.index(patch)}', name='Oslo', data=existing_data))
+            )
+            updated_region, created = update_or_create_with_revision_and_jsonb_patch(
+                Region,
+                dict(id=region.id, defaults=dict(name='Oslo Region', data=patch))
+            )
+            assert not created
+            assert updated_region.name == 'Oslo Region'
+            assert updated_region.data == R.merge_deep(copy.deepcopy(existing_data), copy.deepcopy(patch))
+            # The update is recorded as a revision and in the revision columns
+            assert updated_region.version_number == 2
+            assert Version.objects.get_for_object(updated_region).count() == 2
+            assert Version.objects.get_for_object(updated_region).first().field_dict['data'] == updated_region.data
+
+    def test_missing_instance(self):
+        with pytest.raises(Region.DoesNotExist):
+            update_or_create_with_revision_and_jsonb_patch(Region, dict(id=0, defaults=dict(data=dict(name='Oslo'))))
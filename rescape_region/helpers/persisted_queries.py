@@ -0,0 +1,118 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from graphql import parse, validate
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import execute, ExecutionResult
+
+# The default number of parsed and validated documents kept by PersistedQueryBackend
+DEFAULT_PERSISTED_QUERY_CACHE_SIZE = 256
+
+
+def query_hash(query):
+    """
+        The sha256 hex digest that clients send to identify a persisted query, as in Apollo's automatic
+        persisted queries
+    :param query: The query string
+    :return: The hex digest
+    """
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def persisted_query_hash(request, data):
+    """
+        Reads the hash of a persisted query from extensions.persistedQuery.sha256Hash of the POST body
+        or of the extensions GET param
+    :param request: The Django request
+    :param data: The parsed request body
+    :return: The hash or None
+    """
+    extensions = request.GET.get('extensions') or data.get('extensions') or {}
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    return (extensions.get('persistedQuery') or {}).get('sha256Hash')
+
+
+class PersistedQueryBackend(GraphQLBackend):
+    """
+        A graphql-core backend that keeps the documents of the most recently used queries parsed and validated in an
+        LRU cache keyed by schema and query hash. A cached query is neither parsed nor validated again. Queries
+        that fail validation aren't cached
+    """
+
+    def __init__(self, max_size=None, executor=None):
+        self.max_size = max_size or getattr(settings, 'GRAPHQL_PERSISTED_QUERY_CACHE_SIZE',
+                                            DEFAULT_PERSISTED_QUERY_CACHE_SIZE)
+        self.execute_params = dict(executor=executor)
+        self.documents = OrderedDict()
+        self.stats = dict(hits=0, misses=0)
+        self.lock = threading.Lock()
+
+    def cached_document(self, schema, hash):
+        """
+            The cached document of the hash, marked as recently used
+        :param schema: The graphene schema
+        :param hash: The query hash
+        :return: The GraphQLDocument or None
+        """
+        key = (id(schema), hash)
+        with self.lock:
+            document = self.documents.get(key)
+            if document:
+                self.documents.move_to_end(key)
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+            return document
+
+    def query_for_hash(self, schema, hash):
+        """
+            The query string of a cached hash, for requests that send only the hash
+        :param schema: The graphene schema
+        :param hash: The query hash
+        :return: The query string or None if the hash isn't cached
+        """
+        with self.lock:
+            document = self.documents.get((id(schema), hash))
+            return document.document_string if document else None
+
+    def document_from_string(self, schema, document_string):
+        hash = query_hash(document_string)
+        document = self.cached_document(schema, hash)
+        if document:
+            return document
+
+        document_ast = parse(document_string)
+        validation_errors = validate(schema, document_ast)
+        if validation_errors:
+            # Invalid documents return their errors when executed, like graphql-core's own backend
+            return GraphQLDocument(
+                schema=schema,
+                document_string=document_string,
+                document_ast=document_ast,
+                execute=lambda *args, **kwargs: ExecutionResult(errors=validation_errors, invalid=True)
+            )
+
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            # Validated above, so execute doesn't validate again
+            execute=partial(execute, schema, document_ast, **self.execute_params)
+        )
+        with self.lock:
+            self.documents[(id(schema), hash)] = document
+            while len(self.documents) > self.max_size:
+                self.documents.popitem(last=False)
+        return document
+
+
+# The backend shared by the views of the process
+persisted_query_backend = PersistedQueryBackend()
@@ -0,0 +1,45 @@
+import graphene
+from snapshottest import TestCase
+
+from rescape_region.helpers.persisted_queries import PersistedQueryBackend, query_hash
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String(name=graphene.String())
+
+    def resolve_hello(self, info, name='world'):
+        return f'Hello {name}'
+
+
+schema = graphene.Schema(query=Query)
+
+
+class PersistedQueriesTestCase(TestCase):
+
+    def test_document_cache(self):
+        backend = PersistedQueryBackend(max_size=2)
+        query = 'query hello($name: String) { hello(name: $name) }'
+        document = backend.document_from_string(schema, query)
+        # The second request reuses the parsed and validated document
+        assert backend.document_from_string(schema, query) is document
+        assert backend.stats == dict(hits=1, misses=1)
+        assert backend.query_for_hash(schema, query_hash(query)) == query
+        assert document.execute(variable_values=dict(name='Oslo')).data == dict(hello='Hello Oslo')
+
+    def test_invalid_query_not_cached(self):
+        backend = PersistedQueryBackend()
+        query = '{ goodbye }'
+        result = backend.document_from_string(schema, query).execute()
+        assert result.invalid and result.errors
+        assert backend.query_for_hash(schema, query_hash(query)) is None
+
+    def test_least_recently_used_evicted(self):
+        backend = PersistedQueryBackend(max_size=2)
+        queries = ['{ hello }', '{ hello(name: "Oslo") }', '{ hello(name: "Brussels") }']
+        backend.document_from_string(schema, queries[0])
+        backend.document_from_string(schema, queries[1])
+        # Use the first query so that the second is the least recently used
+        backend.document_from_string(schema, queries[0])
+        backend.document_from_string(schema, queries[2])
+        assert backend.query_for_hash(schema, query_hash(queries[0])) == queries[0]
+        assert backend.query_for_hash(schema, query_hash(queries[1])) is None
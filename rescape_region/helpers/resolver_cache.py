@@ -0,0 +1,216 @@
+import functools
+import hashlib
+import json
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from graphql.language.printer import print_ast
+from rescape_python_helpers import ramda as R
+
+# Defaults of settings.GRAPHQL_RESOLVER_CACHE. The cache is opt-in: resolvers decorated with cached_resolver
+# are only cached when ENABLED is True
+DEFAULT_GRAPHQL_RESOLVER_CACHE = dict(
+    ENABLED=False,
+    # The name of the Django cache in settings.CACHES. Saves invalidate entries by starting a new generation in this
+    # cache, which only reaches other processes if they share it, like Redis or Memcached
+    CACHE='default',
+    # A LocMemCache is private to each process, so the other processes would serve the rows of before a save until
+    # TIMEOUT. It is refused unless this is True, e.g. for a single process server or tests
+    ALLOW_LOCAL_MEMORY_CACHE=False,
+    # Seconds. With a shared cache saves invalidate entries once their transaction commits, so this only bounds
+    # how long unused entries are kept. With an allowed LocMemCache it bounds how long other processes serve stale rows
+    TIMEOUT=300
+)
+
+_missing = object()
+
+_resolver_cache_stats = dict(hits={}, misses={}, invalidations={})
+_resolver_cache_stats_lock = threading.Lock()
+
+
+def resolver_cache_settings():
+    """
+        DEFAULT_GRAPHQL_RESOLVER_CACHE merged with settings.GRAPHQL_RESOLVER_CACHE
+    :return: The settings dict
+    """
+    return R.merge(DEFAULT_GRAPHQL_RESOLVER_CACHE, getattr(settings, 'GRAPHQL_RESOLVER_CACHE', {}))
+
+
+def resolver_cache():
+    """
+        The Django cache of the resolver results
+    :return: The cache
+    :raises ImproperlyConfigured: If the cache is enabled with a LocMemCache and ALLOW_LOCAL_MEMORY_CACHE is False
+    """
+    cache_settings = resolver_cache_settings()
+    cache = caches[cache_settings['CACHE']]
+    if cache_settings['ENABLED'] and isinstance(cache, LocMemCache) and not cache_settings['ALLOW_LOCAL_MEMORY_CACHE']:
+        raise ImproperlyConfigured(
+            f"GRAPHQL_RESOLVER_CACHE['CACHE'] {cache_settings['CACHE']} is a LocMemCache, whose invalidations don't "
+            f"reach other processes. Use a shared cache or set ALLOW_LOCAL_MEMORY_CACHE for a single process"
+        )
+    return cache
+
+
+def _count(stat, key):
+    with _resolver_cache_stats_lock:
+        counts = _resolver_cache_stats[stat]
+        counts[key] = counts.get(key, 0) + 1
+
+
+def resolver_cache_stats():
+    """
+        The hits and misses of each cached field and the invalidations of each model since the process started or
+        reset_resolver_cache_stats was called
+    :return: dict with hits, misses and hit_ratio keyed by field and invalidations keyed by model label
+    """
+    with _resolver_cache_stats_lock:
+        hits = dict(_resolver_cache_stats['hits'])
+        misses = dict(_resolver_cache_stats['misses'])
+        invalidations = dict(_resolver_cache_stats['invalidations'])
+    return dict(
+        hits=hits,
+        misses=misses,
+        hit_ratio={
+            field: hits.get(field, 0) / (hits.get(field, 0) + misses.get(field, 0))
+            for field in set(hits) | set(misses)
+        },
+        invalidations=invalidations
+    )
+
+
+def reset_resolver_cache_stats():
+    with _resolver_cache_stats_lock:
+        for counts in _resolver_cache_stats.values():
+            counts.clear()
+
+
+def permission_class(user):
+    """
+        The class of the user whose results may differ from other classes
+    :param user: The request user or None
+    :return: 'superuser', 'staff', 'authenticated' or 'anonymous'
+    """
+    if not user or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_superuser:
+        return 'superuser'
+    return 'staff' if user.is_staff else 'authenticated'
+
+
+def model_generation_key(model):
+    return f'graphql_resolver_cache:generation:{model._meta.label_lower}'
+
+
+def model_generations(cache, models):
+    """
+        The current generation of each model. Saving an instance of a model starts a new generation, so cache keys
+        that include the generations of their models are never read after a save
+    :param cache: The Django cache
+    :param models: The model classes
+    :return: The generations in the order of models
+    """
+    keys = R.map(model_generation_key, models)
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Start at a random generation so that entries of a generation that was evicted from the cache
+            # can't be read again. add doesn't overwrite a generation set by another process in the meantime
+            generation = new_generation()
+            cache.add(key, generation, timeout=None)
+            generations[key] = cache.get(key, generation)
+    return R.map(lambda key: generations[key], keys)
+
+
+def new_generation():
+    return random.getrandbits(48)
+
+
+def invalidate_model(sender, **kwargs):
+    """
+        post_save and post_delete receiver that starts a new generation of the sender model once the transaction of
+        the save commits. Otherwise a request could cache the uncommitted, previous rows under the new generation
+    """
+    if not resolver_cache_settings()['ENABLED']:
+        return
+    # Fails before the commit if the cache is misconfigured
+    cache = resolver_cache()
+
+    def start_generation():
+        key = model_generation_key(sender)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # incr fails if the generation isn't in the cache, in which case nothing cached uses it
+            cache.set(key, new_generation(), timeout=None)
+        _count('invalidations', sender._meta.label_lower)
+
+    transaction.on_commit(start_generation)
+
+
+def resolver_cache_key(info, kwargs, generations):
+    """
+        Keys a resolution by the field's query AST, its arguments, which include the request's variables, the user's
+        permission class and the generations of the models the result depends on
+    :param info: The graphene ResolveInfo
+    :param kwargs: The field's arguments
+    :param generations: The result of model_generations
+    :return: The cache key
+    """
+    payload = json.dumps(
+        [
+            info.field_name,
+            R.map(print_ast, info.field_asts),
+            kwargs,
+            permission_class(getattr(info.context, 'user', None)),
+            generations
+        ],
+        sort_keys=True,
+        default=str
+    )
+    return f'graphql_resolver_cache:{hashlib.sha256(payload.encode("utf-8")).hexdigest()}'
+
+
+def cached_resolver(*models):
+    """
+        Caches the results of a resolver of read-mostly models in settings.GRAPHQL_RESOLVER_CACHE['CACHE'] when
+        settings.GRAPHQL_RESOLVER_CACHE['ENABLED'] is True. Saving or deleting an instance of any of the models, such as
+        with update_or_create_with_revision, invalidates the results. Updates that bypass signals, like
+        QuerySet.update, don't invalidate them. The result must be picklable, so resolvers should return lists
+        rather than unevaluated QuerySets
+    :param models: The model classes whose instances the result contains or depends on
+    :return: A resolver decorator
+    """
+    for model in models:
+        post_save.connect(invalidate_model, sender=model, dispatch_uid=f'resolver_cache_save_{model._meta.label_lower}')
+        post_delete.connect(
+            invalidate_model, sender=model, dispatch_uid=f'resolver_cache_delete_{model._meta.label_lower}'
+        )
+
+    def decorator(resolver):
+        @functools.wraps(resolver)
+        def _cached_resolver(root, info, **kwargs):
+            cache_settings = resolver_cache_settings()
+            if not cache_settings['ENABLED']:
+                return resolver(root, info, **kwargs)
+
+            cache = resolver_cache()
+            key = resolver_cache_key(info, kwargs, model_generations(cache, models))
+            result = cache.get(key, _missing)
+            if result is not _missing:
+                _count('hits', info.field_name)
+                return result
+            _count('misses', info.field_name)
+            result = resolver(root, info, **kwargs)
+            cache.set(key, result, timeout=cache_settings['TIMEOUT'])
+            return result
+
+        return _cached_resolver
+
+    return decorator
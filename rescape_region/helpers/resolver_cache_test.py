@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from snapshottest import TestCase
+
+from rescape_region.helpers.resolver_cache import cached_resolver, resolver_cache, resolver_cache_stats, \
+    reset_resolver_cache_stats
+from rescape_region.models.settings import Settings
+
+# The tests run in one process, so the LocMemCache of CACHES['default'] is invalidated by saves
+ENABLED = dict(ENABLED=True, CACHE='default', ALLOW_LOCAL_MEMORY_CACHE=True, TIMEOUT=60)
+
+
+def info(field_name='settings'):
+    return SimpleNamespace(field_name=field_name, field_asts=[], context=SimpleNamespace(user=None))
+
+
+# transaction=True so that the invalidations registered with transaction.on_commit run
+@pytest.mark.django_db(transaction=True)
+class ResolverCacheTestCase(TestCase):
+
+    def setUp(self):
+        resolver_cache().clear()
+        reset_resolver_cache_stats()
+        self.calls = []
+
+        @cached_resolver(Settings)
+        def resolve_settings(root, info, **kwargs):
+            self.calls.append(kwargs)
+            return list(Settings.objects.filter(**kwargs).values_list('key', flat=True))
+
+        self.resolve_settings = resolve_settings
+
+    def test_hits_and_misses(self):
+        with override_settings(GRAPHQL_RESOLVER_CACHE=ENABLED):
+            assert self.resolve_settings(None, info(), key='global') == []
+            assert self.resolve_settings(None, info(), key='global') == []
+            # Different arguments are cached separately
+            self.resolve_settings(None, info(), key='mars')
+        assert len(self.calls) == 2
+        stats = resolver_cache_stats()
+        assert stats['hits'] == dict(settings=1)
+        assert stats['misses'] == dict(settings=2)
+        assert stats['hit_ratio'] == dict(settings=1 / 3)
+
+    def test_save_invalidates(self):
+        with override_settings(GRAPHQL_RESOLVER_CACHE=ENABLED):
+            assert self.resolve_settings(None, info(), key='global') == []
+            Settings.objects.create(key='global', data={})
+            assert self.resolve_settings(None, info(), key='global') == ['global']
+        assert len(self.calls) == 2
+        assert resolver_cache_stats()['invalidations'] == {'rescape_region.settings': 1}
+
+    def test_disabled(self):
+        with override_settings(GRAPHQL_RESOLVER_CACHE=dict(ENABLED=False)):
+            self.resolve_settings(None, info(), key='global')
+            self.resolve_settings(None, info(), key='global')
+        assert len(self.calls) == 2
+        assert resolver_cache_stats()['hits'] == {}
+
+    def test_local_memory_cache_refused(self):
+        # Other processes wouldn't see the invalidations of a LocMemCache
+        with override_settings(GRAPHQL_RESOLVER_CACHE=dict(ENABLED=True, CACHE='default')):
+            with pytest.raises(ImproperlyConfigured):
+                self.resolve_settings(None, info(), key='global')
+        assert self.calls == []
@@ -0,0 +1,53 @@
+import itertools
+import logging
+
+from django.db import transaction
+from rescape_graphene.graphql_helpers.schema_helpers import update_or_create_with_revision
+from rescape_python_helpers import ramda as R
+
+from rescape_region.helpers.sankey_graph_cache import cache_sankey_graph
+from rescape_region.helpers.sankey_helpers import add_sankey_graph_from_lines_to_resource_dict, \
+    DEFAULT_RAW_DATA_CHUNK_SIZE
+from rescape_region.models.resource import Resource
+
+logger = logging.getLogger('rescape_region')
+
+
+@transaction.atomic
+def ingest_resource_raw_data(resource, lines, chunk_size=DEFAULT_RAW_DATA_CHUNK_SIZE, header=False):
+    """
+        Replaces resource.data.rawData with the given lines and regenerates resource.data.graph, saving a new revision.
+        The lines are read and converted to nodes a chunk at a time. Only the lines themselves are kept, since they
+        are stored as data.rawData, rather than the rows of every line converted at once
+    :param resource: The Resource instance
+    :param lines: Iterable of delineated rows in the format of resource.data.settings.columns, such as an open file
+    :param chunk_size: The number of lines to convert to nodes at a time
+    :param header: True if the first line is a header to skip
+    :return: The updated Resource instance
+    """
+    resource_dict = cache_sankey_graph(add_sankey_graph_from_lines_to_resource_dict(
+        dict(data=resource.data),
+        itertools.islice(lines, 1, None) if header else lines,
+        chunk_size
+    ))
+    updated_resource, created = update_or_create_with_revision(
+        Resource,
+        dict(id=resource.id, defaults=dict(data=R.prop('data', resource_dict)))
+    )
+    logger.info(f'Ingested raw data of resource {raw_data_summary(updated_resource)}')
+    return updated_resource
+
+
+def raw_data_summary(resource):
+    """
+        Counts the rows, nodes and links of a Resource whose graph was generated by ingest_resource_raw_data
+    :param resource: The Resource instance
+    :return: dict with id, rows, nodes and links
+    """
+    graph = R.prop('graph', resource.data)
+    return dict(
+        id=resource.id,
+        rows=len(R.prop('rawData', resource.data)),
+        nodes=len(R.item_path(['nodes', 'name'], graph)),
+        links=len(R.prop('links', graph))
+    )
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from rescape_python_helpers import ramda as R
+
+from rescape_region.helpers.sankey_helpers import add_sankey_graph_to_resource_dict, is_compact_sankey_graph, \
+    generate_compact_sankey_graph
+
+logger = logging.getLogger('rescape_region')
+
+# Change this when the generated graphs change so that graphs cached by the previous code aren't used
+SANKEY_GRAPH_CACHE_VERSION = 1
+
+_cache_stats = dict(hits=0, misses=0)
+_cache_stats_lock = threading.Lock()
+
+
+def sankey_graph_cache():
+    """
+        The Django cache of the graphs, the cache of settings.SANKEY_GRAPH_CACHE or the default cache
+    :return: The cache
+    """
+    return caches[getattr(settings, 'SANKEY_GRAPH_CACHE', 'default')]
+
+
+def sankey_graph_fingerprint(resource_dict):
+    """
+        Hashes everything that the graph of the resource is generated from: settings, rawData and the rest of
+        resource.data, which is copied to the properties of each node. Resources with the same data have the same
+        fingerprint
+    :param resource_dict: A resource instance with data
+    :return: A hex digest
+    """
+    data = json.dumps(
+        R.omit(['graph'], R.prop('data', resource_dict)),
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str
+    )
+    return hashlib.sha256(f'{SANKEY_GRAPH_CACHE_VERSION}:{data}'.encode('utf-8')).hexdigest()
+
+
+def sankey_graph_cache_key(fingerprint):
+    return f'sankey_graph:{fingerprint}'
+
+
+def _count(stat):
+    with _cache_stats_lock:
+        _cache_stats[stat] += 1
+
+
+def sankey_graph_cache_stats():
+    """
+        The hits and misses of add_cached_sankey_graph_to_resource_dict in this process
+    :return: dict with hits and misses
+    """
+    with _cache_stats_lock:
+        return dict(_cache_stats)
+
+
+def reset_sankey_graph_cache_stats():
+    with _cache_stats_lock:
+        for stat in _cache_stats:
+            _cache_stats[stat] = 0
+
+
+def add_cached_sankey_graph_to_resource_dict(resource_dict, previous_data=None):
+    """
+        Cached version of add_sankey_graph_to_resource_dict. The graph is stored with its fingerprint, so saving a
+        resource whose data is unchanged reuses its previous graph. Otherwise the graph is looked up in the
+        sankey_graph_cache by fingerprint, which finds the graphs of other resources with the same data.
+        The graph is only generated if both miss
+    :param resource_dict: A resource instance with enough data to generate a graph
+    :param previous_data: Optional data of the resource before an update. See add_sankey_graph_to_resource_dict
+    :return: The copied resource_dict with data.graph set
+    """
+    fingerprint = sankey_graph_fingerprint(resource_dict)
+    previous_graph = R.prop_or(None, 'graph', previous_data or {})
+    if is_compact_sankey_graph(previous_graph) and R.prop_or(None, 'fingerprint', previous_graph) == fingerprint:
+        _count('hits')
+        return R.fake_lens_path_set(['data', 'graph'], previous_graph, resource_dict)
+
+    graph = sankey_graph_cache().get(sankey_graph_cache_key(fingerprint))
+    if graph is not None:
+        _count('hits')
+        logger.debug(f'Sankey graph cache {sankey_graph_cache_stats()}')
+        return R.fake_lens_path_set(['data', 'graph'], graph, resource_dict)
+    _count('misses')
+    logger.debug(f'Sankey graph cache {sankey_graph_cache_stats()}')
+    return cache_sankey_graph(add_sankey_graph_to_resource_dict(resource_dict, previous_data), fingerprint)
+
+
+def cache_sankey_graph(resource_dict, fingerprint=None):
+    """
+        Adds the fingerprint to the generated resource_dict.data.graph and stores the graph in the sankey_graph_cache
+    :param resource_dict: A resource instance whose data.graph was generated from its data
+    :param fingerprint: The sankey_graph_fingerprint of resource_dict if already known
+    :return: The copied resource_dict with the fingerprint in data.graph
+    """
+    fingerprint = fingerprint or sankey_graph_fingerprint(resource_dict)
+    graph = R.merge(R.item_path(['data', 'graph'], resource_dict), dict(fingerprint=fingerprint))
+    sankey_graph_cache().set(sankey_graph_cache_key(fingerprint), graph)
+    return R.fake_lens_path_set(['data', 'graph'], graph, resource_dict)
+
+
+def sankey_graph_workers(max_workers=None):
+    """
+        The number of processes that generate graphs in parallel
+    :param max_workers: Optional number of processes
+    :return: max_workers, settings.SANKEY_GRAPH_WORKERS or the number of CPUs
+    """
+    return max_workers or getattr(settings, 'SANKEY_GRAPH_WORKERS', None) or os.cpu_count() or 1
+
+
+def generate_compact_sankey_graphs(resource_dicts, previous_datas, max_workers):
+    """
+        Generates the graphs of the resources with generate_compact_sankey_graph, in a process pool of max_workers
+        processes if there is more than one graph. Generating a graph is CPU bound and independent of the other
+        resources, so the graphs are generated in parallel by separate processes
+    :param resource_dicts: The resource instances
+    :param previous_datas: The previous data of each resource or None
+    :param max_workers: The maximum number of processes
+    :return: The graphs in the order of resource_dicts
+    """
+    # Only send the data that the graph is generated from to the processes
+    resource_dicts = [dict(data=R.prop('data', resource_dict)) for resource_dict in resource_dicts]
+    if max_workers <= 1 or len(resource_dicts) <= 1:
+        return [
+            generate_compact_sankey_graph(resource_dict, previous_data)
+            for resource_dict, previous_data in zip(resource_dicts, previous_datas)
+        ]
+    # Spawn rather than fork the processes so that they don't inherit the database connections and the locks
+    # of other threads of the web server
+    with ProcessPoolExecutor(
+            max_workers=min(max_workers, len(resource_dicts)),
+            mp_context=multiprocessing.get_context('spawn')
+    ) as executor:
+        return list(executor.map(generate_compact_sankey_graph, resource_dicts, previous_datas))
+
+
+def add_cached_sankey_graphs_to_resource_dicts(resource_dicts, previous_datas=None, max_workers=None):
+    """
+        Version of add_cached_sankey_graph_to_resource_dict for many resources, such as those of a bulk import.
+        The graphs that aren't cached are generated in parallel by generate_compact_sankey_graphs.
+        Resources with the same data are only generated once
+    :param resource_dicts: The resource instances
+    :param previous_datas: Optional list of the data of each resource before an update or None
+    :param max_workers: Optional number of processes. See sankey_graph_workers
+    :return: The copied resource_dicts with data.graph set
+    """
+    previous_datas = previous_datas or [None] * len(resource_dicts)
+    fingerprints = R.map(sankey_graph_fingerprint, resource_dicts)
+
+    # Unchanged resources reuse their previous graph, otherwise look for a cached graph
+    graphs = {}
+    for fingerprint, previous_data in zip(fingerprints, previous_datas):
+        previous_graph = R.prop_or(None, 'graph', previous_data or {})
+        if is_compact_sankey_graph(previous_graph) and R.prop_or(None, 'fingerprint', previous_graph) == fingerprint:
+            graphs[fingerprint] = previous_graph
+    cache = sankey_graph_cache()
+    cached_graphs = cache.get_many([
+        sankey_graph_cache_key(fingerprint) for fingerprint in set(fingerprints) if fingerprint not in graphs
+    ])
+    for fingerprint in fingerprints:
+        if sankey_graph_cache_key(fingerprint) in cached_graphs:
+            graphs[fingerprint] = cached_graphs[sankey_graph_cache_key(fingerprint)]
+
+    # Generate the rest, once per fingerprint
+    missing = {}
+    for fingerprint, resource_dict, previous_data in zip(fingerprints, resource_dicts, previous_datas):
+        if fingerprint not in graphs and fingerprint not in missing:
+            missing[fingerprint] = (resource_dict, previous_data)
+    generated_graphs = generate_compact_sankey_graphs(
+        [resource_dict for resource_dict, _ in missing.values()],
+        [previous_data for _, previous_data in missing.values()],
+        sankey_graph_workers(max_workers)
+    )
+    for fingerprint, graph in zip(missing.keys(), generated_graphs):
+        graphs[fingerprint] = R.merge(graph, dict(fingerprint=fingerprint))
+    cache.set_many({sankey_graph_cache_key(fingerprint): graphs[fingerprint] for fingerprint in missing})
+
+    with _cache_stats_lock:
+        _cache_stats['misses'] += len(missing)
+        _cache_stats['hits'] += len(resource_dicts) - len(missing)
+    logger.debug(f'Sankey graph cache {sankey_graph_cache_stats()}')
+    return [
+        R.fake_lens_path_set(['data', 'graph'], graphs[fingerprint], resource_dict)
+        for fingerprint, resource_dict in zip(fingerprints, resource_dicts)
+    ]
@@ -0,0 +1,70 @@
+import logging
+
+from rescape_python_helpers import ramda as R
+from snapshottest import TestCase
+
+from rescape_region.helpers.sankey_graph_cache import add_cached_sankey_graph_to_resource_dict, sankey_graph_cache, \
+    sankey_graph_cache_stats, reset_sankey_graph_cache_stats, sankey_graph_fingerprint, \
+    add_cached_sankey_graphs_to_resource_dicts
+from rescape_region.helpers.sankey_helpers import add_sankey_graph_to_resource_dict
+from rescape_region.schema_models.resource.resource_sample import sample_resources
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class SankeyGraphCacheTestCase(TestCase):
+
+    def setUp(self):
+        sankey_graph_cache().clear()
+        reset_sankey_graph_cache_stats()
+
+    def test_add_cached_sankey_graph_to_resource_dict(self):
+        resource = R.head(sample_resources)
+        graph = R.item_path(['data', 'graph'], add_cached_sankey_graph_to_resource_dict(resource))
+        assert sankey_graph_cache_stats() == dict(hits=0, misses=1)
+        assert R.omit(['fingerprint'], graph) == \
+               R.item_path(['data', 'graph'], add_sankey_graph_to_resource_dict(resource))
+        assert graph['fingerprint'] == sankey_graph_fingerprint(resource)
+
+        # A resource with the same data uses the cached graph
+        duplicate_resource = R.merge(resource, dict(key='mineralsCopy', name='Minerals Copy'))
+        assert R.item_path(['data', 'graph'], add_cached_sankey_graph_to_resource_dict(duplicate_resource)) == graph
+        assert sankey_graph_cache_stats() == dict(hits=1, misses=1)
+
+        # Saving unchanged data reuses the previous graph even if it isn't cached
+        sankey_graph_cache().clear()
+        previous_data = R.merge(R.prop('data', resource), dict(graph=graph))
+        assert R.item_path(
+            ['data', 'graph'],
+            add_cached_sankey_graph_to_resource_dict(resource, previous_data)
+        ) is graph
+        assert sankey_graph_cache_stats() == dict(hits=2, misses=1)
+
+        # Any change to the data misses
+        changed_resource = R.fake_lens_path_set(['data', 'material'], 'Metals', resource)
+        assert sankey_graph_fingerprint(changed_resource) != graph['fingerprint']
+        add_cached_sankey_graph_to_resource_dict(changed_resource, previous_data)
+        assert sankey_graph_cache_stats() == dict(hits=2, misses=2)
+
+    def test_add_cached_sankey_graphs_to_resource_dicts(self):
+        # The first resource is duplicated, so its graph is only generated once
+        resources = sample_resources + [R.merge(R.head(sample_resources), dict(key='mineralsCopy'))]
+        expected_graphs = R.map(
+            lambda resource: R.item_path(['data', 'graph'], add_sankey_graph_to_resource_dict(resource)),
+            resources
+        )
+        # Serially and by a process pool
+        for max_workers in [1, 2]:
+            sankey_graph_cache().clear()
+            reset_sankey_graph_cache_stats()
+            graphs = R.map(
+                R.item_path(['data', 'graph']),
+                add_cached_sankey_graphs_to_resource_dicts(resources, max_workers=max_workers)
+            )
+            assert R.map(R.omit(['fingerprint']), graphs) == expected_graphs
+            assert sankey_graph_cache_stats() == dict(hits=1, misses=len(sample_resources))
+
+        # Now they are all cached
+        add_cached_sankey_graphs_to_resource_dicts(resources, max_workers=2)
+        assert sankey_graph_cache_stats() == dict(hits=1 + len(resources), misses=len(sample_resources))
@@ -1,25 +1,130 @@
-import locale
+import functools
+import heapq
+import json
 import logging
 
 import re
+
+import pandas as pd
 from inflection import humanize
 from rescape_python_helpers import ramda as R
 
 logger = logging.getLogger('rescape_region')
 
+# The format of Resource.data.graph created by compact_sankey_graph
+COMPACT_SANKEY_GRAPH_FORMAT = 'compact'
+# The number of raw data lines converted to nodes at a time when reading them from a file
+DEFAULT_RAW_DATA_CHUNK_SIZE = 10000
+# The number format of resource.data.settings.numberFormat when it isn't specified
+DEFAULT_NUMBER_FORMAT = dict(decimalSeparator='.', thousandsSeparator=',')
+# The ways of linking the nodes of the stages, selected by resource.data.settings.linkStrategy:
+#   all: Every node of a stage to every node of the next stage with nodes
+#   targets: Every node of a stage to every node of the stages in the stage's targets
+#   topTargets: Every node of a stage to the settings.linkTopTargets nodes with the largest values
+#   of the next stage with nodes
+LINK_STRATEGIES = ['all', 'targets', 'topTargets']
+DEFAULT_LINK_TOP_TARGETS = 10
+# The most links that a graph can have unless resource.data.settings.maxLinks says otherwise
+DEFAULT_MAX_LINKS = 500000
+
+# Coordinates are separated by a space and/or comma, e.g. '50.864762, 3.479308'
+coordinates_pattern = re.compile('[ ,]+')
+
+
+class NumberParser:
+    """
+        Parses numeric strings with the given decimal and thousands separators without using the process-wide locale.
+        Create parsers with number_parser so that each number format is only compiled once
+    """
+
+    def __init__(self, decimal_separator, thousands_separator):
+        if not decimal_separator or decimal_separator == thousands_separator:
+            raise ValueError(
+                f"Invalid number format: decimal separator {decimal_separator!r}, "
+                f"thousands separator {thousands_separator!r}"
+            )
+        self.decimal_separator = decimal_separator
+        self.thousands_separator = thousands_separator
+        # Each value is normalized by removing the thousands separators and then making the decimal separator a point,
+        # like locale.atof does. Compile this into the fewest string replacements
+        if thousands_separator and decimal_separator != '.':
+            self.normalize = lambda string: string.replace(thousands_separator, '').replace(decimal_separator, '.')
+        elif thousands_separator:
+            self.normalize = lambda string: string.replace(thousands_separator, '')
+        else:
+            self.normalize = lambda string: string.replace(decimal_separator, '.')
+
+    def parse(self, string):
+        """
+            Parses a single string
+        :param string: The string
+        :return: The float or None if the string can't be converted
+        """
+        try:
+            return float(self.normalize(string))
+        except (AttributeError, TypeError, ValueError):
+            logger.warning(f"Can't convert string {string} to a float. Setting to null")
+            return None
+
+    def parse_column(self, strings):
+        """
+            Parses a whole column of strings at once
+        :param strings: List of strings
+        :return: List of floats. Values that can't be converted are None
+        """
+        normalize = self.normalize
+        floats = []
+        for string in strings:
+            try:
+                floats.append(float(normalize(string)))
+            except (AttributeError, TypeError, ValueError):
+                logger.warning(f"Can't convert string {string} to a float. Setting to null")
+                floats.append(None)
+        return floats
+
+
+@functools.lru_cache(maxsize=None)
+def _number_parser(decimal_separator, thousands_separator):
+    return NumberParser(decimal_separator, thousands_separator)
+
+
+def number_parser(number_format=None):
+    """
+        Returns the NumberParser of the given number format, compiling it the first time that it's used
+    :param number_format: Optional dict with decimalSeparator and thousandsSeparator, as stored in
+        resource.data.settings.numberFormat. By default numbers use a point for the decimal and commas for thousands
+    :return: The NumberParser
+    """
+    number_format = R.merge(DEFAULT_NUMBER_FORMAT, R.compact_dict_none(number_format or {}))
+    return _number_parser(R.prop('decimalSeparator', number_format), R.prop('thousandsSeparator', number_format))
+
+
+def resource_number_parser(resource):
+    """
+        Returns the NumberParser for the values of the resource given by resource.data.settings.numberFormat
+    :param resource: The Resource object
+    :return: The NumberParser
+    """
+    return number_parser(R.item_path_or(None, ['data', 'settings', 'numberFormat'], resource))
+
 
 def string_to_float(flt):
     """
-        Set the numeric to en_US simply to assume that numbers use a point for the decimal and commas for thousands
+        Converts the string assuming that numbers use a point for the decimal and commas for thousands
     :param flt:
-    :return:
+    :return: The float or None if the string can't be converted
     """
-    locale.setlocale(locale.LC_NUMERIC, 'en_US.UTF-8')
-    try:
-        return locale.atof(flt)
-    except (TypeError, ValueError):
-        logger.warning(f"Can't convert string {flt} to a float. Setting to null")
-        return None
+    return number_parser().parse(flt)
+
+
+def string_column_to_floats(strings):
+    """
+        Columnar version of string_to_float. Converts a whole column of strings at once, assuming that numbers use a
+        point for the decimal and commas for thousands
+    :param strings: List of strings
+    :return: List of floats. Values that can't be converted are None
+    """
+    return number_parser().parse_column(strings)
 
 
 def stages_by_name(stages):
@@ -30,6 +135,69 @@ def stages_by_key(stages):
     return R.map_prop_value_as_index('key', stages)
 
 
+def raw_data_rows(prop, raw_data):
+    """
+        Returns the rows of raw_data[prop] if raw_data is a dict, otherwise raw_data itself is the list of rows
+    :param prop: 'nodes' or 'links'
+    :param raw_data: The list of delineated rows or a dict of them keyed by 'nodes' and 'links'
+    :return: The list of delineated rows
+    """
+    return R.prop_or(raw_data, prop, raw_data) if isinstance(raw_data, dict) else raw_data
+
+
+def create_raw_node_columns(delineator, resource):
+    """
+        Columnar version of create_raw_nodes. Splits all of the raw node rows at once and strips each value
+    :param delineator: The delineator of the raw data rows
+    :param resource: The Resource object
+    :return: A list of columns, each a list of strings ordered like settings.columns. None if any row has fewer
+    values than there are columns, in which case create_raw_nodes must be used
+    """
+    columns = R.item_path(['data', 'settings', 'columns'], resource)
+    raw_nodes = raw_data_rows('nodes', R.item_path(['data', 'rawData'], resource))
+    if not len(raw_nodes):
+        return [[] for _ in columns]
+    # regex=False since pandas otherwise treats delineators of more than one character as regular expressions
+    rows = pd.Series(raw_nodes, dtype=object).str.split(delineator, n=len(columns), expand=True, regex=False)
+    # Any row with missing values produces None. Values beyond the last column are ignored as in create_raw_nodes
+    if rows.shape[1] < len(columns) or rows.iloc[:, 0:len(columns)].isnull().values.any():
+        return None
+    return [rows[i].str.strip().tolist() for i in range(len(columns))]
+
+
+def iter_raw_rows(delineator, columns, lines):
+    """
+        Generates a dict for each delineated line keyed by the columns. Lines are only read as they are needed,
+        so lines can be any iterable, such as an open file
+    :param delineator: The delineator of the lines
+    :param columns: The column names
+    :param lines: Iterable of delineated lines
+    :return: A generator of dicts keyed by column
+    """
+    for line in lines:
+        # If a column name is repeated the last one wins, as with R.from_pairs
+        yield dict(zip(columns, [s.strip() for s in line.split(delineator)]))
+
+
+def chunk_lines(lines, chunk_size):
+    """
+        Groups the non-blank lines of an iterable into lists of chunk_size lines, stripped of their line endings
+    :param lines: Iterable of lines, such as an open file
+    :param chunk_size: The maximum number of lines per chunk
+    :return: A generator of lists of lines
+    """
+    chunk = []
+    for line in lines:
+        if not line.strip():
+            continue
+        chunk.append(line.rstrip('\r\n'))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 def create_raw_nodes(delineator, resource):
     """
         Creates nodes for each column from the csv
@@ -41,16 +209,8 @@ def create_raw_nodes(delineator, resource):
     # Sometimes we split nodes and edges in the raw data into
     # dict(nodes=..., edges=...). Sometimes the raw data is just nodes
     # and we get the edges from the node data
-    raw_nodes = R.prop_or(raw_data, 'nodes', raw_data)
-    return R.map(
-        lambda line: R.from_pairs(
-            zip(
-                columns,
-                R.map(lambda s: s.strip(), line.split(delineator))
-            )
-        ),
-        raw_nodes
-    )
+    raw_nodes = raw_data_rows('nodes', raw_data)
+    return list(iter_raw_rows(delineator, columns, raw_nodes))
 
 
 def create_raw_links(delineator, resource):
@@ -64,16 +224,17 @@ def create_raw_links(delineator, resource):
     # Sometimes we split nodes and edges in the raw data into
     # dict(nodes=..., edges=...). Sometimes the raw data is just nodes
     # and we get the edges from the node data
-    raw_links = R.prop_or(None, 'links', raw_data)
-    return R.map(
-        lambda line: R.from_pairs(
-            zip(
-                columns,
-                R.map(lambda s: s.strip(), line.split(delineator))
-            )
-        ),
-        raw_links
-    ) if raw_links else raw_data
+    raw_links = R.prop_or(None, 'links', raw_data) if isinstance(raw_data, dict) else None
+    return list(iter_raw_rows(delineator, columns, raw_links)) if raw_links else raw_data
+
+
+def coordinate_tokens(coordinates):
+    """
+        Splits the coordinates string into its lat and lon strings
+    :param coordinates: comma and/or space separated lat/lon, optionally quoted
+    :return: The non-empty coordinate strings
+    """
+    return [token for token in coordinates_pattern.split(coordinates.strip('"').strip("'")) if token]
 
 
 def resolve_coordinates(default_location, coordinates, i):
@@ -97,70 +258,204 @@ def resolve_coordinates(default_location, coordinates, i):
             # Creates lon, lat for turf to use
             location=list(reversed(R.map(
                 lambda coord: string_to_float(coord),
-                re.split(' |,', coordinates.strip('"').strip("'"))
+                coordinate_tokens(coordinates)
             )))
         )
 
 
+def resolve_coordinates_column(default_location, coordinates_column):
+    """
+        Columnar version of resolve_coordinates. All of the coordinate values are converted to floats at once
+    :param default_location: [lat, lon] representing the default location for coordinates marked 'NA'
+    :param coordinates_column: List of comma separated lon/lat strings or None
+    :return: A list of dicts with isGeneralized and location, like those of resolve_coordinates
+    """
+    token_lists = [
+        None if not coordinates or coordinates == 'NA' else coordinate_tokens(coordinates)
+        for coordinates in coordinates_column
+    ]
+    floats = string_column_to_floats([token for tokens in token_lists if tokens is not None for token in tokens])
+    results = []
+    offset = 0
+    for tokens in token_lists:
+        if tokens is None:
+            results.append(dict(isGeneralized=True, location=default_location))
+        else:
+            # Creates lon, lat for turf to use
+            results.append(dict(isGeneralized=False, location=list(reversed(floats[offset:offset + len(tokens)]))))
+            offset += len(tokens)
+    return results
+
+
 def prop_lookup(node, prop):
     return R.prop(prop, dict(zip(node['properties'], node['propertyValues'])))
 
 
-def create_links(stages, value_key, nodes_by_stages):
+class SankeyLinkLimitError(ValueError):
+    """
+        Raised when the links of a graph would exceed the maximum number of links
+    """
+    pass
+
+
+def link_options(settings):
+    """
+        The options of resource.data.settings that control how create_links links the nodes of the stages
+    :param settings: resource.data.settings
+    :return: dict with strategy, one of LINK_STRATEGIES, topTargets and maxLinks
+    """
+    settings = settings or {}
+    strategy = R.prop_or(None, 'linkStrategy', settings) or 'all'
+    if strategy not in LINK_STRATEGIES:
+        raise ValueError(f'Unknown linkStrategy {strategy}. Expected one of {LINK_STRATEGIES}')
+    return dict(
+        strategy=strategy,
+        topTargets=R.prop_or(None, 'linkTopTargets', settings) or DEFAULT_LINK_TOP_TARGETS,
+        maxLinks=R.prop_or(None, 'maxLinks', settings) or DEFAULT_MAX_LINKS
+    )
+
+
+def stage_link_pairs(stages, nodes_by_stages, strategy='all'):
+    """
+        Pairs each stage that has nodes with the stages that it links to. The nodes of the first stage of each pair
+        are linked to those of the second
+    :param [Object] stages Array of stage objects.
+    :param [Object] nodes_by_stages Keyed by stage key and valued by an array of nodes
+    :param strategy: One of LINK_STRATEGIES. For 'targets' each stage is paired with those of its targets that
+        have nodes. Otherwise each stage is paired with the next stage that has nodes
+    :return: A list of (source stage key, target stage key) tuples in the order of stages
+    """
+    keys = [R.prop('key', stage) for stage in stages]
+    pairs = []
+    for i, key in enumerate(keys):
+        # Get the current stage as the source if there are any in nodes_by_stage
+        if not R.prop_or(None, key, nodes_by_stages):
+            continue
+        if strategy == 'targets':
+            pairs.extend(
+                (key, target_key)
+                for target_key in dict.fromkeys(R.prop_or(None, 'targets', stages[i]) or [])
+                if target_key != key and nodes_by_stages.get(target_key)
+            )
+            continue
+        # Iterate through the stages until one with nodes is found.
+        # If no more stages contain nodes, this stage has no links
+        target_key = next((target_key for target_key in keys[i + 1:] if nodes_by_stages.get(target_key)), None)
+        if target_key is not None:
+            pairs.append((key, target_key))
+    return pairs
+
+
+def top_nodes(nodes, count):
+    """
+        The count nodes with the largest values, in their original order. Nodes without a value come last
+    :param nodes: The nodes of a stage
+    :param count: The number of nodes
+    :return: The nodes
+    """
+    if len(nodes) <= count:
+        return nodes
+    top = set(heapq.nlargest(
+        count,
+        range(len(nodes)),
+        key=lambda i: nodes[i]['value'] if nodes[i]['value'] is not None else float('-inf')
+    ))
+    return [node for i, node in enumerate(nodes) if i in top]
+
+
+def stage_link_plan(stages, nodes_by_stages, options):
+    """
+        Determines which nodes create_links links without creating the links
+    :param [Object] stages Array of stage objects.
+    :param [Object] nodes_by_stages Keyed by stage key and valued by an array of nodes
+    :param options: The link_options
+    :return: A list of (source stage key, target stage key, target nodes) tuples. Every node of the source stage
+        is linked to each of the target nodes
+    """
+    return [
+        (
+            source_key,
+            target_key,
+            top_nodes(nodes_by_stages[target_key], options['topTargets']) if options['strategy'] == 'topTargets'
+            else nodes_by_stages[target_key]
+        )
+        for source_key, target_key in stage_link_pairs(stages, nodes_by_stages, options['strategy'])
+    ]
+
+
+def check_link_count(nodes_by_stages, plan, max_links):
+    """
+        Raises a SankeyLinkLimitError if the stage_link_plan would create more than max_links links. This is
+        checked before any links are created so that large graphs fail fast instead of exhausting memory
+    :param nodes_by_stages: Keyed by stage key and valued by an array of nodes
+    :param plan: The stage_link_plan
+    :param max_links: The maximum number of links
+    :return: The number of links
+    """
+    count = sum(len(nodes_by_stages[source_key]) * len(targets) for source_key, _, targets in plan)
+    if count > max_links:
+        raise SankeyLinkLimitError(
+            f'The graph would have {count} links, more than the maximum of {max_links}. '
+            f"Use a settings.linkStrategy of 'targets' or 'topTargets' or increase settings.maxLinks"
+        )
+    return count
+
+
+def iter_stage_links(value_key, sources, targets, parser=None):
+    """
+        Generates a link from every source node to every target node
+    :param value_key: The value_key
+    :param sources: The nodes of the source stage
+    :param targets: The nodes of the target stage
+    :param parser: Optional NumberParser of the values. Defaults to number_parser()
+    :return: A generator of links
+    """
+    # The value of the link is that of its source node, so only parse it once per source
+    values = (parser or number_parser()).parse_column([prop_lookup(source, value_key) for source in sources])
+    # Create the link with the source_node and target_node. Later we'll add
+    # in source and target that points to the nodes overall index in the graph,
+    # but we don't want to compute the overall indices yet
+    for source, value in zip(sources, values):
+        for target in targets:
+            yield dict(source_node=source, target_node=target, value=value)
+
+
+def iter_links(stages, value_key, nodes_by_stages, parser=None, settings=None):
+    """
+        Generates the Sankey Links for the given ordered stages for the given nodes by stage. The number of links
+        is checked against the maximum before the first link is generated
+    :param [Object] stages Array of stage objects.
+    :param {String} The value_key
+    :param [Object] nodesByStages Keyed by stage key and valued by an array of nodes
+    :param parser: Optional NumberParser of the values. Defaults to number_parser()
+    :param settings: Optional resource.data.settings with the link_options
+    :return: A generator of links
+    """
+    options = link_options(settings)
+    plan = stage_link_plan(stages, nodes_by_stages, options)
+    check_link_count(nodes_by_stages, plan, options['maxLinks'])
+    for source_key, _, targets in plan:
+        yield from iter_stage_links(value_key, nodes_by_stages[source_key], targets, parser)
+
+
+def create_links(stages, value_key, nodes_by_stages, parser=None, settings=None):
     """
     Creates Sankey Links for the given ordered stages for the given nodes by stage
     :param [Object] stages Array of stage objects.
     :param {String} The value_key
     :param [Object] nodesByStages Keyed by stage key and valued by an array of nodes
+    :param parser: Optional NumberParser of the values. Defaults to number_parser()
+    :param settings: Optional resource.data.settings with the link_options
     :return {*}
     """
-
-    def process_stage(stage, i):
-        # Get the current stage as the source if there are any in nodes_by_stage
-        sources = R.prop_or(None, R.prop('key', stage), nodes_by_stages)
-        if not sources:
-            return []
-        # Iterate through the stages until one with nodes is found
-        target_stage = None
-        try:
-            target_stage = R.find(
-                # Try to find nodes matching this potential target stage. There might not be any
-                lambda stage: nodes_by_stages[R.prop('key', stage)] if R.has(R.prop('key', stage),
-                                                                             nodes_by_stages) else None,
-                stages[i + 1: R.length(stages)]
-            )
-        except ValueError:
-            # It's coo, find errors if none is found. We really need R.first
-            pass
-
-        # If no more stages contain nodes, we're done
-        if not target_stage:
-            return []
-        targets = nodes_by_stages[R.prop('key', target_stage)]
-
-        # Create the link with the source_node and target_node. Later we'll add
-        # in source and target that points to the nodes overall index in the graph,
-        # but we don't want to compute the overall indices yet
-        return R.chain(lambda source:
-                       R.map(lambda target:
-                             dict(
-                                 source_node=source,
-                                 target_node=target,
-                                 value=string_to_float(prop_lookup(source, value_key))
-                             ),
-                             targets),
-                       sources
-                       )
-
-    return R.flatten([process_stage(stage, i) for i, stage in enumerate(stages)])
+    return list(iter_links(stages, value_key, nodes_by_stages, parser, settings))
 
 
-def generate_sankey_data(resource):
+def generate_sankey_nodes_by_stage(resource):
     """
-        Generates nodes and links for the given Resouce object
-    :param resource:  Resource object
-    :return: A dict containing nodes and links. nodes are a dict key by stage name
-        Results can be assigned to resource.data.sankey and saved
+        Generates the nodes of the given Resource object
+    :param resource: Resource object
+    :return: The nodes keyed by stage key. The stages are ordered by their latest node
     """
 
     settings = R.item_path(['data', 'settings'], resource)
@@ -169,17 +464,12 @@ def generate_sankey_data(resource):
     value_key = R.prop('valueKey', settings)
     location_key = R.prop('locationKey', settings)
     node_name_key = R.prop('nodeNameKey', settings)
-    node_color_key = R.prop_or(None, 'nodeColorKey', settings)
     default_location = R.prop('defaultLocation', settings)
     delineator = R.prop_or(';', 'delineator', settings)
+    parser = resource_number_parser(resource)
     # A dct of stages by name
     stage_by_name = stages_by_name(stages)
 
-    link_start_node_key = R.prop_or(None, 'linkStartNodeKey', settings)
-    link_end_node_key = R.prop_or(None, 'linkEndNodeKey', settings)
-    link_value_key = R.prop_or(None, 'linkValueKey', settings)
-    link_color_key = R.prop_or(None, 'linkColorKey', settings)
-
     def accumulate_nodes(accum, raw_node, i):
         """
             Accumulate each node, keying by the name of the node's stage key
@@ -197,49 +487,197 @@ def generate_sankey_data(resource):
         # Get key from name or it's already a key
         key = R.prop('key', R.prop_or(dict(key=node_stage), node_stage, stage_by_name))
 
-        # Copy all properties from resource.data  except settings and raw_data
+        # Copy all properties from resource.data except settings, raw_data and any previously generated graph
         # Also grab raw_node properties
         # This is for arbitrary properties defined in the data
         # We put them in properties and propertyValues since graphql hates arbitrary key/values
         properties = R.merge(
-            R.omit(['settings', 'rawData'], R.prop('data', resource)),
+            R.omit(['settings', 'rawData', 'graph'], R.prop('data', resource)),
             raw_node
         )
         properties[node_name_key] = humanize(properties[node_name_key])
-        return R.merge(
-            # Omit accum[key] since we'll concat it with the new node
-            R.omit([key], accum),
-            {
-                # concat accum[key] or [] with the new node
-                key: R.concat(
-                    R.prop_or([], key, accum),
-                    # Note that the value is an array so we can combine nodes with the same stage key
-                    [
-                        dict(
-                            value=string_to_float(R.prop(value_key, raw_node)),
-                            type='Feature',
-                            geometry=dict(
-                                type='Point',
-                                coordinates=location
-                            ),
-                            name=R.prop(node_name_key, raw_node),
-                            isGeneralized=is_generalized,
-                            properties=list(R.keys(properties)),
-                            propertyValues=list(R.values(properties))
-                        )
-                    ]
+        # Pop accum[key] and add it back with the new node so that the stages stay ordered by their latest node.
+        # Note that the value is an array so we can combine nodes with the same stage key
+        stage_nodes = accum.pop(key, [])
+        stage_nodes.append(
+            dict(
+                value=parser.parse(R.prop(value_key, raw_node)),
+                type='Feature',
+                geometry=dict(
+                    type='Point',
+                    coordinates=location
+                ),
+                name=R.prop(node_name_key, raw_node),
+                isGeneralized=is_generalized,
+                properties=list(R.keys(properties)),
+                propertyValues=list(R.values(properties))
+            )
+        )
+        accum[key] = stage_nodes
+        return accum
+
+    def accumulate_node_columns(node_columns):
+        """
+            Columnar version of accumulate_nodes. The values, coordinates and stage keys are resolved a column at a
+            time and then each node is created and grouped by its stage key in one pass over the rows
+        :param node_columns: The columns from create_raw_node_columns
+        :return: The nodes keyed by stage key, ordered like those of accumulate_nodes. None if the stage, value or
+        node name column is missing, in which case accumulate_nodes must be used
+        """
+        columns = R.prop('columns', settings)
+        if not all(k in columns for k in [stage_key, value_key, node_name_key]):
+            return None
+        # If a column name is repeated the last one wins, as with R.from_pairs
+        column_index = {column: i for i, column in enumerate(columns)}
+        row_count = len(node_columns[0])
+
+        values = parser.parse_column(node_columns[column_index[value_key]])
+        locations = resolve_coordinates_column(
+            default_location,
+            node_columns[column_index[location_key]] if location_key in column_index else [None] * row_count
+        )
+        # Get key from name or it's already a key
+        stage_names = node_columns[column_index[stage_key]]
+        key_by_stage_name = {
+            node_stage: R.prop('key', R.prop_or(dict(key=node_stage), node_stage, stage_by_name))
+            for node_stage in set(stage_names)
+        }
+        keys = [key_by_stage_name[node_stage] for node_stage in stage_names]
+        names = node_columns[column_index[node_name_key]]
+        humanized_names = {name: humanize(name) for name in set(names)}
+
+        # Every node has the same properties: those of resource.data except settings, raw_data and graph,
+        # then the columns
+        properties = R.merge(
+            R.omit(['settings', 'rawData', 'graph'], R.prop('data', resource)),
+            R.from_pairs(zip(columns, columns))
+        )
+        property_keys = list(R.keys(properties))
+        default_property_values = list(R.values(properties))
+        property_positions = [property_keys.index(column) for column in columns]
+        name_position = property_keys.index(node_name_key)
+
+        # The stages are ordered by their last node, since accumulate_nodes moves a stage to the end for each node
+        last_row_of_key = {key: i for i, key in enumerate(keys)}
+        accum = {key: [] for key in sorted(last_row_of_key, key=last_row_of_key.get)}
+        for i, row in enumerate(zip(*node_columns)):
+            property_values = list(default_property_values)
+            for position, value in zip(property_positions, row):
+                property_values[position] = value
+            property_values[name_position] = humanized_names[names[i]]
+            accum[keys[i]].append(
+                dict(
+                    value=values[i],
+                    type='Feature',
+                    geometry=dict(
+                        type='Point',
+                        coordinates=locations[i]['location']
+                    ),
+                    name=names[i],
+                    isGeneralized=locations[i]['isGeneralized'],
+                    properties=list(property_keys),
+                    propertyValues=property_values
                 )
-            }
+            )
+        return accum
+
+    node_columns = create_raw_node_columns(delineator, resource)
+    nodes_by_stage = accumulate_node_columns(node_columns) if node_columns is not None else None
+    if nodes_by_stage is None:
+        # Fall back to reducing the nodes a row at a time
+        raw_nodes = create_raw_nodes(delineator, resource)
+        nodes_by_stage = R.reduce(
+            lambda accum, i_and_node: accumulate_nodes(accum, i_and_node[1], i_and_node[0]),
+            {},
+            enumerate(raw_nodes)
         )
+    return nodes_by_stage
+
 
-    raw_nodes = create_raw_nodes(delineator, resource)
+def extend_nodes_by_stage(nodes_by_stage, appended_nodes_by_stage):
+    """
+        Appends the nodes of later rows to nodes_by_stage in place. The stages that gain nodes move to the end
+        in the order of appended_nodes_by_stage, so the stages stay ordered by their latest node. Each call costs
+        the number of appended nodes, not of the nodes already in nodes_by_stage
+    :param nodes_by_stage: Nodes keyed by stage key. Its lists are extended
+    :param appended_nodes_by_stage: Nodes of later rows keyed by stage key
+    :return: nodes_by_stage
+    """
+    for key, nodes in appended_nodes_by_stage.items():
+        stage_nodes = nodes_by_stage.pop(key, [])
+        stage_nodes.extend(nodes)
+        nodes_by_stage[key] = stage_nodes
+    return nodes_by_stage
 
-    # Reduce the nodes
-    nodes_by_stage = R.reduce(
-        lambda accum, i_and_node: accumulate_nodes(accum, i_and_node[1], i_and_node[0]),
-        {},
-        enumerate(raw_nodes)
+
+def merge_nodes_by_stage(nodes_by_stage, appended_nodes_by_stage):
+    """
+        Like extend_nodes_by_stage, but returns a new dict and leaves nodes_by_stage unchanged
+    :param nodes_by_stage: Nodes keyed by stage key
+    :param appended_nodes_by_stage: Nodes of later rows keyed by stage key
+    :return: A new dict of the nodes keyed by stage key
+    """
+    return extend_nodes_by_stage(
+        {key: list(nodes) for key, nodes in nodes_by_stage.items()},
+        appended_nodes_by_stage
     )
+
+
+def generate_sankey_data(resource):
+    """
+        Generates nodes and links for the given Resouce object
+    :param resource:  Resource object
+    :return: A dict containing nodes and links. nodes are a dict key by stage name
+        Results can be assigned to resource.data.sankey and saved
+    """
+    return create_sankey_graph(resource, generate_sankey_nodes_by_stage(resource))
+
+
+def generate_sankey_data_from_lines(resource, lines, chunk_size, keep_rows=True):
+    """
+        Version of generate_sankey_data that reads the rows from lines instead of resource.data.rawData. The lines
+        are read and converted to nodes chunk_size lines at a time and the nodes of each chunk are appended to those
+        of the previous chunks. Guessed links are created from the nodes alone, so the rows are only kept if
+        keep_rows, such as to store them as data.rawData, or if the settings give explicit links, which are read
+        from the rows. Otherwise only the nodes are held in memory
+    :param resource: Resource object. Its data.rawData is ignored
+    :param lines: Iterable of delineated rows, such as an open file. Blank lines are skipped
+    :param chunk_size: The number of lines to convert to nodes at a time
+    :param keep_rows: Default True. False to not return the rows
+    :return: A tuple of the rows that were read, None unless keep_rows, and the graph of generate_sankey_data
+    """
+    explicit_links = R.item_path_or(False, ['data', 'settings', 'link_start_node_key'], resource)
+    rows = [] if keep_rows or explicit_links else None
+    nodes_by_stage = {}
+    for chunk in chunk_lines(lines, chunk_size):
+        extend_nodes_by_stage(
+            nodes_by_stage,
+            generate_sankey_nodes_by_stage(R.fake_lens_path_set(['data', 'rawData'], chunk, resource))
+        )
+        if rows is not None:
+            rows.extend(chunk)
+    graph = create_sankey_graph(R.fake_lens_path_set(['data', 'rawData'], rows or [], resource), nodes_by_stage)
+    return (rows if keep_rows else None), graph
+
+
+def create_sankey_graph(resource, nodes_by_stage):
+    """
+        Creates the graph of generate_sankey_data from the nodes of the resource
+    :param resource: Resource object
+    :param nodes_by_stage: The nodes of the resource keyed by stage key
+    :return: A dict containing nodes, nodes_by_stage and links
+    """
+
+    settings = R.item_path(['data', 'settings'], resource)
+    stages = R.prop('stages', settings)
+    value_key = R.prop('valueKey', settings)
+    delineator = R.prop_or(';', 'delineator', settings)
+
+    link_start_node_key = R.prop_or(None, 'linkStartNodeKey', settings)
+    link_end_node_key = R.prop_or(None, 'linkEndNodeKey', settings)
+    link_value_key = R.prop_or(None, 'linkValueKey', settings)
+    link_color_key = R.prop_or(None, 'linkColorKey', settings)
+
     nodes = R.flatten(R.values(nodes_by_stage))
     # See if there are explicit links
     if R.item_path_or(False, ['data', 'settings', 'link_start_node_key'], resource):
@@ -260,7 +698,7 @@ def generate_sankey_data(resource):
         )
     else:
         # Guess links from nodes and stages
-        links = create_links(stages, value_key, nodes_by_stage)
+        links = create_links(stages, value_key, nodes_by_stage, resource_number_parser(resource), settings)
     return dict(
         nodes=nodes,
         nodes_by_stage=nodes_by_stage,
@@ -269,23 +707,163 @@ def generate_sankey_data(resource):
     )
 
 
-def accumulate_sankey_graph(accumulated_graph, resource):
+def is_compact_sankey_graph(graph):
     """
-        Given an accumulated graph and
-        and a current Resource object, process the resource object and add the results to the accumulated graph
-    :param accumulated_graph:
-    :param resource: A Resource
-    :return:
+        True if the graph is in the compact format of compact_sankey_graph
+    :param graph: A Sankey graph, e.g. Resource.data.graph
+    :return: True or False
     """
+    return isinstance(graph, dict) and graph.get('format') == COMPACT_SANKEY_GRAPH_FORMAT
 
-    links = R.item_path(['graph', 'links'], resource.data)
-    nodes = R.item_path(['graph', 'nodes'], resource.data)
 
-    # Combine the nodes and link with previous accumulated_graph nodes and links
+def compact_sankey_graph(graph):
+    """
+        Converts a graph from generate_sankey_data that has been indexed by index_sankey_graph to the compact format
+        stored in Resource.data.graph. Instead of each node carrying all of its properties and each link carrying
+        its nodes, the distinct property keys and values are stored once, the nodes are stored as parallel arrays
+        and the links as [source, target, value] index triples:
+        dict(
+            format='compact',
+            # The stage keys, which nodes.stage indexes
+            stages=['source', 'conversion', ...],
+            # The distinct lists of property keys, which nodes.properties indexes
+            propertyKeys=[['material', 'siteName', ...]],
+            # The distinct property values, which nodes.propertyValues index
+            propertyValues=['Minerals', 'Other global imports', ...],
+            nodes=dict(name=[...], stage=[...], value=[...], lon=[...], lat=[...], isGeneralized=[...],
+                properties=[...], propertyValues=[[...], ...]),
+            links=[[0, 5, 22469843.0], ...],
+            # Only present if any link has a color
+            linkColors=[...]
+        )
+        Use expand_sankey_graph, expand_sankey_nodes, or expand_sankey_links to restore nodes and links
+    :param graph: The indexed graph
+    :return: The compact graph
+    """
+    nodes_by_stage = R.prop_or({}, 'nodes_by_stage', graph)
+    stage_index_by_node_id = {
+        id(node): i for i, stage_nodes in enumerate(nodes_by_stage.values()) for node in stage_nodes
+    }
+
+    def index_of(indexed, index_by_key, value):
+        # Index the value by type too since 1, 1.0 and True are equal keys.
+        # Unhashable values are indexed by their serialization
+        key = (type(value), value if isinstance(value, (str, int, float, bool, type(None))) else node_fingerprint(value))
+        if key not in index_by_key:
+            index_by_key[key] = len(indexed)
+            indexed.append(value)
+        return index_by_key[key]
+
+    property_keys, property_key_index = [], {}
+    property_values, property_value_index = [], {}
+    compact_nodes = dict(name=[], stage=[], value=[], lon=[], lat=[], isGeneralized=[], properties=[],
+                         propertyValues=[])
+    for node in R.prop('nodes', graph):
+        # Coordinates are [lon, lat]
+        lon, lat = (list(node['geometry']['coordinates']) + [None, None])[0:2]
+        compact_nodes['name'].append(node['name'])
+        compact_nodes['stage'].append(stage_index_by_node_id.get(id(node)))
+        compact_nodes['value'].append(node['value'])
+        compact_nodes['lon'].append(lon)
+        compact_nodes['lat'].append(lat)
+        compact_nodes['isGeneralized'].append(node['isGeneralized'])
+        compact_nodes['properties'].append(index_of(property_keys, property_key_index, tuple(node['properties'])))
+        compact_nodes['propertyValues'].append([
+            index_of(property_values, property_value_index, value) for value in node['propertyValues']
+        ])
+
+    links = R.prop('links', graph)
+    link_colors = [link.get('color') for link in links]
+    return R.merge(
+        dict(
+            format=COMPACT_SANKEY_GRAPH_FORMAT,
+            stages=list(R.keys(nodes_by_stage)),
+            propertyKeys=R.map(list, property_keys),
+            propertyValues=property_values,
+            nodes=compact_nodes,
+            links=[[link['source'], link['target'], link['value']] for link in links]
+        ),
+        dict(linkColors=link_colors) if any(color is not None for color in link_colors) else {}
+    )
+
+
+def expand_sankey_nodes(graph, fields=None):
+    """
+        Expands the nodes of a compact graph to the node dicts of generate_sankey_data, with their node_index
+    :param graph: The compact graph
+    :param fields: Optional node fields to expand, e.g. ['name', 'value']. Defaults to all fields
+    :return: The node dicts, limited to fields
+    """
+    compact_nodes = R.prop('nodes', graph)
+    property_keys = R.prop('propertyKeys', graph)
+    property_values = R.prop('propertyValues', graph)
+    expand = dict(
+        value=lambda i: compact_nodes['value'][i],
+        type=lambda i: 'Feature',
+        geometry=lambda i: dict(type='Point', coordinates=[compact_nodes['lon'][i], compact_nodes['lat'][i]]),
+        name=lambda i: compact_nodes['name'][i],
+        isGeneralized=lambda i: compact_nodes['isGeneralized'][i],
+        properties=lambda i: list(property_keys[compact_nodes['properties'][i]]),
+        propertyValues=lambda i: [property_values[j] for j in compact_nodes['propertyValues'][i]],
+        node_index=lambda i: i
+    )
+    field_expanders = [
+        (field, expander) for field, expander in expand.items() if fields is None or field in fields
+    ]
+    return [
+        {field: expander(i) for field, expander in field_expanders}
+        for i in range(len(compact_nodes['name']))
+    ]
+
+
+def expand_sankey_links(graph, fields=None):
+    """
+        Expands the links of a compact graph to dicts with source, target and value and color if defined
+    :param graph: The compact graph
+    :param fields: Optional link fields to expand, e.g. ['source', 'target']. Defaults to all fields
+    :return: The link dicts, limited to fields
+    """
+    link_colors = R.prop_or(None, 'linkColors', graph)
+    return [
+        {
+            field: value for field, value in R.merge(
+                dict(source=link[0], target=link[1], value=link[2]),
+                dict(color=link_colors[i]) if link_colors else {}
+            ).items() if fields is None or field in fields
+        }
+        for i, link in enumerate(R.prop('links', graph))
+    ]
+
+
+def expand_sankey_graph(graph):
+    """
+        Expands a compact graph to the indexed form of generate_sankey_data and index_sankey_graph, where
+        each link has its source_node and target_node. Graphs that aren't compact are returned as is
+    :param graph: The graph
+    :return: dict with nodes, nodes_by_stage and links
+    """
+    if not is_compact_sankey_graph(graph):
+        return graph
+    nodes = expand_sankey_nodes(graph)
+    stages = R.prop('stages', graph)
+    nodes_by_stage = {stage: [] for stage in stages}
+    for node, stage in zip(nodes, graph['nodes']['stage']):
+        if stage is not None:
+            nodes_by_stage[stages[stage]].append(node)
     return dict(
-        nodes=R.concat(R.prop_or([], 'nodes', accumulated_graph), nodes),
-        # Naively create a link between every node of consecutive stages
-        links=R.concat(R.prop_or([], 'links', accumulated_graph), links)
+        nodes=nodes,
+        nodes_by_stage=nodes_by_stage,
+        links=R.map(
+            lambda link: R.merge(
+                dict(
+                    source_node=nodes[link['source']],
+                    target_node=nodes[link['target']],
+                    value=link['value']
+                ),
+                R.pick(['color', 'source', 'target'], link)
+            ),
+            expand_sankey_links(graph)
+        )
     )
 
 
@@ -293,40 +871,278 @@ def index_sankey_graph(graph):
     """
         Once all nodes are generated for a sankey graph the nodes need indices.
         This updates each node with and index property. Links also need the node indices,
-        so each link gets source and target based on its source_node and target_node
+        so each link gets source and target based on its source_node and target_node.
+        Nodes are indexed by identity, so a link whose source_node and target_node are the graph's node
+        instances is resolved in constant time. Links with copies of the nodes, such as links loaded from json,
+        are resolved by the value of the node
     :param graph:
     :return: Updates graph.nodes, adding an index to each
     """
 
     nodes = R.prop('nodes', graph)
+    node_index_by_id = {}
     for (i, node) in enumerate(nodes):
         node['node_index'] = i
+        node_index_by_id[id(node)] = i
+
+    # Only built if a link has a copy of a node
+    node_index_by_fingerprint = {}
+
+    def resolve_node_index(node):
+        if id(node) in node_index_by_id:
+            return node_index_by_id[id(node)]
+        if not node_index_by_fingerprint:
+            for (i, indexed_node) in enumerate(nodes):
+                # Like nodes.index, the first equal node wins
+                node_index_by_fingerprint.setdefault(node_fingerprint(indexed_node), i)
+        index = R.prop_or(None, node_fingerprint(node), node_index_by_fingerprint)
+        # Nodes that are equal but don't serialize the same, e.g. 1 and 1.0, fall back to a search
+        return index if index is not None else nodes.index(node)
+
+    # Plain item access since the ramda functions are too slow for the number of links
     for link in R.prop('links', graph):
-        link['source'] = nodes.index(R.prop('source_node', link))
-        link['target'] = nodes.index(R.prop('target_node', link))
+        link['source'] = resolve_node_index(link['source_node'])
+        link['target'] = resolve_node_index(link['target_node'])
+
+
+def node_fingerprint(node):
+    """
+        Serializes the node so that equal nodes can be looked up by value
+    :param node: A Sankey node
+    :return: The json string of the node with sorted keys
+    """
+    return json.dumps(node, sort_keys=True, default=str)
+
+
+def sankey_node_position_resolver(nodes):
+    """
+        Creates a function that finds the position of a node in nodes. Nodes are found by identity, as in the
+        graphs of generate_sankey_data and expand_sankey_graph. Copies of nodes, as in graphs loaded from json,
+        are found by value, ignoring any node_index
+    :param nodes: The nodes of a graph
+    :return: A function that returns the position of the given node or None if it isn't in nodes
+    """
+    position_by_id = {id(node): i for i, node in enumerate(nodes)}
+    # Only built if a copy of a node is resolved
+    position_by_fingerprint = {}
+
+    def resolve_position(node):
+        if id(node) in position_by_id:
+            return position_by_id[id(node)]
+        if not position_by_fingerprint:
+            for i, graph_node in enumerate(nodes):
+                # The first equal node wins
+                position_by_fingerprint.setdefault(node_fingerprint(R.omit(['node_index'], graph_node)), i)
+        return R.prop_or(None, node_fingerprint(R.omit(['node_index'], node)), position_by_fingerprint)
+
+    return resolve_position
+
+
+def add_sankey_values(value, other_value):
+    """
+        Adds the values of nodes or links, which are None if they couldn't be parsed
+    :return: The sum or None if both are None
+    """
+    if value is None and other_value is None:
+        return None
+    return (value or 0) + (other_value or 0)
 
 
 def create_sankey_graph_from_resources(resources):
     """
-        Given Sankey data process it into Sankey graph data
-    :param resources: Resource instances
-    :return:
+        Combines the graphs of the given resources into one graph. Nodes of different resources with the same stage
+        and name, such as a site that processes several materials, become one node whose value is the sum of theirs.
+        Links between the same combined nodes are likewise summed. Each resource is read once and its nodes and links
+        are appended to the combined ones, so resources can be a queryset iterator
+    :param resources: Iterable of Resource instances
+    :return: The combined graph, indexed as by index_sankey_graph
+    """
+    nodes = []
+    nodes_by_stage = {}
+    links = []
+    node_index_by_stage_and_name = {}
+    link_index_by_node_indices = {}
+
+    for resource in resources:
+        graph = expand_sankey_graph(R.prop_or(None, 'graph', resource.data) or {})
+        graph_nodes = R.prop_or([], 'nodes', graph)
+        if not isinstance(graph_nodes, list):
+            # The default graph of a Resource without data
+            continue
+        resolve_position = sankey_node_position_resolver(graph_nodes)
+        # The index of the combined node of each node of the resource's graph
+        node_indices = [None] * len(graph_nodes)
+        for stage, stage_nodes in R.prop_or({}, 'nodes_by_stage', graph).items():
+            for node in stage_nodes:
+                key = (stage, node['name'])
+                node_index = node_index_by_stage_and_name.get(key)
+                if node_index is None:
+                    node_index = len(nodes)
+                    node_index_by_stage_and_name[key] = node_index
+                    combined_node = R.merge(node, dict(node_index=node_index))
+                    nodes.append(combined_node)
+                    nodes_by_stage.setdefault(stage, []).append(combined_node)
+                else:
+                    nodes[node_index]['value'] = add_sankey_values(nodes[node_index]['value'], node['value'])
+                position = resolve_position(node)
+                if position is not None:
+                    node_indices[position] = node_index
+
+        for link in R.prop_or([], 'links', graph):
+            source, target = [
+                node_indices[position] if position is not None else None
+                for position in [resolve_position(link['source_node']), resolve_position(link['target_node'])]
+            ]
+            if source is None or target is None:
+                logger.warning(f'Resource {resource.id} has a link to a node that is not in its graph. Skipping')
+                continue
+            link_index = link_index_by_node_indices.get((source, target))
+            if link_index is None:
+                link_index_by_node_indices[(source, target)] = len(links)
+                links.append(dict(
+                    source_node=nodes[source],
+                    target_node=nodes[target],
+                    value=link['value'],
+                    source=source,
+                    target=target
+                ))
+            else:
+                links[link_index]['value'] = add_sankey_values(links[link_index]['value'], link['value'])
+
+    return dict(
+        nodes=nodes,
+        nodes_by_stage=nodes_by_stage,
+        links=links
+    )
+
+
+def update_sankey_graph(previous_data, resource_dict):
+    """
+        Updates the graph of previous_data for the data of resource_dict without regenerating the nodes of the rows
+        that previous_data already had. This is possible when the rows of resource_dict.data.rawData start with
+        those of previous_data.rawData, as they do when rows are appended, and when nothing else that affects the
+        nodes has changed besides settings.stages. Only the links between the stages that gained nodes or that are
+        paired differently are recreated.
+    :param previous_data: The data of the resource before the update, including its compact graph
+    :param resource_dict: A resource instance with the updated data
+    :return: The updated graph in the format of compact_sankey_graph or None if the graph must be regenerated
     """
-    unindexed_graph = R.reduce(
-        accumulate_sankey_graph,
-        dict(nodes=[], links=[]),
-        resources
+    graph = R.prop_or(None, 'graph', previous_data)
+    if not is_compact_sankey_graph(graph):
+        return None
+    data = R.prop('data', resource_dict)
+    settings = R.prop('settings', data)
+    previous_settings = R.prop('settings', previous_data)
+    # Explicit links are created from all the rows
+    if R.prop_or(False, 'link_start_node_key', settings):
+        return None
+    # Everything but the stages and rows that went into the previous nodes must be unchanged
+    if R.omit(['stages'], settings) != R.omit(['stages'], previous_settings) or \
+            R.omit(['settings', 'rawData', 'graph'], data) != R.omit(['settings', 'rawData', 'graph'], previous_data):
+        return None
+    raw_data = R.prop('rawData', data)
+    previous_raw_data = R.prop('rawData', previous_data)
+    if isinstance(raw_data, dict) != isinstance(previous_raw_data, dict) or \
+            (isinstance(raw_data, dict) and R.omit(['nodes'], raw_data) != R.omit(['nodes'], previous_raw_data)):
+        return None
+    rows = raw_data_rows('nodes', raw_data)
+    previous_rows = raw_data_rows('nodes', previous_raw_data)
+    if len(rows) < len(previous_rows) or rows[:len(previous_rows)] != previous_rows:
+        return None
+
+    previous_graph = expand_sankey_graph(graph)
+    previous_nodes_by_stage = previous_graph['nodes_by_stage']
+    # The previous nodes must keep their stage keys under the new stages
+    stage_key = R.prop('stageKey', settings)
+    stage_by_name = stages_by_name(R.prop('stages', settings))
+    for key, nodes in previous_nodes_by_stage.items():
+        for node in nodes:
+            node_stage = node['propertyValues'][node['properties'].index(stage_key)]
+            if R.prop('key', R.prop_or(dict(key=node_stage), node_stage, stage_by_name)) != key:
+                return None
+    options = link_options(settings)
+    previous_pairs = stage_link_pairs(R.prop('stages', previous_settings), previous_nodes_by_stage, options['strategy'])
+    # Stages that are listed twice can be paired twice, which we can't tell apart in the previous links
+    if len(set(previous_pairs)) != len(previous_pairs):
+        return None
+
+    appended_nodes_by_stage = generate_sankey_nodes_by_stage(
+        R.fake_lens_path_set(['data', 'rawData'], rows[len(previous_rows):], resource_dict)
+    ) if len(rows) > len(previous_rows) else {}
+    nodes_by_stage = merge_nodes_by_stage(previous_nodes_by_stage, appended_nodes_by_stage)
+
+    # Group the previous links by the stages of their nodes so that those of unchanged stage pairs can be kept
+    stage_of_node = {id(node): key for key, nodes in previous_nodes_by_stage.items() for node in nodes}
+    previous_links_by_pair = {}
+    for link in previous_graph['links']:
+        previous_links_by_pair.setdefault(
+            (stage_of_node[id(link['source_node'])], stage_of_node[id(link['target_node'])]),
+            []
+        ).append(link)
+
+    value_key = R.prop('valueKey', settings)
+    parser = resource_number_parser(resource_dict)
+    plan = stage_link_plan(R.prop('stages', settings), nodes_by_stage, options)
+    check_link_count(nodes_by_stage, plan, options['maxLinks'])
+    links = []
+    for source_key, target_key, targets in plan:
+        pair = (source_key, target_key)
+        if pair in previous_links_by_pair and not (
+                source_key in appended_nodes_by_stage or target_key in appended_nodes_by_stage
+        ):
+            links.extend(previous_links_by_pair[pair])
+        else:
+            links.extend(iter_stage_links(value_key, nodes_by_stage[source_key], targets, parser))
+
+    updated_graph = dict(
+        nodes=R.flatten(R.values(nodes_by_stage)),
+        nodes_by_stage=nodes_by_stage,
+        links=links
     )
-    return index_sankey_graph(unindexed_graph)
+    index_sankey_graph(updated_graph)
+    return compact_sankey_graph(updated_graph)
 
 
-def add_sankey_graph_to_resource_dict(resource_dict):
+def add_sankey_graph_to_resource_dict(resource_dict, previous_data=None):
     """
-        Generate a sankey graph and "set" resource_dict.data.graph to it
+        Generate a sankey graph and "set" resource_dict.data.graph to it in the format of compact_sankey_graph
     :param resource_dict: A resource instance with enough data to generate a graph
+    :param previous_data: Optional data of the resource before an update. If its graph can be updated
+        by update_sankey_graph the graph isn't regenerated from all the rows
     :return: The copied resource_dict with data.graph set
     """
-    graph = generate_sankey_data(resource_dict)
-    # Updates the graph
+    compact_graph = update_sankey_graph(previous_data, resource_dict) if previous_data else None
+    if compact_graph is None:
+        graph = generate_sankey_data(resource_dict)
+        # Updates the graph
+        index_sankey_graph(graph)
+        compact_graph = compact_sankey_graph(graph)
+    return R.fake_lens_path_set(['data', 'graph'], compact_graph, resource_dict)
+
+
+def generate_compact_sankey_graph(resource_dict, previous_data=None):
+    """
+        Returns the graph that add_sankey_graph_to_resource_dict sets. This is a module level function
+        so that process pools can run it
+    :param resource_dict: A resource instance with enough data to generate a graph
+    :param previous_data: Optional data of the resource before an update. See add_sankey_graph_to_resource_dict
+    :return: The graph in the format of compact_sankey_graph
+    """
+    return R.item_path(['data', 'graph'], add_sankey_graph_to_resource_dict(resource_dict, previous_data))
+
+
+def add_sankey_graph_from_lines_to_resource_dict(resource_dict, lines, chunk_size=DEFAULT_RAW_DATA_CHUNK_SIZE):
+    """
+        Version of add_sankey_graph_to_resource_dict that reads the rows from lines, such as an uploaded csv file,
+        instead of resource_dict.data.rawData. See generate_sankey_data_from_lines
+    :param resource_dict: A resource instance with data.settings
+    :param lines: Iterable of delineated rows
+    :param chunk_size: The number of lines to convert to nodes at a time
+    :return: The copied resource_dict with data.rawData set to the rows and data.graph to the compact graph
+    """
+    rows, graph = generate_sankey_data_from_lines(resource_dict, lines, chunk_size)
     index_sankey_graph(graph)
-    return R.fake_lens_path_set(['data', 'graph'], graph, resource_dict)
+    return R.compose(
+        R.fake_lens_path_set(['data', 'graph'], compact_sankey_graph(graph)),
+        R.fake_lens_path_set(['data', 'rawData'], rows)
+    )(resource_dict)
@@ -0,0 +1,301 @@
+import copy
+import json
+import logging
+from types import SimpleNamespace
+
+from rescape_python_helpers import ramda as R
+from snapshottest import TestCase
+
+from rescape_region.helpers.sankey_helpers import create_raw_nodes, create_raw_node_columns, string_to_float, \
+    string_column_to_floats, resolve_coordinates, resolve_coordinates_column, generate_sankey_data, index_sankey_graph, \
+    compact_sankey_graph, expand_sankey_graph, expand_sankey_nodes, expand_sankey_links, \
+    add_sankey_graph_to_resource_dict, update_sankey_graph, add_sankey_graph_from_lines_to_resource_dict, number_parser, \
+    create_sankey_graph_from_resources, SankeyLinkLimitError, generate_sankey_data_from_lines
+from rescape_region.schema_models.resource.resource_sample import sample_resources
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class SankeyHelpersTestCase(TestCase):
+
+    def test_create_raw_node_columns(self):
+        for resource in sample_resources:
+            columns = R.item_path(['data', 'settings', 'columns'], resource)
+            node_columns = create_raw_node_columns(';', resource)
+            assert R.map(
+                lambda row: R.from_pairs(zip(columns, row)),
+                zip(*node_columns)
+            ) == create_raw_nodes(';', resource)
+
+    def test_create_raw_node_columns_with_multi_character_delineators(self):
+        resource = R.head(sample_resources)
+        columns = R.item_path(['data', 'settings', 'columns'], resource)
+        for delineator in ['||', '.*', '|', '\\s']:
+            # Re-delineate the sample rows, including values that would match the delineator as a regular expression
+            delineated_resource = R.fake_lens_path_set(['data', 'rawData'], R.map(
+                lambda row: delineator.join([f'{value} a.b' for value in row.split(';')]),
+                R.item_path(['data', 'rawData'], resource)
+            ), resource)
+            node_columns = create_raw_node_columns(delineator, delineated_resource)
+            assert R.map(
+                lambda row: R.from_pairs(zip(columns, row)),
+                zip(*node_columns)
+            ) == create_raw_nodes(delineator, delineated_resource)
+
+    def test_create_raw_node_columns_with_missing_values(self):
+        resource = R.fake_lens_path_set(
+            ['data', 'rawData'],
+            ['Other Global Imports;Shipments, location generalized;NA;Source'],
+            R.head(sample_resources)
+        )
+        assert create_raw_node_columns(';', resource) is None
+
+    def test_string_column_to_floats(self):
+        strings = ['22,469,843', '63.08', ' NA, only for directional/path', '', '3,130']
+        assert string_column_to_floats(strings) == R.map(string_to_float, strings)
+
+    def test_number_parser(self):
+        parser = number_parser(dict(decimalSeparator=',', thousandsSeparator='.'))
+        strings = ['22.469.843', '63,08', '1.162,5', 'NA', '']
+        assert R.map(parser.parse, strings) == [22469843.0, 63.08, 1162.5, None, None]
+        assert parser.parse_column(strings) == R.map(parser.parse, strings)
+        # Parsers are only compiled once per format
+        assert number_parser(dict(decimalSeparator=',', thousandsSeparator='.')) is parser
+        assert number_parser() is number_parser(dict(decimalSeparator='.', thousandsSeparator=','))
+        assert number_parser(dict(thousandsSeparator='')).parse('3,130') is None
+        with self.assertRaises(ValueError):
+            number_parser(dict(decimalSeparator=',', thousandsSeparator=','))
+
+    def test_generate_sankey_data_with_number_format(self):
+        resource = R.head(sample_resources)
+
+        def to_european_row(row):
+            # The value is the last column
+            location, value = row.rsplit(';', 1)
+            return f"{location};{value.replace(',', '.')}"
+
+        european_resource = R.compose(
+            R.fake_lens_path_set(['data', 'settings', 'numberFormat'], dict(decimalSeparator=',', thousandsSeparator='.')),
+            R.fake_lens_path_set(['data', 'rawData'], R.map(to_european_row, R.item_path(['data', 'rawData'], resource)))
+        )(resource)
+        graph = generate_sankey_data(resource)
+        european_graph = generate_sankey_data(european_resource)
+        assert R.map(R.prop('value'), european_graph['nodes']) == R.map(R.prop('value'), graph['nodes'])
+        assert R.map(R.prop('value'), european_graph['links']) == R.map(R.prop('value'), graph['links'])
+
+    def test_resolve_coordinates_column(self):
+        default_location = [4.3517, 50.8503]
+        coordinates = ['51.309933, 3.055030', 'NA', None, '"50.864762, 3.479308"', '50.1 4.2']
+        assert resolve_coordinates_column(default_location, coordinates) == R.map(
+            lambda coordinate: resolve_coordinates(default_location, coordinate, 0),
+            coordinates
+        )
+
+    def test_generate_sankey_data_orders_stages_by_latest_node(self):
+        resource = R.fake_lens_path_set(
+            ['data', 'rawData'],
+            [
+                'RecyPark South;1190 Forest, Belgium;50.810799, 4.314789;Sink;3,130',
+                'Other Global Imports;Shipments, location generalized;51.309933, 3.055030;Source;22,469,843',
+                'RecyPark Nord;Rue du Rupel, 1000 Bruxelles, Belgium;50.880181, 4.377136;Sink;1,162'
+            ],
+            R.head(sample_resources)
+        )
+        graph = generate_sankey_data(resource)
+        assert list(R.keys(graph['nodes_by_stage'])) == ['source', 'sink']
+        assert R.map(R.prop('name'), graph['nodes']) == ['Other Global Imports', 'RecyPark South', 'RecyPark Nord']
+
+    def test_index_sankey_graph(self):
+        graph = generate_sankey_data(R.head(sample_resources))
+        index_sankey_graph(graph)
+        for link in graph['links']:
+            assert graph['nodes'][link['source']] is link['source_node']
+            assert graph['nodes'][link['target']] is link['target_node']
+
+        # Links with copies of the nodes, as when loaded from json, resolve to the equal nodes
+        copied_graph = copy.deepcopy(graph)
+        copied_graph['nodes'] = copy.deepcopy(copied_graph['nodes'])
+        index_sankey_graph(copied_graph)
+        assert R.map(R.props(['source', 'target']), copied_graph['links']) == \
+               R.map(R.props(['source', 'target']), graph['links'])
+
+    def test_compact_sankey_graph(self):
+        graph = generate_sankey_data(R.head(sample_resources))
+        index_sankey_graph(graph)
+        # Compact graphs are stored as json
+        compact_graph = json.loads(json.dumps(compact_sankey_graph(graph)))
+        assert len(json.dumps(compact_graph)) < len(json.dumps(graph))
+
+        expanded_graph = expand_sankey_graph(compact_graph)
+        assert expanded_graph['nodes'] == graph['nodes']
+        assert expanded_graph['nodes_by_stage'] == graph['nodes_by_stage']
+        assert R.map(R.props(['source_node', 'target_node', 'value', 'source', 'target']), expanded_graph['links']) == \
+               R.map(R.props(['source_node', 'target_node', 'value', 'source', 'target']), graph['links'])
+
+        # Only the requested fields are expanded
+        assert expand_sankey_nodes(compact_graph, ['name'])[0] == dict(name=graph['nodes'][0]['name'])
+        assert expand_sankey_links(compact_graph, ['source', 'target'])[0] == \
+               R.pick(['source', 'target'], graph['links'][0])
+
+    def test_update_sankey_graph(self):
+        resource = R.head(sample_resources)
+        raw_data = R.item_path(['data', 'rawData'], resource)
+        previous_data = json.loads(json.dumps(R.prop('data', add_sankey_graph_to_resource_dict(
+            R.fake_lens_path_set(['data', 'rawData'], raw_data[:-3], resource)
+        ))))
+
+        def assert_updates_like_regeneration(updated_resource):
+            graph = update_sankey_graph(previous_data, updated_resource)
+            assert graph is not None
+            assert json.dumps(graph) == json.dumps(
+                R.item_path(['data', 'graph'], add_sankey_graph_to_resource_dict(updated_resource))
+            )
+
+        # Appended rows
+        assert_updates_like_regeneration(resource)
+        # Appended rows of a stage that already had nodes
+        assert_updates_like_regeneration(R.fake_lens_path_set(
+            ['data', 'rawData'],
+            raw_data[:-3] + ['Tri Center;Rue de la Gare, 1000 Bruxelles, Belgium;50.8503, 4.3517;Conversion;1,000'],
+            resource
+        ))
+        # Only the order of the stages changed
+        stages = R.item_path(['data', 'settings', 'stages'], resource)
+        assert_updates_like_regeneration(R.compose(
+            R.fake_lens_path_set(['data', 'settings', 'stages'], stages[:3] + [stages[4], stages[3]] + stages[5:]),
+            R.fake_lens_path_set(['data', 'rawData'], raw_data[:-3])
+        )(resource))
+
+        # Changed rows and settings that affect the nodes require regeneration
+        assert update_sankey_graph(
+            previous_data,
+            R.fake_lens_path_set(['data', 'rawData'], raw_data[1:], resource)
+        ) is None
+        assert update_sankey_graph(
+            previous_data,
+            R.fake_lens_path_set(['data', 'settings', 'defaultLocation'], [0, 0], resource)
+        ) is None
+
+    def test_add_sankey_graph_from_lines_to_resource_dict(self):
+        for resource in sample_resources:
+            raw_data = R.item_path(['data', 'rawData'], resource)
+            # Lines as read from a file, with blank lines and line endings
+            lines = iter(R.map(lambda row: f'{row}\r\n', raw_data) + ['\n'])
+            resource_dict = add_sankey_graph_from_lines_to_resource_dict(
+                R.fake_lens_path_set(['data', 'rawData'], [], resource),
+                lines,
+                chunk_size=3
+            )
+            assert R.item_path(['data', 'rawData'], resource_dict) == raw_data
+            assert json.dumps(R.item_path(['data', 'graph'], resource_dict)) == json.dumps(
+                R.item_path(['data', 'graph'], add_sankey_graph_to_resource_dict(resource))
+            )
+
+    def test_generate_sankey_data_from_lines_without_rows(self):
+        for resource in sample_resources:
+            rows, graph = generate_sankey_data_from_lines(
+                R.fake_lens_path_set(['data', 'rawData'], [], resource),
+                iter(R.item_path(['data', 'rawData'], resource)),
+                chunk_size=2,
+                keep_rows=False
+            )
+            assert rows is None
+            index_sankey_graph(graph)
+            expected = generate_sankey_data(resource)
+            index_sankey_graph(expected)
+            assert json.dumps(compact_sankey_graph(graph)) == json.dumps(compact_sankey_graph(expected))
+
+    def test_create_sankey_graph_from_resources(self):
+        resource = R.head(sample_resources)
+        graph = generate_sankey_data(resource)
+        index_sankey_graph(graph)
+        # Stored graphs are compact, or in the indexed or unindexed format of generate_sankey_data if stored earlier
+        graphs = [
+            R.item_path(['data', 'graph'], add_sankey_graph_to_resource_dict(resource)),
+            json.loads(json.dumps(graph)),
+            json.loads(json.dumps(generate_sankey_data(resource)))
+        ]
+        resources = [SimpleNamespace(id=i, data=R.merge(resource['data'], dict(graph=g))) for i, g in enumerate(graphs)]
+
+        combined_graph = create_sankey_graph_from_resources(iter(resources))
+        # The nodes of each resource have the same stage and name, so they are combined and their values summed
+        assert R.map(R.prop('name'), combined_graph['nodes']) == R.map(R.prop('name'), graph['nodes'])
+        assert R.map(R.prop('value'), combined_graph['nodes']) == R.map(
+            lambda node: node['value'] * len(graphs),
+            graph['nodes']
+        )
+        assert R.map(R.props(['source', 'target']), combined_graph['links']) == \
+               R.map(R.props(['source', 'target']), graph['links'])
+        for link, combined_link in zip(graph['links'], combined_graph['links']):
+            assert combined_link['value'] == link['value'] * len(graphs)
+            assert combined_graph['nodes'][combined_link['source']] is combined_link['source_node']
+        assert list(combined_graph['nodes_by_stage']) == list(graph['nodes_by_stage'])
+
+        # Different resources combine their distinct nodes
+        all_resources = [
+            SimpleNamespace(id=i, data=R.item_path(['data'], add_sankey_graph_to_resource_dict(sample_resource)))
+            for i, sample_resource in enumerate(sample_resources)
+        ]
+        combined_graph = create_sankey_graph_from_resources(all_resources)
+        assert len(combined_graph['nodes']) == len(set(
+            (stage, node['name'])
+            for sample_resource in sample_resources
+            for stage, nodes in generate_sankey_data(sample_resource)['nodes_by_stage'].items()
+            for node in nodes
+        ))
+        assert compact_sankey_graph(combined_graph)
+
+    def test_link_strategies(self):
+        resource = R.head(sample_resources)
+        graph = generate_sankey_data(resource)
+        nodes_by_stage = graph['nodes_by_stage']
+
+        def stage_pairs(graph):
+            stage_of_node = {id(node): key for key, nodes in graph['nodes_by_stage'].items() for node in nodes}
+            return list(dict.fromkeys(
+                (stage_of_node[id(link['source_node'])], stage_of_node[id(link['target_node'])])
+                for link in graph['links']
+            ))
+
+        # By default each stage is linked to every node of the next stage with nodes
+        assert len(graph['links']) == sum(
+            len(nodes_by_stage[source]) * len(nodes_by_stage[target]) for source, target in stage_pairs(graph)
+        )
+        # The targets of each stage
+        targets_graph = generate_sankey_data(
+            R.fake_lens_path_set(['data', 'settings', 'linkStrategy'], 'targets', resource)
+        )
+        assert stage_pairs(targets_graph) == [
+            ('source', 'conversion'), ('conversion', 'distribution'), ('distribution', 'demand'),
+            ('demand', 'reconversion'), ('demand', 'sink'), ('reconversion', 'demand')
+        ]
+        # The top target of the next stage
+        top_targets_graph = generate_sankey_data(R.compose(
+            R.fake_lens_path_set(['data', 'settings', 'linkStrategy'], 'topTargets'),
+            R.fake_lens_path_set(['data', 'settings', 'linkTopTargets'], 1)
+        )(resource))
+        assert stage_pairs(top_targets_graph) == stage_pairs(graph)
+        assert len(top_targets_graph['links']) == sum(
+            len(nodes_by_stage[source]) for source, _ in stage_pairs(graph)
+        )
+        # Distribution links to the demand node with the largest value
+        distribution_links = [
+            link for link in top_targets_graph['links'] if link['source_node'] in nodes_by_stage['distribution']
+        ]
+        assert R.map(lambda link: link['target_node']['name'], distribution_links) == \
+               ['Residential Buildings (all typologies)']
+
+        # Too many links fail before they are created
+        with self.assertRaises(SankeyLinkLimitError):
+            generate_sankey_data(R.fake_lens_path_set(['data', 'settings', 'maxLinks'], 5, resource))
+
+        # Incremental updates link the same way
+        targets_resource = R.fake_lens_path_set(['data', 'settings', 'linkStrategy'], 'targets', resource)
+        raw_data = R.item_path(['data', 'rawData'], targets_resource)
+        previous_data = json.loads(json.dumps(R.prop('data', add_sankey_graph_to_resource_dict(
+            R.fake_lens_path_set(['data', 'rawData'], raw_data[:-3], targets_resource)
+        ))))
+        assert json.dumps(update_sankey_graph(previous_data, targets_resource)) == json.dumps(
+            R.item_path(['data', 'graph'], add_sankey_graph_to_resource_dict(targets_resource))
+        )
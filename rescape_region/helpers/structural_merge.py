@@ -0,0 +1,43 @@
+def plain(value):
+    """
+        Converts a value of new data, which may contain Graphene input objects, to plain dicts and lists
+    :param value: The value
+    :return: The plain value
+    """
+    if isinstance(value, dict):
+        return {key: plain(child) for key, child in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(child) for child in value]
+    return value
+
+
+def override_list(base, nxt):
+    # The new list replaces the existing one
+    return nxt
+
+
+def override_non_null_list(base, nxt):
+    # A non-empty new list replaces the existing one
+    return nxt if nxt else base
+
+
+def merge_structurally(base, nxt, list_strategy=override_list):
+    """
+        Deep merges nxt into base in one pass without modifying either. Dicts are merged key by key, lists are
+        combined by list_strategy and any other value of nxt, including one whose type differs from base's, replaces
+        base's value. Only the dicts along the paths that nxt reaches are copied, and only one level at a time.
+        The subtrees of base that nxt doesn't reach are shared by the result rather than copied, so the cost
+        depends on the size of nxt, not of base
+    :param base: The existing value, such as the json of a JSONField
+    :param nxt: The new value. Graphene input objects are converted to plain dicts and lists
+    :param list_strategy: Default override_list. A function of the base and new list returning the merged list
+    :return: The merged value
+    """
+    if isinstance(base, dict) and isinstance(nxt, dict):
+        merged = dict(base)
+        for key, value in nxt.items():
+            merged[key] = merge_structurally(base[key], value, list_strategy) if key in base else plain(value)
+        return merged
+    if isinstance(base, list) and isinstance(nxt, (list, tuple)):
+        return list_strategy(base, plain(nxt))
+    return plain(nxt)
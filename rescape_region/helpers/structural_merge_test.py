@@ -0,0 +1,35 @@
+import copy
+
+from rescape_python_helpers import ramda as R
+from snapshottest import TestCase
+
+from rescape_region.helpers.structural_merge import merge_structurally, override_non_null_list
+
+existing = dict(
+    mapbox=dict(viewport=dict(latitude=50.5, longitude=2.0, zoom=7)),
+    userSearch=dict(userSearchLocations=[dict(searchLocation=dict(id=1))]),
+    tags=['a', 'b'],
+    name='Oslo'
+)
+
+
+class StructuralMergeTestCase(TestCase):
+
+    def test_merge_structurally(self):
+        original = copy.deepcopy(existing)
+        merged = merge_structurally(existing, dict(mapbox=dict(viewport=dict(zoom=15)), tags=['c'], name=None))
+        assert merged == R.merge(existing, dict(
+            mapbox=dict(viewport=dict(latitude=50.5, longitude=2.0, zoom=15)),
+            tags=['c'],
+            name=None
+        ))
+        # Neither input is modified and the untouched subtrees are shared
+        assert existing == original
+        assert merged['userSearch'] is existing['userSearch']
+        assert merged['mapbox'] is not existing['mapbox']
+
+    def test_list_strategy(self):
+        assert merge_structurally(existing, dict(tags=[]))['tags'] == []
+        assert merge_structurally(existing, dict(tags=[]), override_non_null_list)['tags'] == ['a', 'b']
+        # A value of another type replaces the existing one
+        assert merge_structurally(existing, dict(tags=dict(a=1)))['tags'] == dict(a=1)
@@ -0,0 +1,146 @@
+import hashlib
+import re
+
+from django.db import connection, TransactionManagementError
+from django.db.models import Q
+from rescape_python_helpers import ramda as R
+
+# The number of prefixes that allocate_unique_props reads per query
+PREFIX_QUERY_BATCH_SIZE = 100
+
+
+def next_free_value(value, taken):
+    """
+        The value or, if it's taken, the value suffixed with the lowest free number, as in key, key1, key2...
+    :param value: The value to make unique
+    :param taken: The collection of taken values
+    :return: The free value
+    """
+    if value not in taken:
+        return value
+    suffix = 1
+    while f'{value}{suffix}' in taken:
+        suffix += 1
+    return f'{value}{suffix}'
+
+
+class TakenByOthers:
+    """
+        The values of owners that are taken by owners other than owner, so that an update can keep its own value
+    """
+
+    def __init__(self, owners, owner):
+        self.owners = owners
+        self.owner = owner
+
+    def __contains__(self, value):
+        return value in self.owners and (self.owner is None or self.owners[value] != self.owner)
+
+
+def unique_value_lock_id(django_class, prop, value):
+    """
+        The id of the advisory lock that allocations of value take. next_free_value only appends digits, so every
+        value that an allocation of value can produce has the same base without trailing digits as value.
+        Allocations that could produce the same value thus share a lock
+    :param django_class: The model class
+    :param prop: The unique prop
+    :param value: The value to allocate
+    :return: A signed 64 bit integer
+    """
+    name = f'{django_class._meta.db_table}.{prop}:{re.sub(r"[0-9]+$", "", value)}'
+    return int.from_bytes(hashlib.md5(name.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+def lock_unique_values(django_class, prop, values):
+    """
+        Takes the transaction level advisory locks of unique_value_lock_id on Postgres, so that a concurrent
+        allocation of the same values waits until the allocating transaction commits and then sees its values.
+        The locks are taken in order so that concurrent batches can't deadlock
+    :param django_class: The model class
+    :param prop: The unique prop
+    :param values: The values to allocate
+    :raises TransactionManagementError: Outside of a transaction, where the locks would be released at once
+    """
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            f'Unique {prop} values of {django_class.__name__} must be allocated in the transaction that saves them'
+        )
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for lock_id in sorted(set(unique_value_lock_id(django_class, prop, value) for value in values)):
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [lock_id])
+
+
+def allocate_unique_props(django_class, prop, additional_filter_props, instances_data):
+    """
+        Makes the prop of each of instances_data unique among the existing instances and among each other.
+        The values of all instances that start with the requested values are read, a batch of prefixes per query
+        for each scope of additional_filter_props, and duplicates are suffixed by next_free_value in memory.
+        The models with unique keys have a varchar_pattern_ops index of the key for these prefix queries.
+        Soft deleted instances are included, since they keep their values. An update keeps a value that it already
+        owns. Concurrent allocations are serialized by lock_unique_values, so this must run in the transaction
+        that saves the instances
+    :param django_class: The model class to query
+    :param prop: The prop to make unique, e.g. 'key'
+    :param additional_filter_props: Other props, such as user id, that scope the uniqueness. This can be a dict or
+    a function expecting an instance data dict and returning a dict
+    :param instances_data: dicts of the instances to create or update. Those with an id are updates
+    :return: instances_data with each prop replaced by its unique value
+    """
+    values = [R.prop_or(None, prop, instance_data) for instance_data in instances_data]
+    if not any(values):
+        return instances_data
+    lock_unique_values(django_class, prop, [value for value in values if value])
+
+    def scope(instance_data):
+        return additional_filter_props(instance_data) if callable(additional_filter_props) else \
+            additional_filter_props or {}
+
+    all_objects = django_class.all_objects if hasattr(django_class, 'all_objects') else django_class.objects
+    # The owner of each value per scope, an id or for values allocated here the index of the instance data
+    owners_by_scope = {}
+    for instance_data, value in zip(instances_data, values):
+        if value:
+            owners_by_scope.setdefault(tuple(sorted(scope(instance_data).items())), set()).add(value)
+    for scope_items, scope_values in owners_by_scope.items():
+        scope_values = sorted(scope_values)
+        owners = {}
+        for i in range(0, len(scope_values), PREFIX_QUERY_BATCH_SIZE):
+            owners.update(all_objects.filter(
+                R.reduce(
+                    lambda q, value: q | Q(**{f'{prop}__startswith': value}),
+                    Q(),
+                    scope_values[i:i + PREFIX_QUERY_BATCH_SIZE]
+                ),
+                **dict(scope_items)
+            ).values_list(prop, 'id'))
+        owners_by_scope[scope_items] = owners
+
+    def allocate(index, instance_data, value):
+        if not value:
+            return instance_data
+        owners = owners_by_scope[tuple(sorted(scope(instance_data).items()))]
+        id = R.prop_or(None, 'id', instance_data)
+        unique_value = next_free_value(value, TakenByOthers(owners, id))
+        owners[unique_value] = f'new{index}' if id is None else id
+        return R.merge(instance_data, {prop: unique_value})
+
+    return [allocate(index, instance_data, value) for index, (instance_data, value) in
+            enumerate(zip(instances_data, values))]
+
+
+@R.curry
+def allocate_unique_prop(django_class, prop, additional_filter_props, django_instance_data):
+    """
+        A unique_with function for enforce_unique_props that replaces increment_prop_until_unique. Rather than
+        querying for each candidate value, allocate_unique_props reads all values that start with the prop's value
+        in one query and suffixes the value in memory. The mutation must be transaction.atomic, so that the instance
+        is created before the lock on its value is released
+    :param django_class: The model class to query
+    :param prop: The prop to make unique, e.g. 'key'
+    :param additional_filter_props: Other props, such as user id, to filter by. This can be a dict or a function
+    expecting the django_instance_data and returning a dict
+    :param django_instance_data: The data containing the prop
+    :return: The data merged with the unique prop value
+    """
+    return R.head(allocate_unique_props(django_class, prop, additional_filter_props, [django_instance_data]))
@@ -0,0 +1,43 @@
+import pytest
+from django.db import transaction
+from snapshottest import TestCase
+
+from rescape_region.helpers.unique_values import next_free_value, allocate_unique_prop, unique_value_lock_id, \
+    allocate_unique_props
+from rescape_region.models import Location
+
+
+@pytest.mark.django_db
+class UniqueValuesTestCase(TestCase):
+
+    def test_next_free_value(self):
+        assert next_free_value('place', {'other'}) == 'place'
+        assert next_free_value('place', {'place', 'place1', 'place3'}) == 'place2'
+
+    def test_unique_value_lock_id(self):
+        # Allocations that can produce the same value share a lock
+        assert unique_value_lock_id(Location, 'key', 'place') == unique_value_lock_id(Location, 'key', 'place12')
+        assert unique_value_lock_id(Location, 'key', 'place') != unique_value_lock_id(Location, 'key', 'plaza')
+
+    def test_allocate_unique_prop(self):
+        for key in ['place', 'place1', 'place2', 'placeHolder']:
+            Location.objects.create(key=key, name=key)
+        allocate = allocate_unique_prop(Location, 'key', {})
+        with transaction.atomic():
+            assert allocate(dict(key='place'))['key'] == 'place3'
+            assert allocate(dict(key='plaza'))['key'] == 'plaza'
+            # An update keeps its own key
+            place = Location.objects.get(key='place1')
+            assert allocate(dict(id=place.id, key='place1'))['key'] == 'place1'
+
+    def test_allocate_unique_props(self):
+        place = Location.objects.create(key='place', name='place')
+        with transaction.atomic():
+            # Duplicates within the batch are suffixed too
+            assert [data['key'] for data in allocate_unique_props(Location, 'key', {}, [
+                dict(key='place'),
+                dict(key='place'),
+                dict(id=place.id, key='place'),
+                dict(key='plaza'),
+                dict(name='No key')
+            ]) if 'key' in data] == ['place1', 'place2', 'place', 'plaza']
@@ -0,0 +1,54 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class BackfillCommand(BaseCommand):
+    """
+        Base class of the commands that populate denormalized columns of existing rows. Subclasses give the mixin
+        of the models to backfill, the filter of the rows that lack the columns and backfill_chunk
+    """
+
+    # The mixin of the models that are backfilled when no --model is given
+    mixin = None
+    # An example model label for the --model help
+    example_model = None
+    # Filter arguments of the rows whose columns haven't been populated
+    missing_filter = {}
+    # What --all recomputes, for its help
+    all_help = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='models',
+                            help=f'Only backfill this model, e.g. {self.example_model}. Can be repeated')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='The number of rows to update at a time')
+        parser.add_argument('--all', action='store_true', help=self.all_help)
+
+    def handle(self, *args, **options):
+        """
+        Updates the rows a chunk at a time, each chunk in its own transaction
+        """
+
+        models = [apps.get_model(label) for label in options['models']] if options['models'] else [
+            model for model in apps.get_models() if issubclass(model, self.mixin)
+        ]
+        for model in models:
+            # The base manager includes safe deleted rows, which are backfilled too
+            rows = model._base_manager.all()
+            if not options['all']:
+                rows = rows.filter(**self.missing_filter)
+            ids = list(rows.order_by('pk').values_list('pk', flat=True))
+            updated = 0
+            for start in range(0, len(ids), options['chunk_size']):
+                with transaction.atomic():
+                    updated += self.backfill_chunk(model, ids[start:start + options['chunk_size']])
+            self.stdout.write(f'{model._meta.label}: backfilled {updated} of {len(ids)} rows')
+
+    def backfill_chunk(self, model, ids):
+        """
+            Populates the columns of a chunk of rows
+        :param model: The model class
+        :param ids: The primary keys of the chunk
+        :return: The number of rows updated
+        """
+        raise NotImplementedError('subclasses of BackfillCommand must provide a backfill_chunk() method')
@@ -0,0 +1,22 @@
+from rescape_region.management.backfill_command import BackfillCommand
+from rescape_region.models.geometry_mixin import GeojsonGeometryMixin
+
+
+class Command(BackfillCommand):
+    help = 'Populates the geometry column of GeojsonGeometryMixin models from their geojson'
+    mixin = GeojsonGeometryMixin
+    example_model = 'rescape_region.Location'
+    missing_filter = dict(geometry__isnull=True)
+    all_help = 'Recompute the geometry of every row, not only of rows without one'
+
+    def backfill_chunk(self, model, ids):
+        instances = []
+        for instance in model._base_manager.filter(pk__in=ids).only('pk', 'geojson'):
+            geometry = model.geometry_update_values(dict(geojson=instance.geojson))['geometry']
+            # Rows whose geojson has no geometries stay null
+            if geometry:
+                instance.geometry = geometry
+                instances.append(instance)
+        # geometry is derived from geojson and isn't versioned, so the rows are updated without a revision
+        model._base_manager.bulk_update(instances, ['geometry'])
+        return len(instances)
@@ -0,0 +1,26 @@
+from rescape_region.management.backfill_command import BackfillCommand
+from rescape_region.models.revision_mixin import RevisionModelMixin, REVISION_COLUMNS, revision_columns_by_object_id
+
+
+class Command(BackfillCommand):
+    help = 'Populates the created_at, updated_at and version_number columns of RevisionModelMixin models from their ' \
+           'django-reversion versions'
+    mixin = RevisionModelMixin
+    example_model = 'rescape_region.Region'
+    missing_filter = dict(version_number__isnull=True)
+    all_help = 'Recompute the columns of every row, not only of rows without a version_number'
+
+    def backfill_chunk(self, model, ids):
+        # One aggregate query of the versions per chunk
+        columns_by_object_id = revision_columns_by_object_id(model, ids)
+        instances = []
+        for instance in model._base_manager.filter(pk__in=ids).only('pk'):
+            columns = columns_by_object_id.get(str(instance.pk))
+            # Rows without versions keep null columns, like they had no revision dates before
+            if columns:
+                for column in REVISION_COLUMNS:
+                    setattr(instance, column, columns[column])
+                instances.append(instance)
+        # bulk_update doesn't call save, so it doesn't count as a version
+        model._base_manager.bulk_update(instances, REVISION_COLUMNS)
+        return len(instances)
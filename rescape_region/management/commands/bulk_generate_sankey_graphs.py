@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from rescape_python_helpers import ramda as R
+
+from rescape_region.helpers.sankey_graph_cache import sankey_graph_workers
+from rescape_region.models.resource import Resource
+from rescape_region.schema_models.resource.resource_schema import bulk_upsert_resources
+
+
+class Command(BaseCommand):
+    help = 'Generates the Sankey graphs of many Resources in parallel and saves them in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--region-id', type=int, help='Only generate the graphs of the Resources of this Region')
+        parser.add_argument('--workers', type=int,
+                            help='The number of processes. Defaults to settings.SANKEY_GRAPH_WORKERS or the CPU count')
+
+    def handle(self, *args, **options):
+        """
+        Regenerates the graphs of resources whose data was imported without them. Graphs of unchanged data are reused
+        """
+
+        resources = Resource.objects.filter(deleted__isnull=True)
+        if options['region_id']:
+            resources = resources.filter(region__id=options['region_id'])
+        resource_ids = list(resources.order_by('id').values_list('id', flat=True))
+        workers = sankey_graph_workers(options['workers'])
+        self.stdout.write(f'Generating the graphs of {len(resource_ids)} resources with {workers} processes')
+        updated_resources = bulk_upsert_resources(R.map(lambda id: dict(id=id), resource_ids), workers)
+        self.stdout.write(f'Saved the graphs of {len(updated_resources)} resources')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from rescape_region.helpers.resource_raw_data_helpers import ingest_resource_raw_data, raw_data_summary
+from rescape_region.helpers.sankey_helpers import DEFAULT_RAW_DATA_CHUNK_SIZE
+from rescape_region.models.resource import Resource
+
+
+class Command(BaseCommand):
+    help = 'Replaces the raw data of a Resource with the rows of a csv file and regenerates its Sankey graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource_id', type=int, help='The id of the Resource')
+        parser.add_argument('path', help='The csv file. Its rows must match the columns of resource.data.settings')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_RAW_DATA_CHUNK_SIZE,
+                            help='The number of rows to convert to nodes at a time')
+        parser.add_argument('--header', action='store_true', help='Skip the first row of the file')
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        """
+        Streams the csv file into the Resource a chunk of rows at a time
+        """
+
+        resource = Resource.objects.get(id=options['resource_id'])
+        with open(options['path'], encoding=options['encoding'], newline='') as lines:
+            resource = ingest_resource_raw_data(resource, lines, options['chunk_size'], options['header'])
+        summary = raw_data_summary(resource)
+        self.stdout.write(
+            f"Resource {summary['id']}: {summary['rows']} rows, {summary['nodes']} nodes, {summary['links']} links"
+        )
@@ -1,7 +1,7 @@
 from promise import is_thenable
 from rescape_python_helpers import ramda as R
 
-from rescape_region.schema_models.schema import dump_errors, log_request_body
+from rescape_region.schema_models.schema import dump_errors, log_request_body, is_request_logged
 
 
 class DebugMiddleware(object):
@@ -12,9 +12,9 @@ class DebugMiddleware(object):
     def resolve(self, next, root, info, **args):
         result = next(root, info, **args)
         if is_thenable(result):
-            result.catch(self.on_error)
-            # Top level only
-            if R.length(info.path) == 1:
+            result.catch(lambda error: self.on_error(error, info))
+            # Top level only, and only for sampled requests
+            if R.length(info.path) == 1 and is_request_logged(info.context):
                 result.then(lambda response: log_request_body(info, response))
 
         return result
@@ -0,0 +1,45 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from snapshottest import TestCase
+
+from rescape_region.models import Region
+from rescape_region.schema_models.schema import log_request_body, is_request_logged
+
+
+def graphql_request():
+    request = RequestFactory().post(
+        '/graphql',
+        data=json.dumps(dict(operationName='regions', variables={}, query='query regions { regions { id } }')),
+        content_type='application/json'
+    )
+    request.user = None
+    return request
+
+
+@pytest.mark.django_db
+class DebugMiddlewareTestCase(TestCase):
+
+    def test_log_request_body_never_queries(self):
+        info = SimpleNamespace(context=graphql_request())
+        with self.assertLogs('rescape_graphene', level='DEBUG') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                # An unevaluated queryset isn't counted or listed
+                log_request_body(info, Region.objects.all())
+                log_request_body(info, Region.objects.filter(key='belgium'))
+        assert len(queries.captured_queries) == 0
+        assert any('Query returned an unevaluated query' in line for line in logs.output)
+
+    def test_sampling(self):
+        with override_settings(GRAPHQL_REQUEST_LOG=dict(SAMPLE_RATE=0)):
+            assert not is_request_logged(graphql_request())
+        with override_settings(GRAPHQL_REQUEST_LOG=dict(SAMPLE_RATE=1)):
+            request = graphql_request()
+            assert is_request_logged(request)
+            # Sampling is decided once per request
+            with override_settings(GRAPHQL_REQUEST_LOG=dict(SAMPLE_RATE=0)):
+                assert is_request_logged(request)
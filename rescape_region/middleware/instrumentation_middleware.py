@@ -0,0 +1,308 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from rescape_python_helpers import ramda as R
+
+logger = logging.getLogger('rescape_region.instrumentation')
+
+# Defaults of settings.GRAPHQL_INSTRUMENTATION
+DEFAULT_GRAPHQL_INSTRUMENTATION = dict(
+    # Requests whose path starts with this are instrumented
+    PATH='/graphql',
+    # A top-level field that issues more queries than this is logged as a warning, e.g. an N+1 regression
+    QUERY_COUNT_THRESHOLD=50
+)
+
+# Upper bounds of the histogram buckets of each metric of a field. Each histogram has an additional bucket for
+# larger values
+HISTOGRAM_BUCKETS = dict(
+    wall_ms=[5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000],
+    sql_ms=[1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+    queries=[0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+)
+# Upper bounds of the histogram buckets of each metric of a request. The response is shared by the fields of the
+# request, so its size is recorded once per request
+REQUEST_HISTOGRAM_BUCKETS = dict(
+    response_bytes=[1024, 10240, 102400, 1048576, 10485760]
+)
+
+# The prefix of the field under which the queries of a DataLoader's batches are recorded. See instrumented_as
+DATALOADER_FIELD_PREFIX = 'dataloader:'
+
+
+def new_histograms(buckets_by_metric):
+    """
+        Empty histograms of each metric
+    :param buckets_by_metric: HISTOGRAM_BUCKETS or REQUEST_HISTOGRAM_BUCKETS
+    :return: dict with count, flagged and the counts of the buckets and the sum of each metric
+    """
+    return dict(
+        count=0,
+        flagged=0,
+        metrics={
+            metric: dict(counts=[0] * (len(buckets) + 1), sum=0)
+            for metric, buckets in buckets_by_metric.items()
+        }
+    )
+
+
+_histograms = {}
+_request_histograms = new_histograms(REQUEST_HISTOGRAM_BUCKETS)
+_histograms_lock = threading.Lock()
+
+
+def graphql_instrumentation_settings():
+    """
+        DEFAULT_GRAPHQL_INSTRUMENTATION merged with settings.GRAPHQL_INSTRUMENTATION
+    :return: The settings dict
+    """
+    return R.merge(DEFAULT_GRAPHQL_INSTRUMENTATION, getattr(settings, 'GRAPHQL_INSTRUMENTATION', {}))
+
+
+def add_to_histograms(histograms, buckets_by_metric, metrics):
+    """
+        Adds metrics to the histograms of each metric. Call with _histograms_lock held
+    :param histograms: The histograms from new_histograms
+    :param buckets_by_metric: HISTOGRAM_BUCKETS or REQUEST_HISTOGRAM_BUCKETS
+    :param metrics: dict keyed by the keys of buckets_by_metric and flagged
+    :return: None
+    """
+    histograms['count'] += 1
+    if metrics['flagged']:
+        histograms['flagged'] += 1
+    for metric, buckets in buckets_by_metric.items():
+        histogram = histograms['metrics'][metric]
+        histogram['counts'][bisect.bisect_left(buckets, metrics[metric])] += 1
+        histogram['sum'] += metrics[metric]
+
+
+def histograms_snapshot(histograms, buckets_by_metric):
+    # A copy of histograms with the buckets of each metric. Call with _histograms_lock held
+    return dict(
+        count=histograms['count'],
+        flagged=histograms['flagged'],
+        metrics={
+            metric: dict(
+                buckets=buckets_by_metric[metric],
+                counts=list(histogram['counts']),
+                sum=histogram['sum']
+            ) for metric, histogram in histograms['metrics'].items()
+        }
+    )
+
+
+def record_field_histograms(field, metrics):
+    """
+        Adds the metrics of one resolution of a top-level field to the in-process histograms of the field
+    :param field: The top-level field name, e.g. 'userStates', or a DataLoader's field, e.g. 'dataloader:Region'
+    :param metrics: dict keyed by the keys of HISTOGRAM_BUCKETS
+    :return: None
+    """
+    with _histograms_lock:
+        if field not in _histograms:
+            _histograms[field] = new_histograms(HISTOGRAM_BUCKETS)
+        add_to_histograms(_histograms[field], HISTOGRAM_BUCKETS, metrics)
+
+
+def record_request_histograms(metrics):
+    """
+        Adds the metrics of one request to the in-process histograms of the requests
+    :param metrics: dict keyed by the keys of REQUEST_HISTOGRAM_BUCKETS
+    :return: None
+    """
+    with _histograms_lock:
+        add_to_histograms(_request_histograms, REQUEST_HISTOGRAM_BUCKETS, metrics)
+
+
+def graphql_instrumentation_histograms():
+    """
+        A snapshot of the histograms of the requests and of every top-level field resolved since the process started
+        or reset_graphql_instrumentation_histograms was called
+    :return: dict with requests, the count, flagged and the buckets, counts and sum of each metric of the requests,
+    and fields, the same for each field keyed by field
+    """
+    with _histograms_lock:
+        return dict(
+            requests=histograms_snapshot(_request_histograms, REQUEST_HISTOGRAM_BUCKETS),
+            fields={
+                field: histograms_snapshot(field_histograms, HISTOGRAM_BUCKETS)
+                for field, field_histograms in _histograms.items()
+            }
+        )
+
+
+def reset_graphql_instrumentation_histograms():
+    with _histograms_lock:
+        _histograms.clear()
+        _request_histograms.update(new_histograms(REQUEST_HISTOGRAM_BUCKETS))
+
+
+def is_instrumented_path(path, instrumented_path):
+    """
+        True if path is instrumented_path or below it, such as /graphql/ for /graphql but not /graphql-foo
+    :param path: The request path
+    :param instrumented_path: The PATH setting
+    :return: True or False
+    """
+    return path == instrumented_path or path.startswith(f'{instrumented_path.rstrip("/")}/')
+
+
+class RequestInstrumentation(object):
+    """
+        The metrics of the top-level fields of one GraphQL request. Queries are attributed to the top-level field
+        that is resolving when they execute, which includes the queries of its nested fields. DataLoader batches are
+        dispatched after the resolvers that requested them return, when another field may be resolving, so they
+        are recorded under their own field with instrumented_as instead
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.current_field = None
+        # The top-level field name of each response key, which is the alias if the query gives one
+        self.field_names = {}
+
+    def start_field(self, field):
+        self.current_field = field
+        now = time.perf_counter()
+        self.fields.setdefault(field, dict(start=now, end=now, queries=0, sql_time=0))
+
+    def end_field(self, field):
+        self.fields[field]['end'] = time.perf_counter()
+
+    @contextmanager
+    def field(self, field):
+        """
+            Attributes the queries within to field, then restores the field that was resolving
+        :param field: The field name
+        """
+        previous_field = self.current_field
+        self.start_field(field)
+        try:
+            yield
+        finally:
+            self.end_field(field)
+            self.current_field = previous_field
+
+    def record_sql(self, execute, sql, params, many, context):
+        """
+            A connection.execute_wrapper that counts and times the queries of the current field
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            field_stats = self.fields.get(self.current_field)
+            if field_stats:
+                end = time.perf_counter()
+                field_stats['queries'] += 1
+                field_stats['sql_time'] += end - start
+                field_stats['end'] = max(field_stats['end'], end)
+
+    def field_metrics(self, query_count_threshold):
+        """
+            The metrics of each field
+        :param query_count_threshold: Fields with more queries are flagged
+        :return: dict keyed by field
+        """
+        return R.map_with_obj(
+            lambda field, stats: dict(
+                wall_ms=(stats['end'] - stats['start']) * 1000,
+                sql_ms=stats['sql_time'] * 1000,
+                queries=stats['queries'],
+                flagged=stats['queries'] > query_count_threshold
+            ),
+            self.fields
+        )
+
+
+@contextmanager
+def instrumented_as(context, name):
+    """
+        Records the queries within under the field DATALOADER_FIELD_PREFIX + name if the request is instrumented,
+        such as the batch queries of a DataLoader
+    :param context: The graphene context, normally the Django request
+    :param name: The name of the DataLoader, e.g. the model class name
+    """
+    instrumentation = getattr(context, 'graphql_instrumentation', None)
+    if not instrumentation:
+        yield
+        return
+    with instrumentation.field(f'{DATALOADER_FIELD_PREFIX}{name}'):
+        yield
+
+
+def log_metrics(event, metrics):
+    # Logs the metrics as a json line, as a warning if they are flagged
+    record = json.dumps(R.merge(event, metrics), sort_keys=True)
+    if metrics['flagged']:
+        logger.warning(record)
+    else:
+        logger.info(record)
+
+
+class GraphQLInstrumentationMiddleware(object):
+    """
+        Django middleware that instruments GraphQL requests. It counts and times the requests' queries with
+        connection.execute_wrapper, and after the response it logs the metrics of each top-level field and of the
+        request, such as the response size, as json lines and adds them to the in-process histograms served by
+        GraphQLInstrumentationView.
+        InstrumentationMiddleware must be in the GRAPHENE MIDDLEWARE to attribute the queries to fields
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        instrumentation_settings = graphql_instrumentation_settings()
+        if not is_instrumented_path(request.path, instrumentation_settings['PATH']):
+            return self.get_response(request)
+
+        instrumentation = RequestInstrumentation()
+        request.graphql_instrumentation = instrumentation
+        with connection.execute_wrapper(instrumentation.record_sql):
+            response = self.get_response(request)
+
+        field_metrics = instrumentation.field_metrics(instrumentation_settings['QUERY_COUNT_THRESHOLD'])
+        for field, metrics in field_metrics.items():
+            record_field_histograms(field, metrics)
+            log_metrics(dict(event='graphql_field', field=field), metrics)
+
+        request_metrics = dict(
+            # Streaming responses don't have a known size
+            response_bytes=len(response.content) if hasattr(response, 'content') else 0,
+            flagged=R.any_satisfy(R.prop('flagged'), R.values(field_metrics))
+        )
+        record_request_histograms(request_metrics)
+        log_metrics(dict(event='graphql_request', fields=sorted(field_metrics.keys())), request_metrics)
+        return response
+
+
+class InstrumentationMiddleware(object):
+    """
+        Graphene middleware that tracks which top-level field is resolving for GraphQLInstrumentationMiddleware.
+        It does nothing for requests that GraphQLInstrumentationMiddleware doesn't instrument
+    """
+
+    def resolve(self, next, root, info, **args):
+        instrumentation = getattr(info.context, 'graphql_instrumentation', None)
+        if not instrumentation:
+            return next(root, info, **args)
+
+        # Key by the top-level field's name rather than its response key, since clients choose the aliases
+        if len(info.path) == 1:
+            instrumentation.field_names[info.path[0]] = info.field_name
+        field = instrumentation.field_names[info.path[0]]
+        if len(info.path) == 1:
+            instrumentation.start_field(field)
+        else:
+            instrumentation.current_field = field
+        try:
+            return next(root, info, **args)
+        finally:
+            instrumentation.end_field(field)
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from django.test import RequestFactory, override_settings
+from django.http import HttpResponse
+from snapshottest import TestCase
+
+from rescape_region.middleware.instrumentation_middleware import GraphQLInstrumentationMiddleware, \
+    InstrumentationMiddleware, graphql_instrumentation_histograms, reset_graphql_instrumentation_histograms, \
+    instrumented_as
+
+
+def execute(instrumentation, sql_count):
+    # Simulates the queries of a resolver, passing them through the execute wrapper
+    for _ in range(sql_count):
+        instrumentation.record_sql(lambda *args: None, 'SELECT 1', None, False, {})
+
+
+class InstrumentationMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        reset_graphql_instrumentation_histograms()
+
+    def test_field_metrics(self):
+        graphene_middleware = InstrumentationMiddleware()
+
+        def get_response(request):
+            def resolve_field(path, sql_count, field_name=None):
+                info = SimpleNamespace(context=request, path=path, field_name=field_name or path[-1])
+                return graphene_middleware.resolve(
+                    lambda root, info: execute(request.graphql_instrumentation, sql_count),
+                    None,
+                    info
+                )
+
+            resolve_field(['regions'], 1)
+            # Nested fields count toward their top-level field
+            resolve_field(['userStates'], 1)
+            for i in range(3):
+                resolve_field(['userStates', i, 'data'], 2)
+            # Aliases are recorded under the field name
+            resolve_field(['myRegions'], 1, 'regions')
+            resolve_field(['myRegions', 0, 'name'], 1)
+            # DataLoader batches dispatched while another field resolves are recorded under the loader
+            with instrumented_as(request, 'Region'):
+                execute(request.graphql_instrumentation, 1)
+            return HttpResponse('{"data": {}}')
+
+        with override_settings(GRAPHQL_INSTRUMENTATION=dict(QUERY_COUNT_THRESHOLD=5)):
+            with self.assertLogs('rescape_region.instrumentation', level='INFO') as logs:
+                GraphQLInstrumentationMiddleware(get_response)(RequestFactory().post('/graphql'))
+
+        histograms = graphql_instrumentation_histograms()['fields']
+        assert set(histograms.keys()) == {'regions', 'userStates', 'dataloader:Region'}
+        assert histograms['regions']['metrics']['queries']['sum'] == 3
+        assert histograms['regions']['flagged'] == 0
+        assert histograms['dataloader:Region']['metrics']['queries']['sum'] == 1
+        assert histograms['userStates']['metrics']['queries']['sum'] == 7
+        # More queries than the threshold are flagged and logged as a warning
+        assert histograms['userStates']['flagged'] == 1
+        assert any('"field": "userStates"' in line and line.startswith('WARNING') for line in logs.output)
+        # The response size is recorded once for the request rather than for each field
+        requests = graphql_instrumentation_histograms()['requests']
+        assert requests['count'] == 1
+        assert requests['flagged'] == 1
+        assert requests['metrics']['response_bytes']['sum'] == len('{"data": {}}')
+        assert 'response_bytes' not in histograms['userStates']['metrics']
+
+    def test_other_paths_not_instrumented(self):
+        for path in ['/admin/', '/graphql-foo', '/graphqlfoo']:
+            GraphQLInstrumentationMiddleware(lambda request: HttpResponse())(RequestFactory().get(path))
+        assert graphql_instrumentation_histograms()['requests']['count'] == 0
+        for path in ['/graphql', '/graphql/']:
+            GraphQLInstrumentationMiddleware(lambda request: HttpResponse())(RequestFactory().get(path))
+        assert graphql_instrumentation_histograms()['requests']['count'] == 2
@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.fields.json
+
+
+class Migration(migrations.Migration):
+    # Builds the indexes without locking writes to the tables
+    atomic = False
+
+    dependencies = [
+        ('rescape_region', '0036_revision_columns'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='jurisdiction',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='jurisdiction_data_gin', opclasses=['jsonb_path_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='jurisdiction',
+            index=models.Index(django.db.models.fields.json.KeyTransform('country', django.db.models.expressions.F('data')), name='jurisdiction_data_country_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='jurisdiction',
+            index=models.Index(django.db.models.fields.json.KeyTransform('state', django.db.models.expressions.F('data')), name='jurisdiction_data_state_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='jurisdiction',
+            index=models.Index(django.db.models.fields.json.KeyTransform('city', django.db.models.expressions.F('data')), name='jurisdiction_data_city_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='location',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='location_data_gin', opclasses=['jsonb_path_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='project',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='project_data_gin', opclasses=['jsonb_path_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='project',
+            index=django.contrib.postgres.indexes.GinIndex(django.db.models.fields.json.KeyTransform('params', django.db.models.fields.json.KeyTransform('locations', django.db.models.expressions.F('data'))), name='project_data_loca_37ab7e19_gin'),
+        ),
+        AddIndexConcurrently(
+            model_name='region',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='region_data_gin', opclasses=['jsonb_path_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='region',
+            index=django.contrib.postgres.indexes.GinIndex(django.db.models.fields.json.KeyTransform('params', django.db.models.fields.json.KeyTransform('locations', django.db.models.expressions.F('data'))), name='region_data_locat_88d3e1dc_gin'),
+        ),
+        AddIndexConcurrently(
+            model_name='userstate',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='userstate_data_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
+
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 13:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rescape_region', '0037_json_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jurisdiction',
+            name='geometry',
+            field=django.contrib.gis.db.models.fields.GeometryCollectionField(editable=False, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='geometry',
+            field=django.contrib.gis.db.models.fields.GeometryCollectionField(editable=False, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='region',
+            name='geometry',
+            field=django.contrib.gis.db.models.fields.GeometryCollectionField(editable=False, null=True, srid=4326),
+        ),
+    ]
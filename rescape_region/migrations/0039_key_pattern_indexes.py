@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 14:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Builds the indexes without locking writes to the tables
+    atomic = False
+
+    dependencies = [
+        ('rescape_region', '0038_geometry'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='project',
+            index=models.Index(fields=['key'], name='project_key_like', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='region',
+            index=models.Index(fields=['key'], name='region_key_like', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='resource',
+            index=models.Index(fields=['key'], name='resource_key_like', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 18:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Builds the indexes without locking writes to the tables
+    atomic = False
+
+    dependencies = [
+        ('rescape_region', '0039_key_pattern_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='jurisdiction',
+            index=models.Index(fields=['-updated_at', '-id'], name='jurisdiction_keyset'),
+        ),
+        AddIndexConcurrently(
+            model_name='location',
+            index=models.Index(fields=['-updated_at', '-id'], name='location_keyset'),
+        ),
+        AddIndexConcurrently(
+            model_name='project',
+            index=models.Index(fields=['-updated_at', '-id'], name='project_keyset'),
+        ),
+        AddIndexConcurrently(
+            model_name='region',
+            index=models.Index(fields=['-updated_at', '-id'], name='region_keyset'),
+        ),
+    ]
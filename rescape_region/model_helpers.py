@@ -32,6 +32,23 @@ def geos_feature_collection_geometry_default():
     )
 
 
+def ewkt_from_geojson(geojson):
+    """
+        EWKT of the geometries of a geojson FeatureCollection, Feature or geometry, for GeometryCollectionFields.
+        Features without geometry are skipped
+    :param geojson: The geojson dict or None
+    :return: The EWKT string or None if there is no geometry
+    """
+    if not geojson:
+        return None
+    if R.prop_or(None, 'type', geojson) == 'FeatureCollection':
+        features = [feature for feature in R.prop_or([], 'features', geojson) if R.prop_or(None, 'geometry', feature)]
+        return ewkt_from_feature_collection(R.merge(geojson, dict(features=features))) if features else None
+    if R.prop_or(None, 'type', geojson) == 'Feature':
+        return ewkt_from_geojson(dict(type='FeatureCollection', features=[geojson]))
+    return ewkt_from_geojson(dict(type='FeatureCollection', features=[dict(type='Feature', geometry=geojson)]))
+
+
 def feature_collection_default():
     return {
         'type': 'FeatureCollection',
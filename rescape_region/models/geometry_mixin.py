@@ -0,0 +1,33 @@
+from django.contrib.gis.db.models import GeometryCollectionField
+from django.db import models
+
+from rescape_region.model_helpers import ewkt_from_geojson
+
+
+class GeojsonGeometryMixin(models.Model):
+    """
+        Mixin for models with a geojson JSONField that keeps a GIST indexed PostGIS copy of the geojson's geometries
+        in geometry, so that spatial filters run in the database. geojson stays the source of truth, since it keeps
+        the properties of the features. save derives geometry from geojson. Updates that bypass save must include
+        geometry_update_values. Rows saved before geometry existed are populated by the backfill_geometry command
+    """
+
+    geometry = GeometryCollectionField(null=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.geometry = ewkt_from_geojson(self.geojson)
+        if kwargs.get('update_fields') is not None and 'geojson' in kwargs['update_fields']:
+            kwargs['update_fields'] = list(set(kwargs['update_fields']) | {'geometry'})
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def geometry_update_values(cls, values):
+        """
+            The geometry to update along with values in QuerySet.update or bulk_update
+        :param values: The values of the update
+        :return: dict with the geometry if values has a geojson, else empty
+        """
+        return dict(geometry=ewkt_from_geojson(values['geojson'])) if 'geojson' in values else {}
+
+    class Meta:
+        abstract = True
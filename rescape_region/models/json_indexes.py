@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import threading
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import F, Index
+from django.db.models.expressions import Col
+from django.db.models.fields.json import KeyTransform, JSONField
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import WhereNode
+from rescape_python_helpers import ramda as R
+
+logger = logging.getLogger('rescape_region.json_indexes')
+
+# The lookups that each kind of index serves. jsonb_path_ops GIN indexes of whole fields only serve containment,
+# GIN indexes of paths use the default jsonb_ops, since Django 3.2 can't give opclasses to expression indexes,
+# and also serve key existence. B-tree indexes of paths serve comparisons of the value at the path
+GIN_FIELD_LOOKUPS = {'contains'}
+GIN_PATH_LOOKUPS = {'contains', 'has_key', 'has_keys', 'has_any_keys'}
+BTREE_PATH_LOOKUPS = {'exact', 'in', 'lt', 'lte', 'gt', 'gte'}
+
+# Django limits index names to 30 characters
+MAX_INDEX_NAME_LENGTH = 30
+
+
+def json_index_name(model_name, path, suffix):
+    name = '_'.join([model_name, *path.split('__'), suffix])
+    if len(name) <= MAX_INDEX_NAME_LENGTH:
+        return name
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()[:8]
+    return f'{name[:MAX_INDEX_NAME_LENGTH - len(digest) - len(suffix) - 2]}_{digest}_{suffix}'
+
+
+def path_expression(path):
+    """
+        The KeyTransform of a django lookup path such as data__locations__params, which compiles to the same
+        SQL, data #> '{locations,params}', as the filters of process_filter_kwargs do, so the planner can match them
+    :param path: The path starting with the JSONField name
+    :return: A KeyTransform
+    """
+    field_name, *keys = path.split('__')
+    return R.reduce(lambda expression, key: KeyTransform(key, expression), F(field_name), keys)
+
+
+def json_field_gin_index(model_name, field_name):
+    """
+        A jsonb_path_ops GIN index of a whole JSONField for containment filters like data__contains
+    :param model_name: The lower case model name, used to name the index
+    :param field_name: The JSONField name
+    :return: A GinIndex for Meta.indexes
+    """
+    return GinIndex(
+        fields=[field_name],
+        opclasses=['jsonb_path_ops'],
+        name=json_index_name(model_name, field_name, 'gin')
+    )
+
+
+def json_path_index(model_name, path, gin=False):
+    """
+        An expression index of the value at a path of a JSONField. A B-tree index serves filters like
+        data__country='Norway'. A GIN index serves containment and key existence filters of objects like
+        data__locations__params__contains={...}
+    :param model_name: The lower case model name, used to name the index
+    :param path: The path starting with the JSONField name, e.g. data__locations__params
+    :param gin: Default False. True for a GIN index
+    :return: An Index or GinIndex for Meta.indexes
+    """
+    if gin:
+        return GinIndex(path_expression(path), name=json_index_name(model_name, path, 'gin'))
+    return Index(path_expression(path), name=json_index_name(model_name, path, 'idx'))
+
+
+def json_path(expression):
+    """
+        The field name and keys of a KeyTransform chain ending at the JSONField
+    :param expression: A KeyTransform, F or Col
+    :return: (model, field_name, keys) or None if the expression isn't a JSONField path. model is None for
+    unresolved expressions, like those of Meta.indexes
+    """
+    keys = []
+    while isinstance(expression, KeyTransform):
+        keys.insert(0, expression.key_name)
+        expression = expression.lhs
+    if isinstance(expression, F):
+        return None, expression.name, tuple(keys)
+    if isinstance(expression, Col) and isinstance(expression.target, JSONField):
+        return expression.target.model, expression.target.name, tuple(keys)
+    return None
+
+
+def indexed_json_lookups(model):
+    """
+        The JSONField lookups that the indexes of model serve, read from Meta.indexes
+    :param model: The Django model
+    :return: dict keyed by (field_name, keys) and valued by the set of lookup names served
+    """
+    lookups = {}
+    for index in model._meta.indexes:
+        if index.expressions:
+            path = json_path(index.expressions[0])
+            if path:
+                lookups.setdefault(path[1:], set()).update(
+                    GIN_PATH_LOOKUPS if isinstance(index, GinIndex) else BTREE_PATH_LOOKUPS
+                )
+        elif isinstance(index, GinIndex) and 'jsonb_path_ops' in index.opclasses:
+            for field_name in index.fields:
+                lookups.setdefault((field_name, ()), set()).update(GIN_FIELD_LOOKUPS)
+    return lookups
+
+
+def json_filter_lookups(where):
+    """
+        The JSONField lookups of a query's where clause
+    :param where: The WhereNode of a django Query
+    :return: A list of (model, field_name, keys, lookup_name). model is the model of the JSONField, which differs
+    from the queried model for filters of related instances
+    """
+    lookups = []
+    for child in where.children:
+        if isinstance(child, WhereNode):
+            lookups.extend(json_filter_lookups(child))
+        elif isinstance(child, Lookup):
+            path = json_path(child.lhs)
+            if path:
+                lookups.append((*path, child.lookup_name))
+    return lookups
+
+
+_warned_lookups = set()
+_warned_lookups_lock = threading.Lock()
+
+
+def unindexed_json_filters(queryset):
+    """
+        The JSONField filters of the queryset that no index of its model serves
+    :param queryset: A QuerySet
+    :return: A list of (model, lookup) where lookup is a path like data__locations__params__city__icontains
+    """
+    return [
+        (model, '__'.join([field_name, *keys, lookup_name]))
+        for model, field_name, keys, lookup_name in json_filter_lookups(queryset.query.where)
+        if lookup_name not in indexed_json_lookups(model).get((field_name, keys), set())
+    ]
+
+
+def warn_unindexed_json_filters(queryset):
+    """
+        Logs a warning the first time that each JSONField filter that no index serves is used, since on large
+        tables such filters scan every row. Add an index of the path to the model's Meta.indexes with
+        json_path_index, or filter by containment of an indexed path instead
+    :param queryset: A QuerySet
+    :return: The queryset
+    """
+    for model, lookup in unindexed_json_filters(queryset):
+        key = (model._meta.label_lower, lookup)
+        with _warned_lookups_lock:
+            if key in _warned_lookups:
+                continue
+            _warned_lookups.add(key)
+        logger.warning(f'Filter {lookup} of {key[0]} is not served by an index')
+    return queryset
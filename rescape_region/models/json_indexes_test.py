@@ -0,0 +1,26 @@
+from snapshottest import TestCase
+
+from rescape_region.models import Jurisdiction, Region, Project
+from rescape_region.models.json_indexes import unindexed_json_filters, json_index_name, MAX_INDEX_NAME_LENGTH
+
+
+class JsonIndexesTestCase(TestCase):
+
+    def test_unindexed_json_filters(self):
+        # Building the querysets doesn't query the database
+        assert unindexed_json_filters(Jurisdiction.objects.filter(data__country='Norway', data__city='Oslo')) == []
+        assert unindexed_json_filters(Jurisdiction.objects.filter(data__contains=dict(country='Norway'))) == []
+        assert unindexed_json_filters(Jurisdiction.objects.filter(data__borough='Frogner')) == [
+            (Jurisdiction, 'data__borough__exact')
+        ]
+        # Only containment is served by the GIN index of the path
+        assert unindexed_json_filters(Region.objects.filter(
+            data__locations__params__contains=dict(city='Oslo'),
+            data__locations__params__city__icontains='oslo',
+        )) == [(Region, 'data__locations__params__city__icontains')]
+        # Filters of related instances are checked against the indexes of their model
+        assert unindexed_json_filters(Project.objects.filter(region__data__contains=dict(name='Oslo'))) == []
+
+    def test_json_index_name(self):
+        assert json_index_name('region', 'data', 'gin') == 'region_data_gin'
+        assert len(json_index_name('jurisdiction', 'data__neighborhood__name', 'idx')) == MAX_INDEX_NAME_LENGTH
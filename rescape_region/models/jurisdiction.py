@@ -2,7 +2,9 @@ import reversion
 from django.db.models import (
     CharField)
 from django.db.models import JSONField
-from rescape_region.models.revision_mixin import RevisionModelMixin
+from rescape_region.models.geometry_mixin import GeojsonGeometryMixin
+from rescape_region.models.json_indexes import json_field_gin_index, json_path_index
+from rescape_region.models.revision_mixin import RevisionModelMixin, keyset_index
 from safedelete.models import SafeDeleteModel
 
 
@@ -10,8 +12,9 @@ def default_jurisdiction_data():
     return dict()
 
 
-@reversion.register()
-class Jurisdiction(SafeDeleteModel, RevisionModelMixin):
+# geometry is derived from geojson, so it isn't versioned
+@reversion.register(exclude=['geometry'])
+class Jurisdiction(SafeDeleteModel, RevisionModelMixin, GeojsonGeometryMixin):
     """
         A Jurisdiction
     """
@@ -26,3 +29,11 @@ class Jurisdiction(SafeDeleteModel, RevisionModelMixin):
 
     class Meta:
         app_label = "rescape_region"
+        # Indexes of the data paths that filters use. See rescape_region.models.json_indexes
+        indexes = [
+            json_field_gin_index('jurisdiction', 'data'),
+            json_path_index('jurisdiction', 'data__country'),
+            json_path_index('jurisdiction', 'data__state'),
+            json_path_index('jurisdiction', 'data__city'),
+            keyset_index('jurisdiction'),
+        ]
@@ -5,11 +5,14 @@ from django.db.models import JSONField
 from safedelete.models import SafeDeleteModel
 
 from rescape_region.model_helpers import region_data_default, feature_collection_default
-from rescape_region.models.revision_mixin import RevisionModelMixin
+from rescape_region.models.geometry_mixin import GeojsonGeometryMixin
+from rescape_region.models.json_indexes import json_field_gin_index
+from rescape_region.models.revision_mixin import RevisionModelMixin, keyset_index
 
 
-@reversion.register()
-class Location(SafeDeleteModel, RevisionModelMixin):
+# geometry is derived from geojson, so it isn't versioned
+@reversion.register(exclude=['geometry'])
+class Location(SafeDeleteModel, RevisionModelMixin, GeojsonGeometryMixin):
     """
         Models a geospatial location
     """
@@ -22,6 +25,11 @@ class Location(SafeDeleteModel, RevisionModelMixin):
 
     class Meta:
         app_label = "rescape_region"
+        # Indexes of the data paths that filters use. See rescape_region.models.json_indexes
+        indexes = [
+            json_field_gin_index('location', 'data'),
+            keyset_index('location'),
+        ]
 
     def __str__(self):
         return self.name
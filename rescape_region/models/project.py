@@ -3,12 +3,13 @@ from django.contrib.auth import get_user_model
 from django.contrib.gis.db.models import SET_NULL, CASCADE, Q
 from django.db.models import (
     CharField,
-    ForeignKey, ManyToManyField, UniqueConstraint)
+    ForeignKey, Index, ManyToManyField, UniqueConstraint)
 from django.db.models import JSONField
 from safedelete.models import SafeDeleteModel
 
 from rescape_region.model_helpers import feature_collection_default, project_data_default
-from rescape_region.models.revision_mixin import RevisionModelMixin
+from rescape_region.models.json_indexes import json_field_gin_index, json_path_index
+from rescape_region.models.revision_mixin import RevisionModelMixin, keyset_index
 
 
 @reversion.register()
@@ -36,6 +37,15 @@ class Project(SafeDeleteModel, RevisionModelMixin):
 
     class Meta:
         app_label = "rescape_region"
+        # Indexes of the data paths that filters use. See rescape_region.models.json_indexes
+        indexes = [
+            json_field_gin_index('project', 'data'),
+            json_path_index('project', 'data__locations__params', gin=True),
+            # Serves the key prefix queries of rescape_region.helpers.unique_values, which the unique constraints,
+            # being b-tree indexes of the collation, can't serve
+            Index(fields=['key'], opclasses=['varchar_pattern_ops'], name='project_key_like'),
+            keyset_index('project'),
+        ]
         constraints = [
             # https://stackoverflow.com/questions/33307892/django-unique-together-with-nullable-foreignkey
             # This says that for deleted locations, user and key and deleted date must be unique
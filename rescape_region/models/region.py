@@ -1,15 +1,18 @@
 import reversion
 from django.db.models import (
-    CharField, Q, UniqueConstraint)
+    CharField, Index, Q, UniqueConstraint)
 from django.db.models import JSONField
 from safedelete.models import SafeDeleteModel
 
 from rescape_region.model_helpers import region_data_default, feature_collection_default
-from rescape_region.models.revision_mixin import RevisionModelMixin
+from rescape_region.models.geometry_mixin import GeojsonGeometryMixin
+from rescape_region.models.json_indexes import json_field_gin_index, json_path_index
+from rescape_region.models.revision_mixin import RevisionModelMixin, keyset_index
 
 
-@reversion.register()
-class Region(SafeDeleteModel, RevisionModelMixin):
+# geometry is derived from geojson, so it isn't versioned
+@reversion.register(exclude=['geometry'])
+class Region(SafeDeleteModel, RevisionModelMixin, GeojsonGeometryMixin):
     """
         Models a geospatial region
     """
@@ -19,13 +22,22 @@ class Region(SafeDeleteModel, RevisionModelMixin):
     name = CharField(max_length=50, null=False)
     # Stores geojson from OSM that represents the Location.
     # Note that this isn't stored as a GEOS GeometryCollection because that structure doesn't include properties
-    # and other meta data that we want to keep from Open Street Map. It should still be possible to do PostGIS
-    # operations in the database if needed by extracting the geometry from the geojson and casting it
+    # and other meta data that we want to keep from Open Street Map. PostGIS operations use the geometry field
+    # of GeojsonGeometryMixin, which save derives from the geojson
     geojson = JSONField(null=False, default=feature_collection_default)
     data = JSONField(null=False, default=region_data_default)
 
     class Meta:
         app_label = "rescape_region"
+        # Indexes of the data paths that filters use. See rescape_region.models.json_indexes
+        indexes = [
+            json_field_gin_index('region', 'data'),
+            json_path_index('region', 'data__locations__params', gin=True),
+            # Serves the key prefix queries of rescape_region.helpers.unique_values, which the unique constraints,
+            # being b-tree indexes of the collation, can't serve
+            Index(fields=['key'], opclasses=['varchar_pattern_ops'], name='region_key_like'),
+            keyset_index('region'),
+        ]
         constraints = [
             # https://stackoverflow.com/questions/33307892/django-unique-together-with-nullable-foreignkey
             # This says that for deleted regions, key and deleted date must be unique
@@ -1,7 +1,7 @@
 import reversion
 from django.contrib.gis.db import models
 from django.db.models import JSONField
-from django.db.models import (CharField, ForeignKey, UniqueConstraint, Q)
+from django.db.models import (CharField, ForeignKey, Index, UniqueConstraint, Q)
 from safedelete.models import SafeDeleteModel
 
 from rescape_region.models.revision_mixin import RevisionModelMixin
@@ -25,12 +25,21 @@ def default():
             nodeColorKey=None,
             # Optional color key of the individual link
             linkColorKey=None,
+            # Optional separators of the values, dict(decimalSeparator='.', thousandsSeparator=',') by default
+            numberFormat=None,
+            # Optional way of linking the nodes of the stages, one of sankey_helpers.LINK_STRATEGIES. 'all' by default
+            linkStrategy=None,
+            # Optional number of targets of each node for the 'topTargets' linkStrategy
+            linkTopTargets=None,
+            # Optional maximum number of links, sankey_helpers.DEFAULT_MAX_LINKS by default
+            maxLinks=None,
             # A list of stages. Each stage is a dict with key name and targets array
             # The key is used to list targets in the targes array. The name is the readable name
             # Targets is a list of keys of other stages
             stages=[]
         ),
-        # Processed sankey nodes and links. These are generated and readonly
+        # Processed sankey nodes and links. These are generated and readonly.
+        # Generated graphs are stored in the compact format of sankey_helpers.compact_sankey_graph
         graph=dict(
             # Nodes are stored by the stage key that they represent
             nodes={},
@@ -54,6 +63,11 @@ class Resource(SafeDeleteModel, RevisionModelMixin):
 
     class Meta:
         app_label = "rescape_region"
+        indexes = [
+            # Serves the key prefix queries of rescape_region.helpers.unique_values, which the unique constraints,
+            # being b-tree indexes of the collation, can't serve
+            Index(fields=['key'], opclasses=['varchar_pattern_ops'], name='resource_key_like'),
+        ]
         constraints = [
             # https://stackoverflow.com/questions/33307892/django-unique-together-with-nullable-foreignkey
             # This says that for deleted resources, key and deleted date must be unique
@@ -1,4 +1,8 @@
+import reversion
 from django.db import models
+from django.db.models import Min, Max, Count, Index
+from django.utils import timezone
+from graphql.language.ast import FragmentSpread
 from reversion.models import Version
 from rescape_python_helpers import ramda as R
 
@@ -6,18 +10,198 @@ import logging
 
 logger = logging.getLogger('rescape_region')
 
+# The columns that save maintains for each revision. See RevisionModelMixin
+REVISION_COLUMNS = ['created_at', 'updated_at', 'version_number']
+# The fields of the revisioned types that resolve from the versions of an instance
+REVISION_METADATA_FIELDS = ['revisionId']
+
+
+def keyset_index(model_name):
+    """
+        The index of the cursor pagination of rescape_region.schema_models.keyset_pagination, whose KEYSET_ORDERING
+        is updated_at descending with nulls first, which is Postgres' default for descending index columns,
+        then id descending. The after cursor filters by a row comparison of the same columns, so a page
+        is a single range scan of this index
+    :param model_name: The lower case model name, used to name the index
+    :return: An Index for Meta.indexes
+    """
+    return Index(fields=['-updated_at', '-id'], name=f'{model_name}_keyset')
+
+
+def selects_revision_metadata(info):
+    """
+        Whether the query of the field being resolved selects any of REVISION_METADATA_FIELDS at any depth,
+        such as within the objects of a paginated type or the nodes of a connection. Fragments are followed
+    :param info: The graphene ResolveInfo
+    :return: True or False
+    """
+
+    def selects(selection_set):
+        for selection in selection_set.selections if selection_set else []:
+            if isinstance(selection, FragmentSpread):
+                if selects(info.fragments[selection.name.value].selection_set):
+                    return True
+            elif getattr(selection, 'name', None) and selection.name.value in REVISION_METADATA_FIELDS:
+                return True
+            elif selects(selection.selection_set):
+                return True
+        return False
+
+    return R.any_satisfy(lambda field_ast: selects(field_ast.selection_set), info.field_asts)
+
+
+def prefetch_revision_metadata(instances, info=None):
+    """
+        Loads the initial and latest version of each instance in two queries per model and attaches them to the
+        instances. RevisionModelMixin's initial_version, latest_version and revision_id then resolve without querying
+        per instance. Call this from list resolvers before the instances are serialized
+    :param instances: A queryset or list of RevisionModelMixin instances. Querysets are evaluated
+    :param info: Optional graphene ResolveInfo. If the query doesn't select the revision metadata, see
+    selects_revision_metadata, nothing is loaded and the instances are returned unchanged
+    :return: The instances as a list, or the unchanged instances
+    """
+    if info and not selects_revision_metadata(info):
+        return instances
+    instances = list(instances)
+    instances_by_model = {}
+    for instance in instances:
+        if instance.pk is not None:
+            instances_by_model.setdefault(instance.__class__, []).append(instance)
+
+    for model, model_instances in instances_by_model.items():
+        # Version.object_id is a string regardless of the model's primary key type
+        version_stats = {
+            stats['object_id']: stats for stats in Version.objects.get_for_model(model).filter(
+                object_id__in=[str(instance.pk) for instance in model_instances]
+            ).values('object_id').annotate(
+                initial_id=Min('pk'),
+                latest_id=Max('pk')
+            ).order_by()
+        }
+        versions_by_id = Version.objects.filter(
+            pk__in=R.flatten([[stats['initial_id'], stats['latest_id']] for stats in version_stats.values()])
+        ).select_related('revision').in_bulk()
+
+        for instance in model_instances:
+            stats = version_stats.get(str(instance.pk))
+            instance._revision_metadata = dict(
+                initial_version=versions_by_id.get(stats['initial_id']),
+                latest_version=versions_by_id.get(stats['latest_id'])
+            ) if stats else dict(initial_version=None, latest_version=None)
+    return instances
+
+
+def prefetch_paginated_revision_metadata(paginated, info=None):
+    """
+        Calls prefetch_revision_metadata on the objects of the page returned by resolve_paginated_for_type
+    :param paginated: An instance of a paginated type
+    :param info: Optional graphene ResolveInfo. See prefetch_revision_metadata
+    :return: The paginated instance
+    """
+    paginated.objects = prefetch_revision_metadata(paginated.objects, info)
+    return paginated
+
+
+def next_version_numbers(model, object_ids):
+    """
+        The version_number of the next version of each instance, one more than its count of versions, in one
+        aggregate query. Deriving it from the versions keeps it equal to their count however often an instance is
+        saved within one revision, which records one version per instance
+    :param model: A RevisionModelMixin model
+    :param object_ids: The primary keys of the instances
+    :return: A dict keyed by the string primary key of each instance
+    """
+    version_counts = dict(Version.objects.get_for_model(model).filter(
+        object_id__in=[str(object_id) for object_id in object_ids]
+    ).values('object_id').annotate(version_count=Count('pk')).order_by().values_list('object_id', 'version_count'))
+    return {str(object_id): version_counts.get(str(object_id), 0) + 1 for object_id in object_ids}
+
+
+def revision_columns_by_object_id(model, object_ids):
+    """
+        Derives the values of the REVISION_COLUMNS from the django-reversion versions of the given instances
+        in one aggregate query. Used to backfill the columns of rows saved before they existed
+    :param model: A RevisionModelMixin model
+    :param object_ids: The primary keys of the instances
+    :return: A dict keyed by the string primary key of each instance that has versions
+    """
+    return {
+        stats['object_id']: dict(
+            created_at=stats['created_at'],
+            updated_at=stats['updated_at'],
+            version_number=stats['version_number']
+        ) for stats in Version.objects.get_for_model(model).filter(
+            object_id__in=[str(object_id) for object_id in object_ids]
+        ).values('object_id').annotate(
+            created_at=Min('revision__date_created'),
+            updated_at=Max('revision__date_created'),
+            version_number=Count('pk')
+        ).order_by()
+    }
+
 
 class RevisionModelMixin(models.Model):
+    """
+        Mixin for models registered with django-reversion. created_at, updated_at and version_number are denormalized
+        from the model's versions so that they can be read, filtered and ordered by without joining the versions.
+        save maintains them whenever the save is recorded in a revision, such as by update_or_create_with_revision,
+        so they are written in the revision's transaction and serialized into its version. Saves without a revision
+        only maintain the dates. Models with the legacy field created_at_unrevisioned take created_at from it.
+        Rows saved before the columns existed are populated by the backfill_revision_columns command, and the
+        historical instances of versions serialized before then derive the columns from their versions
+    """
+
+    # The date of the initial version
+    created_at = models.DateTimeField(null=True, editable=False, db_index=True)
+    # The date of the latest version
+    updated_at = models.DateTimeField(null=True, editable=False, db_index=True)
+    # The 1-based number of the latest version
+    version_number = models.PositiveIntegerField(null=True, editable=False, db_index=True)
+
+    def save(self, *args, **kwargs):
+        now = timezone.now()
+        self.created_at = self.created_at or getattr(self, 'created_at_unrevisioned', None) or now
+        self.updated_at = now
+        if reversion.is_active() and reversion.is_registered(self.__class__):
+            self.version_number = next_version_numbers(self.__class__, [self.pk])[str(self.pk)] if self.pk else 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = list(set(kwargs['update_fields']) | set(REVISION_COLUMNS))
+        super().save(*args, **kwargs)
+
+    @property
+    def _version(self):
+        # The version of a historical instance, which rescape_graphene's versioned types assign
+        if '_historical_version' not in self.__dict__:
+            raise AttributeError('_version')
+        return self.__dict__['_historical_version']
+
+    @_version.setter
+    def _version(self, version):
+        self.__dict__['_historical_version'] = version
+        # Versions serialized before the columns existed don't have them
+        if self.updated_at is None:
+            self.updated_at = version.revision.date_created
+        if self.version_number is None:
+            self.version_number = Version.objects.get_for_object(self).filter(pk__lte=version.pk).count()
+        if self.created_at is None:
+            initial_version = self.initial_version
+            self.created_at = getattr(self, 'created_at_unrevisioned', None) or (
+                initial_version.revision.date_created if initial_version else None
+            )
 
     @property
     def initial_version(self):
         # The initial version object
-        return R.last(list(Version.objects.get_for_object(self)))
+        if hasattr(self, '_revision_metadata'):
+            return self._revision_metadata['initial_version']
+        return Version.objects.get_for_object(self).last()
 
     @property
     def latest_version(self):
         # The latest version object
-        return R.head(list(Version.objects.get_for_object(self)))
+        if hasattr(self, '_revision_metadata'):
+            return self._revision_metadata['latest_version']
+        return Version.objects.get_for_object(self).first()
 
     @property
     def instance_version(self):
@@ -27,44 +211,16 @@ class RevisionModelMixin(models.Model):
         """
         return self._version if R.has('_version', self) else self.latest_version
 
-    @property
-    def created_at(self):
-        # Get the initial version's date_created
-        # If the model instance has a legacy field date_created_unrevisioned, use that instead
-        if hasattr(self, 'created_at_unrevisioned'):
-            return self.created_at_unrevisioned
-
-        return self.initial_version.revision.date_created if \
-            self.pk and self.initial_version else None
-
-    @property
-    def updated_at(self):
-        # Get the current version's (defaults to latest version) revision's create_date
-        return self.instance_version.revision.date_created if self.pk and self.instance_version else None
-
-    @property
-    def version_number(self):
-        """
-            There is no version number, only a revision number. Query and order by revision_id ascending to get
-            a 1-based index
-        :return:
-        """
-        if not self.instance_version:
-            return None
-
-        try:
-            return list(Version.objects.get_for_object(self).order_by('revision_id')).index(self.instance_version) + 1
-        except Exception as e:
-            logger.warning(e)
-            return -1
-
     @property
     def revision_id(self):
         """
             There is no version number, only a revision number. So use count to show the version
         :return:
         """
-        return self.instance_version.revision.id if self.pk and self.instance_version else None
+        if not self.pk:
+            return None
+        instance_version = self.instance_version
+        return instance_version.revision_id if instance_version else None
 
     class Meta:
         abstract = True
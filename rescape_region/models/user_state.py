@@ -6,6 +6,7 @@ from django.db.models import OneToOneField
 from safedelete.models import SafeDeleteModel
 
 from rescape_region.model_helpers import user_state_data_default
+from rescape_region.models.json_indexes import json_field_gin_index
 from rescape_region.models.revision_mixin import RevisionModelMixin
 
 
@@ -22,3 +23,7 @@ class UserState(SafeDeleteModel, RevisionModelMixin):
 
     class Meta:
         app_label = "rescape_region"
+        # Indexes of the data paths that filters use. See rescape_region.models.json_indexes
+        indexes = [
+            json_field_gin_index('userstate', 'data'),
+        ]
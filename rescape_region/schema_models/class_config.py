@@ -0,0 +1,39 @@
+import functools
+import threading
+
+
+def class_config_key(class_config):
+    """
+        A memoization key of a class_config made of the identities of the classes, fields and configs it contains.
+        class_configs are rebuilt on every call of default_class_config, but from the same module level classes
+        and fields, so equal class_configs have equal keys. The key is computed without stringifying the fields
+    :param class_config: dict of configs such as dict(region=dict(model_class=..., graphene_class=...), ...)
+    :return: A hashable key
+    """
+
+    def value_key(value):
+        return tuple(sorted((key, id(v)) for key, v in value.items())) if isinstance(value, dict) else id(value)
+
+    return tuple(sorted((key, value_key(value)) for key, value in class_config.items()))
+
+
+def memoize_by_class_config(func):
+    """
+        Memoizes a type or config factory whose only argument is a class_config, so that each dynamic graphene
+        type is built once per process instead of on every call. The cache keeps the class_config alive so that the
+        ids in its key can't be reused by other objects
+    :param func: A function expecting a class_config
+    :return: The memoized function. Its cache is func.cache
+    """
+    cache = func.cache = {}
+    lock = threading.RLock()
+
+    @functools.wraps(func)
+    def memoized_func(class_config):
+        key = class_config_key(class_config)
+        with lock:
+            if key not in cache:
+                cache[key] = (class_config, func(class_config))
+            return cache[key][1]
+
+    return memoized_func
@@ -0,0 +1,29 @@
+from snapshottest import TestCase
+
+from rescape_region.schema_models.class_config import memoize_by_class_config, class_config_key
+
+region_fields = dict(name=dict(type=str))
+
+
+def create_class_config():
+    # Like default_class_config, a new dict of the same classes and fields on every call
+    return dict(region=dict(model_class=object, graphene_fields=region_fields))
+
+
+class ClassConfigTestCase(TestCase):
+
+    def test_memoize_by_class_config(self):
+        calls = []
+
+        @memoize_by_class_config
+        def create_type(class_config):
+            calls.append(class_config)
+            return type('RegionDataType', (object,), {})
+
+        assert class_config_key(create_class_config()) == class_config_key(create_class_config())
+        assert create_type(create_class_config()) is create_type(create_class_config())
+        assert len(calls) == 1
+        # A different class makes a different type
+        other_class_config = dict(region=dict(model_class=dict, graphene_fields=region_fields))
+        assert create_type(other_class_config) is not create_type(create_class_config())
+        assert len(calls) == 2
@@ -0,0 +1,87 @@
+import math
+
+from django.contrib.gis.geos import GEOSGeometry, Polygon
+from django.contrib.gis.measure import D
+from django.db.models import Q
+from graphene import InputObjectType, JSONString, Float
+from rescape_python_helpers import ramda as R
+
+from rescape_region.model_helpers import ewkt_from_geojson
+
+# The filter arguments of geojson_filter_arguments, which process_filter_kwargs must not receive
+GEOJSON_FILTER_KEYS = ['geojson_intersects', 'geojson_contains', 'within_distance']
+
+# The length of a degree of latitude and the upper bound of a degree of longitude
+METERS_PER_DEGREE = 111320
+
+
+class WithinDistanceInputType(InputObjectType):
+    # A geojson FeatureCollection, Feature or geometry
+    geojson = JSONString(required=True)
+    # Meters
+    distance = Float(required=True)
+
+
+def geojson_filter_arguments():
+    """
+        Spatial filter arguments for top-level queries of GeojsonGeometryMixin models. Each takes a geojson
+        FeatureCollection, Feature or geometry. geojsonIntersects matches instances whose geometry intersects it,
+        geojsonContains those whose geometry contains it and withinDistance those within distance meters of it
+    :return: dict of arguments
+    """
+    return dict(
+        geojson_intersects=JSONString(),
+        geojson_contains=JSONString(),
+        within_distance=WithinDistanceInputType()
+    )
+
+
+def geometry_from_geojson(geojson):
+    ewkt = ewkt_from_geojson(geojson)
+    if not ewkt:
+        raise ValueError(f'The geojson has no geometry: {geojson}')
+    return GEOSGeometry(ewkt)
+
+
+def distance_bbox(geometry, meters):
+    """
+        A lon/lat box around geometry that contains every point within meters of it. Filtering by overlap with the
+        box first lets the GIST index narrow down the rows whose distance is computed
+    :param geometry: A GEOSGeometry in SRID 4326
+    :param meters: The distance
+    :return: The Polygon or None if the box would cross the antimeridian or a pole, where it can't bound the distance
+    """
+    xmin, ymin, xmax, ymax = geometry.extent
+    degrees_latitude = meters / METERS_PER_DEGREE
+    max_latitude = max(abs(ymin - degrees_latitude), abs(ymax + degrees_latitude))
+    if max_latitude >= 90:
+        return None
+    degrees_longitude = meters / (METERS_PER_DEGREE * math.cos(math.radians(max_latitude)))
+    if xmin - degrees_longitude < -180 or xmax + degrees_longitude > 180:
+        return None
+    return Polygon.from_bbox((
+        xmin - degrees_longitude, ymin - degrees_latitude, xmax + degrees_longitude, ymax + degrees_latitude
+    ))
+
+
+def geojson_filter_q_expressions(kwargs):
+    """
+        The Q expressions of the geojson_filter_arguments in kwargs. They filter by the GIST indexed geometry of
+        GeojsonGeometryMixin in PostGIS
+    :param kwargs: The resolver's kwargs
+    :return: A list of Q expressions
+    """
+    q_expressions = []
+    if R.prop_or(None, 'geojson_intersects', kwargs):
+        q_expressions.append(Q(geometry__intersects=geometry_from_geojson(kwargs['geojson_intersects'])))
+    if R.prop_or(None, 'geojson_contains', kwargs):
+        q_expressions.append(Q(geometry__contains=geometry_from_geojson(kwargs['geojson_contains'])))
+    if R.prop_or(None, 'within_distance', kwargs):
+        within_distance = kwargs['within_distance']
+        geometry = geometry_from_geojson(within_distance['geojson'])
+        bbox = distance_bbox(geometry, within_distance['distance'])
+        if bbox:
+            q_expressions.append(Q(geometry__bboverlaps=bbox))
+        # The distance on a sphere in meters
+        q_expressions.append(Q(geometry__distance_lte=(geometry, D(m=within_distance['distance']))))
+    return q_expressions
@@ -16,10 +16,18 @@ from rescape_graphene.graphql_helpers.schema_helpers import process_filter_kwarg
 from rescape_graphene.schema_models.django_object_type_revisioned_mixin import reversion_and_safe_delete_types, \
     DjangoObjectTypeRevisionedMixin
 from rescape_graphene.schema_models.geojson.types.feature_collection import feature_collection_data_type_fields
+from rescape_python_helpers import ramda as R
 
+from rescape_region.helpers.resolver_cache import cached_resolver
 from rescape_region.schema_models.jurisdiction.jurisdiction_data_schema import JurisdictionDataType, \
     jurisdiction_data_fields
 from rescape_region.models.jurisdiction import Jurisdiction
+from rescape_region.models.json_indexes import warn_unindexed_json_filters
+from rescape_region.models.revision_mixin import prefetch_revision_metadata, prefetch_paginated_revision_metadata
+from rescape_region.schema_models.geojson_filters import GEOJSON_FILTER_KEYS, geojson_filter_arguments, \
+    geojson_filter_q_expressions
+from rescape_region.schema_models.keyset_pagination import create_keyset_connection_type, keyset_connection_arguments, \
+    resolve_keyset_connection_for_type
 
 
 class JurisdictionType(DjangoObjectType, DjangoObjectTypeRevisionedMixin):
@@ -27,6 +35,8 @@ class JurisdictionType(DjangoObjectType, DjangoObjectTypeRevisionedMixin):
 
     class Meta:
         model = Jurisdiction
+        # The PostGIS copy of geojson. See GeojsonGeometryMixin
+        exclude = ('geometry',)
 
 
 # Modify the geojson field to use the geometry collection resolver
@@ -66,6 +76,11 @@ jurisdiction_fields = merge_with_django_properties(JurisdictionType, dict(
     create_paginated_type_mixin(JurisdictionType, jurisdiction_fields)
 )
 
+# Cursor paginated version of JurisdictionType
+(JurisdictionConnectionType, jurisdiction_connection_fields) = itemgetter('type', 'fields')(
+    create_keyset_connection_type(JurisdictionType, jurisdiction_fields)
+)
+
 # Revision version of JurisdictionType
 (JurisdictionVersionedType, jurisdiction_versioned_fields) = itemgetter('type', 'fields')(
     create_version_container_type(JurisdictionType, jurisdiction_fields)
@@ -74,12 +89,20 @@ jurisdiction_fields = merge_with_django_properties(JurisdictionType, dict(
 class JurisdictionQuery(ObjectType):
     jurisdictions = graphene.List(
         JurisdictionType,
-        **top_level_allowed_filter_arguments(jurisdiction_fields, JurisdictionType)
+        # The spatial geojsonContains replaces the json containment filter of geojson
+        **R.merge(
+            top_level_allowed_filter_arguments(jurisdiction_fields, JurisdictionType),
+            geojson_filter_arguments()
+        )
     )
     jurisdictions_paginated = Field(
         JurisdictionPaginatedType,
         **pagination_allowed_filter_arguments(jurisdiction_paginated_fields, JurisdictionPaginatedType)
     )
+    jurisdictions_connection = Field(
+        JurisdictionConnectionType,
+        **keyset_connection_arguments(jurisdiction_connection_fields, JurisdictionConnectionType)
+    )
     jurisdictions_versioned = Field(
         JurisdictionVersionedType,
         **versioning_allowed_filter_arguments(jurisdiction_versioned_fields, JurisdictionVersionedType)
@@ -89,15 +112,23 @@ class JurisdictionQuery(ObjectType):
     def _resolve_jurisdictions(info, **kwargs):
         return jurisdiction_resolver('filter', **kwargs)
 
+    @cached_resolver(Jurisdiction)
     def resolve_jurisdictions(self, info, **kwargs):
-        return jurisdiction_resolver(info, **kwargs)
+        # Cached results must be lists
+        return list(prefetch_revision_metadata(jurisdiction_resolver(
+            'filter',
+            **R.omit(GEOJSON_FILTER_KEYS, kwargs)
+        ).filter(*geojson_filter_q_expressions(kwargs)), info))
 
     def resolve_jurisdictions_paginated(self, info, **kwargs):
-        return resolve_paginated_for_type(
+        return prefetch_paginated_revision_metadata(resolve_paginated_for_type(
             JurisdictionPaginatedType,
             JurisdictionQuery._resolve_jurisdictions,
             **kwargs
-        )
+        ), info)
+
+    def resolve_jurisdictions_connection(self, info, **kwargs):
+        return resolve_keyset_connection_for_type(JurisdictionQuery._resolve_jurisdictions, info, **kwargs)
 
     def resolve_jurisdictions_versioned(self, info, **kwargs):
         """
@@ -119,9 +150,8 @@ def jurisdiction_resolver(manager_method, **kwargs):
     """
 
     q_expressions = process_filter_kwargs(Jurisdiction, **kwargs)
-    return getattr(Jurisdiction.objects, manager_method)(
-        *q_expressions
-    )
+    queryset = warn_unindexed_json_filters(Jurisdiction.objects.filter(*q_expressions))
+    return getattr(queryset, manager_method)()
 
 
 jurisdiction_mutation_config = dict(
@@ -197,6 +227,12 @@ graphql_query_jurisdictions_paginated = graphql_query(
     'jurisdictionsPaginated'
 )
 
+graphql_query_jurisdictions_connection = graphql_query(
+    JurisdictionConnectionType,
+    jurisdiction_connection_fields,
+    'jurisdictionsConnection'
+)
+
 graphql_query_jurisdictions_versioned = graphql_query(
     JurisdictionVersionedType,
     jurisdiction_versioned_fields,
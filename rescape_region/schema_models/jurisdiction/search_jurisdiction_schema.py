@@ -24,6 +24,7 @@ from rescape_region.schema_models.jurisdiction.jurisdiction_schema import jurisd
 from rescape_region.schema_models.jurisdiction.search_jurisdiction_data_schema import SearchJurisdictionDataType, \
     search_jurisdiction_data_fields
 from rescape_region.models.search_jurisdiction import SearchJurisdiction
+from rescape_region.models.revision_mixin import prefetch_revision_metadata
 
 from rescape_python_helpers import ramda as R, memoize
 
@@ -111,7 +112,7 @@ class SearchJurisdictionQuery(ObjectType):
         return search_jurisdiction_resolver('filter', **kwargs)
 
     def resolve_search_jurisdictions(self, info, **kwargs):
-        return search_jurisdiction_resolver(info, **kwargs)
+        return prefetch_revision_metadata(search_jurisdiction_resolver('filter', **kwargs), info)
 
 
 def search_jurisdiction_resolver(manager_method, **kwargs):
@@ -0,0 +1,176 @@
+import base64
+import json
+
+from django.db.models import F, Q, Expression, Value, BooleanField, DateTimeField, IntegerField
+from django.utils.dateparse import parse_datetime
+from graphene import ObjectType, String, Int, Boolean, List
+from rescape_graphene import DENY
+from rescape_graphene.graphql_helpers.schema_helpers import top_level_allowed_filter_arguments
+from rescape_python_helpers import ramda as R
+
+from rescape_region.models.revision_mixin import prefetch_revision_metadata
+
+# The number of objects returned when first isn't given
+DEFAULT_KEYSET_PAGE_SIZE = 100
+
+# Newest first. Postgres sorts nulls first when descending, which matches the index of
+# rescape_region.models.revision_mixin.keyset_index. Instances saved before updated_at was denormalized have null
+# until backfill_revision_columns is run
+KEYSET_ORDERING = [F('updated_at').desc(nulls_first=True), F('id').desc()]
+
+
+def create_keyset_connection_type(model_object_type, model_object_type_fields):
+    """
+        Constructs a Connection type for cursor pagination of model_object_type, ordered by updated_at then id.
+        Unlike the paginated types of create_paginated_type_mixin, it neither counts the matching instances nor
+        offsets into them. The count is only made if total_count is queried
+    :param model_object_type: E.g. LocationType
+    :param model_object_type_fields: The fields of the model_object_type, e.g. location_fields
+    :return: An object containing {type: The class, fields: The fields}
+    """
+    connection_type = type(
+        f'{model_object_type.__name__}Connection',
+        (ObjectType,),
+        dict(
+            first=Int(),
+            after=String(),
+            end_cursor=String(),
+            has_next=Boolean(),
+            total_count=Int(),
+            objects=List(model_object_type),
+        )
+    )
+
+    connection_fields = dict(
+        first=dict(type=Int, graphene_type=Int, create=DENY, update=DENY),
+        after=dict(type=String, graphene_type=String, create=DENY, update=DENY),
+        end_cursor=dict(type=String, graphene_type=String, create=DENY, update=DENY),
+        has_next=dict(type=Boolean, graphene_type=Boolean, create=DENY, update=DENY),
+        total_count=dict(type=Int, graphene_type=Int, create=DENY, update=DENY),
+        objects=dict(
+            type=model_object_type,
+            graphene_type=model_object_type,
+            fields=model_object_type_fields,
+            type_modifier=lambda *type_and_args: List(*type_and_args)
+        )
+    )
+    return dict(type=connection_type, fields=connection_fields)
+
+
+def keyset_connection_arguments(connection_fields, connection_type):
+    """
+        The arguments of a Connection field: first, after and objects, the filters of the objects as for
+        paginated types
+    :param connection_fields: The fields from create_keyset_connection_type
+    :param connection_type: The type from create_keyset_connection_type
+    :return: dict of arguments
+    """
+    return R.pick(
+        ['first', 'after', 'objects'],
+        top_level_allowed_filter_arguments(connection_fields, connection_type)
+    )
+
+
+def encode_cursor(instance):
+    """
+        An opaque cursor of the instance's position in KEYSET_ORDERING
+    :param instance: A RevisionModelMixin instance
+    :return: The cursor string
+    """
+    updated_at = instance.updated_at.isoformat() if instance.updated_at else None
+    return base64.urlsafe_b64encode(json.dumps([updated_at, instance.id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+        The inverse of encode_cursor
+    :param cursor: The cursor string
+    :return: (updated_at, id)
+    """
+    try:
+        updated_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (parse_datetime(updated_at) if updated_at else None), int(id)
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid cursor {cursor}')
+
+
+class KeysetBefore(Expression):
+    """
+        The row comparison (updated_at, id) < (updated_at, id) of the instances that follow a cursor in
+        KEYSET_ORDERING. Unlike the equivalent OR of the columns' comparisons, Postgres serves it with one range
+        scan of the keyset_index. Rows with a null updated_at, which precede the cursor, don't match
+    """
+    conditional = True
+
+    def __init__(self, updated_at, id):
+        super().__init__(output_field=BooleanField())
+        self.columns = [F('updated_at'), F('id')]
+        self.values = [Value(updated_at, output_field=DateTimeField()), Value(id, output_field=IntegerField())]
+
+    def get_source_expressions(self):
+        return [*self.columns, *self.values]
+
+    def set_source_expressions(self, exprs):
+        self.columns, self.values = exprs[:2], exprs[2:]
+
+    def as_sql(self, compiler, connection):
+        column_sqls, column_params = zip(*[compiler.compile(column) for column in self.columns])
+        value_sqls, value_params = zip(*[compiler.compile(value) for value in self.values])
+        return f'({", ".join(column_sqls)}) < ({", ".join(value_sqls)})', \
+            [param for params in [*column_params, *value_params] for param in params]
+
+
+def after_cursor(cursor):
+    """
+        The filter of the instances that follow the cursor in KEYSET_ORDERING
+    :param cursor: The cursor string
+    :return: A KeysetBefore or, for a cursor within the leading null updated_at instances, a Q expression
+    """
+    updated_at, id = decode_cursor(cursor)
+    if updated_at is None:
+        # Within the leading null updated_at instances, or past all of them. Only instances that haven't been
+        # backfilled have null, so this is only used before backfill_revision_columns is run
+        return Q(updated_at__isnull=True, id__lt=id) | Q(updated_at__isnull=False)
+    return KeysetBefore(updated_at, id)
+
+
+class KeysetConnection(object):
+    """
+        The result of resolve_keyset_connection_for_type. total_count is a property so that the instances are only
+        counted when the query asks for it
+    """
+
+    def __init__(self, queryset, first, after, objects, has_next):
+        self.queryset = queryset
+        self.first = first
+        self.after = after
+        self.objects = objects
+        self.has_next = has_next
+        self.end_cursor = encode_cursor(objects[-1]) if objects else None
+
+    @property
+    def total_count(self):
+        return self.queryset.count()
+
+
+def resolve_keyset_connection_for_type(type_resolver, info=None, **kwargs):
+    """
+        Resolver for Connection types. Reads one instance more than first to know if there is a next page
+    :param type_resolver: The resolver for the non-paginated type, e.g. location_resolver
+    :param info: Optional graphene ResolveInfo, used to skip the revision metadata unless selected.
+    See prefetch_revision_metadata
+    :param kwargs: objects, the array of prop sets to filter by, first, the page size, defaulting to
+    DEFAULT_KEYSET_PAGE_SIZE, and after, the end_cursor of the previous page
+    :return: A KeysetConnection
+    """
+    first = R.prop_or(None, 'first', kwargs) or DEFAULT_KEYSET_PAGE_SIZE
+    after = R.prop_or(None, 'after', kwargs)
+    queryset = R.reduce(
+        lambda qs, q: qs | q if qs is not None else q,
+        None,
+        R.map(lambda obj: type_resolver('filter', **obj), R.prop_or(None, 'objects', kwargs) or [{}])
+    )
+
+    page_queryset = queryset.filter(after_cursor(after)) if after else queryset
+    instances = list(prefetch_revision_metadata(page_queryset.order_by(*KEYSET_ORDERING)[:first + 1], info))
+    return KeysetConnection(queryset, first, after, instances[:first], len(instances) > first)
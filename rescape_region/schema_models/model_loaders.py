@@ -0,0 +1,98 @@
+import json
+
+from promise import Promise
+from promise.dataloader import DataLoader
+from rescape_graphene.graphql_helpers.schema_helpers import flatten_query_kwargs
+from rescape_python_helpers import ramda as R
+from safedelete.models import SafeDeleteModel
+
+from rescape_region.middleware.instrumentation_middleware import instrumented_as
+
+
+class ModelLoader(DataLoader):
+    """
+        Loads the instances of a model class by id. The ids requested while a response resolves are batched
+        into one id__in query instead of one query per id
+    """
+
+    def __init__(self, model_class, filter_kwargs=None, context=None):
+        """
+        :param model_class: The Django model class
+        :param filter_kwargs: Query arguments beyond id that the instances must match
+        :param context: Optional graphene context, whose instrumentation records the batch queries. See instrumented_as
+        """
+        super().__init__()
+        self.model_class = model_class
+        self.filter_kwargs = filter_kwargs or {}
+        self.context = context
+
+    def batch_load_fn(self, ids):
+        with instrumented_as(self.context, self.model_class.__name__):
+            return self.load_instances(ids)
+
+    def load_instances(self, ids):
+        q_expressions = flatten_query_kwargs(self.model_class, self.filter_kwargs)
+        # Key by string ids since json data may store ids as strings or ints
+        instances_by_id = {
+            str(pk): instance for pk, instance in
+            self.model_class.objects.filter(*q_expressions, id__in=ids).in_bulk().items()
+        }
+        missing_ids = [id for id in ids if str(id) not in instances_by_id]
+        if missing_ids and issubclass(self.model_class, SafeDeleteModel):
+            # Like model_resolver_for_dict_field, resolve references to deleted instances
+            instances_by_id.update({
+                str(pk): instance for pk, instance in
+                self.model_class.objects.all(force_visibility=True).filter(
+                    *q_expressions, id__in=missing_ids
+                ).in_bulk().items()
+            })
+
+        def instance_or_error(id):
+            instance = R.prop_or(None, str(id), instances_by_id)
+            if instance or not issubclass(self.model_class, SafeDeleteModel):
+                return instance
+            # A DataLoader rejects the load of an Exception value
+            return Exception(
+                f'For model {self.model_class.__name__} and id {id}, no instances were found, either deleted or not'
+            )
+
+        return Promise.resolve(R.map(instance_or_error, ids))
+
+
+def model_loader(context, model_class, filter_kwargs=None):
+    """
+        Returns the ModelLoader of the model class and filter arguments for the current request, creating it
+        on first use. Loaders live on the request so that instances are cached for a single response only
+    :param context: The graphene context, normally the Django request
+    :param model_class: The Django model class
+    :param filter_kwargs: Query arguments beyond id
+    :return: The ModelLoader
+    """
+    if not hasattr(context, 'model_loaders'):
+        context.model_loaders = {}
+    key = (model_class, json.dumps(filter_kwargs or {}, sort_keys=True, default=str))
+    if key not in context.model_loaders:
+        context.model_loaders[key] = ModelLoader(model_class, filter_kwargs, context)
+    return context.model_loaders[key]
+
+
+def model_loader_resolver_for_dict_field(model_class):
+    """
+        Like rescape_graphene's model_resolver_for_dict_field, resolves a Django model instance referenced by id
+        in a data field, but loads it with the request's ModelLoader. All references to the model class in a
+        response, such as every userProjects.project of every UserState, are therefore resolved with one query
+    :param model_class: The Django model class
+    :return: A resolver that returns a Promise of the instance
+    """
+
+    def _model_loader_resolver_for_dict_field(resource, info, **kwargs):
+        field_name = info.field_name
+        reference = R.prop_or(dict(), field_name, resource) if isinstance(resource, dict) else \
+            getattr(resource, field_name)
+        id = R.prop_or(None, 'id', reference) if reference else None
+        # If no instance id is assigned to this data, we can't resolve it
+        if not id:
+            return None
+        return model_loader(info.context, model_class, kwargs).load(id)
+
+    return _model_loader_resolver_for_dict_field
@@ -1,3 +1,5 @@
+import copy
+
 import graphene
 from django.db import transaction
 from graphene import InputObjectType, Mutation, Field, ObjectType
@@ -5,7 +7,7 @@ from graphene_django.types import DjangoObjectType
 from graphql_jwt.decorators import login_required
 from rescape_graphene import REQUIRE, graphql_update_or_create, graphql_query, guess_update_or_create, \
     CREATE, UPDATE, input_type_parameters_for_update_or_create, input_type_fields, merge_with_django_properties, \
-    DENY, FeatureCollectionDataType, resolver_for_dict_field, increment_prop_until_unique
+    DENY, FeatureCollectionDataType, resolver_for_dict_field
 from rescape_graphene import enforce_unique_props
 from rescape_graphene.graphql_helpers.schema_helpers import process_filter_kwargs, update_or_create_with_revision, \
     top_level_allowed_filter_arguments
@@ -13,10 +15,14 @@ from rescape_graphene.schema_models.django_object_type_revisioned_mixin import r
     DjangoObjectTypeRevisionedMixin
 from rescape_python_helpers import ramda as R
 
-from rescape_region.helpers.sankey_helpers import add_sankey_graph_to_resource_dict
+from rescape_region.helpers.sankey_graph_cache import add_cached_sankey_graph_to_resource_dict, \
+    add_cached_sankey_graphs_to_resource_dicts, sankey_graph_cache_stats
+from rescape_region.helpers.sankey_helpers import create_sankey_graph_from_resources, compact_sankey_graph
+from rescape_region.helpers.unique_values import allocate_unique_prop, allocate_unique_props
 from rescape_region.models.resource import Resource
+from rescape_region.models.revision_mixin import prefetch_revision_metadata
 from rescape_region.schema_models.scope.region.region_schema import RegionType
-from rescape_region.schema_models.resource_data_schema import ResourceDataType, resource_data_fields
+from rescape_region.schema_models.resource_data_schema import ResourceDataType, resource_data_fields, GraphDataType
 
 
 class ResourceType(DjangoObjectType, DjangoObjectTypeRevisionedMixin):
@@ -28,7 +34,7 @@ class ResourceType(DjangoObjectType, DjangoObjectTypeRevisionedMixin):
 
 raw_resource_fields = merge_with_django_properties(ResourceType, dict(
     id=dict(create=DENY, update=REQUIRE),
-    key=dict(create=REQUIRE, unique_with=increment_prop_until_unique(Resource, None, 'key', R.pick(['deleted']))),
+    key=dict(create=REQUIRE, unique_with=allocate_unique_prop(Resource, 'key', R.pick(['deleted']))),
     name=dict(create=REQUIRE),
     # This refers to the Resource, which is a representation of all the json fields of Resource.data
     data=dict(graphene_type=ResourceDataType, fields=resource_data_fields, default=lambda: dict()),
@@ -57,6 +63,14 @@ ResourceType._meta.fields['geojson'] = Field(
 resource_fields = merge_with_django_properties(ResourceType, raw_resource_fields)
 
 
+class SankeyGraphCacheStatsType(ObjectType):
+    """
+        The hits and misses of the Sankey graph cache in the process that resolves the query
+    """
+    hits = graphene.Int()
+    misses = graphene.Int()
+
+
 class ResourceQuery(ObjectType):
     id = graphene.Int(source='pk')
 
@@ -65,13 +79,29 @@ class ResourceQuery(ObjectType):
         **top_level_allowed_filter_arguments(resource_fields, ResourceType)
     )
 
+    # The combined Sankey graph of all of the resources of a region. See create_sankey_graph_from_resources
+    region_sankey = graphene.Field(GraphDataType, region_id=graphene.Int(required=True))
+
+    sankey_graph_cache_stats = graphene.Field(SankeyGraphCacheStatsType)
+
+    @login_required
+    def resolve_region_sankey(self, info, region_id):
+        # Stream the resources instead of loading all of their data at once
+        resources = Resource.objects.filter(region__id=region_id, deleted__isnull=True).order_by('id').iterator()
+        # The nodes and links fields expand only the selected fields of the compact graph
+        return compact_sankey_graph(create_sankey_graph_from_resources(resources))
+
+    @login_required
+    def resolve_sankey_graph_cache_stats(self, info):
+        return SankeyGraphCacheStatsType(**sankey_graph_cache_stats())
+
     @login_required
     def resolve_resources(self, info, **kwargs):
         q_expressions = process_filter_kwargs(Resource, **R.merge(dict(deleted__isnull=True), kwargs))
 
-        return Resource.objects.filter(
+        return prefetch_revision_metadata(Resource.objects.filter(
             *q_expressions
-        )
+        ), info)
 
 
 resource_mutation_config = dict(
@@ -84,6 +114,43 @@ resource_mutation_config = dict(
 )
 
 
+def resource_update_or_create_values(resource_data, existing_data=None, unique_props_allocated=False):
+    """
+        Creates the update_or_create_values of a Resource mutation. If resource_data has an id the existing
+        Resource.data is deep merged with resource_data.data
+    :param resource_data: The mutation input
+    :param existing_data: Optional data of the existing Resource if already queried
+    :param unique_props_allocated: Default False. True if the unique props were already allocated for a batch
+    :return: A tuple of the update_or_create_values and the existing data from before the merge, which
+        lets add_sankey_graph_to_resource_dict update the existing graph instead of regenerating it when rows are
+        appended to data.rawData
+    """
+    previous_data = None
+    # We must merge in existing resource.data if we are updating
+    if R.has('id', resource_data):
+        if existing_data is None:
+            existing_data = Resource.objects.get(id=resource_data['id']).data
+        # merge_deep modifies existing_data, so copy it first. The graph is left out of the copy since it's
+        # only read. If the update sets data.graph we regenerate it
+        if not R.has('graph', R.prop_or({}, 'data', resource_data)):
+            previous_data = R.merge(
+                copy.deepcopy(R.omit(['graph'], existing_data)),
+                R.pick(['graph'], existing_data)
+            )
+        # New data gets priority, but this is a deep merge.
+        resource_data['data'] = R.merge_deep(
+            existing_data,
+            R.prop_or({}, 'data', resource_data)
+        )
+        # Modifies defaults value to add .data.graph
+        # We could decide in the future to generate this derived data on the client, but it's easy enough to do here
+
+    # Make sure that all props are unique that must be, either by modifying values or erring.
+    modified_resource_data = resource_data if unique_props_allocated else \
+        enforce_unique_props(resource_fields, resource_data)
+    return input_type_parameters_for_update_or_create(resource_fields, modified_resource_data), previous_data
+
+
 class UpsertResource(Mutation):
     """
         Abstract base class for mutation
@@ -93,24 +160,13 @@ class UpsertResource(Mutation):
     @transaction.atomic
     @login_required
     def mutate(self, info, resource_data=None):
-        # We must merge in existing resource.data if we are updating
-        if R.has('id', resource_data):
-            # New data gets priority, but this is a deep merge.
-            resource_data['data'] = R.merge_deep(
-                Resource.objects.get(id=resource_data['id']).data,
-                R.prop_or({}, 'data', resource_data)
-            )
-            # Modifies defaults value to add .data.graph
-            # We could decide in the future to generate this derived data on the client, but it's easy enough to do here
-
-        modified_resource_data = enforce_unique_props(resource_fields, resource_data)
-        # Make sure that all props are unique that must be, either by modifying values or erring.
-        update_or_create_values = input_type_parameters_for_update_or_create(resource_fields, modified_resource_data)
+        update_or_create_values, previous_data = resource_update_or_create_values(resource_data)
 
         # Add the sankey data unless we are updating the instance without updating instance.data
         update_or_create_values_with_sankey_data = R.merge(update_or_create_values, dict(
-            defaults=add_sankey_graph_to_resource_dict(
-                update_or_create_values['defaults']
+            defaults=add_cached_sankey_graph_to_resource_dict(
+                update_or_create_values['defaults'],
+                previous_data
             )
         )) if R.has('defaults', update_or_create_values) else update_or_create_values
 
@@ -118,14 +174,20 @@ class UpsertResource(Mutation):
         return UpsertResource(resource=resource)
 
 
+CreateResourceInputType = type('CreateResourceInputType', (InputObjectType,),
+                               input_type_fields(resource_fields, CREATE, ResourceType))
+
+UpdateResourceInputType = type('UpdateResourceInputType', (InputObjectType,),
+                               input_type_fields(resource_fields, UPDATE, ResourceType))
+
+
 class CreateResource(UpsertResource):
     """
         Create Resource mutation class
     """
 
     class Arguments:
-        resource_data = type('CreateResourceInputType', (InputObjectType,),
-                             input_type_fields(resource_fields, CREATE, ResourceType))(required=True)
+        resource_data = CreateResourceInputType(required=True)
 
 
 class UpdateResource(UpsertResource):
@@ -134,13 +196,77 @@ class UpdateResource(UpsertResource):
     """
 
     class Arguments:
-        resource_data = type('UpdateResourceInputType', (InputObjectType,),
-                             input_type_fields(resource_fields, UPDATE, ResourceType))(required=True)
+        resource_data = UpdateResourceInputType(required=True)
+
+
+@transaction.atomic
+def bulk_upsert_resources(resources_data, max_workers=None):
+    """
+        Creates and updates many Resources, such as those of a region being imported. The graphs of the resources
+        are generated in parallel by add_cached_sankey_graphs_to_resource_dicts. Everything runs in one transaction,
+        so the keys, which are allocated for the whole batch at once, stay locked until the resources are saved
+    :param resources_data: The inputs of createResource or updateResource mutations
+    :param max_workers: Optional number of processes to generate the graphs. See sankey_graph_workers
+    :return: The Resource instances
+    """
+    # Make the keys unique among the existing resources and each other, as the unique_with of resource_fields' key
+    resources_data = allocate_unique_props(Resource, 'key', R.pick(['deleted']), resources_data)
+    # Query the data of the updated resources at once
+    existing_data_by_id = dict(Resource.objects.filter(
+        id__in=[resource_data['id'] for resource_data in resources_data if R.has('id', resource_data)]
+    ).values_list('id', 'data'))
+    values_and_previous_datas = [
+        resource_update_or_create_values(
+            resource_data,
+            existing_data_by_id.get(resource_data['id']) if R.has('id', resource_data) else None,
+            unique_props_allocated=True
+        )
+        for resource_data in resources_data
+    ]
+
+    # Add the sankey data unless we are updating the instance without updating instance.data
+    with_defaults = [
+        (update_or_create_values, previous_data)
+        for update_or_create_values, previous_data in values_and_previous_datas
+        if R.has('defaults', update_or_create_values)
+    ]
+    defaults_with_sankey_data = iter(add_cached_sankey_graphs_to_resource_dicts(
+        [update_or_create_values['defaults'] for update_or_create_values, _ in with_defaults],
+        [previous_data for _, previous_data in with_defaults],
+        max_workers
+    ))
+    all_update_or_create_values = [
+        R.merge(update_or_create_values, dict(defaults=next(defaults_with_sankey_data)))
+        if R.has('defaults', update_or_create_values) else update_or_create_values
+        for update_or_create_values, _ in values_and_previous_datas
+    ]
+
+    return [
+        update_or_create_with_revision(Resource, update_or_create_values)[0]
+        for update_or_create_values in all_update_or_create_values
+    ]
+
+
+class BulkUpsertResources(Mutation):
+    """
+        Creates and updates many Resources at once. See bulk_upsert_resources
+    """
+    resources = graphene.List(ResourceType)
+
+    class Arguments:
+        create_resources_data = graphene.List(CreateResourceInputType)
+        update_resources_data = graphene.List(UpdateResourceInputType)
+
+    @login_required
+    def mutate(self, info, create_resources_data=None, update_resources_data=None):
+        resources = bulk_upsert_resources((create_resources_data or []) + (update_resources_data or []))
+        return BulkUpsertResources(resources=resources)
 
 
 class ResourceMutation(graphene.ObjectType):
     create_resource = CreateResource.Field()
     update_resource = UpdateResource.Field()
+    bulk_upsert_resources = BulkUpsertResources.Field()
 
 
 graphql_update_or_create_resource = graphql_update_or_create(resource_mutation_config, resource_fields)
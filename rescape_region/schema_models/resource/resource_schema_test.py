@@ -116,3 +116,25 @@ class ResourceSchemaTestCase(TestCase):
             id=R.item_str_path('data.updateResource.resource.id', update_result)
         ))
         assert len(versions) == 2
+
+    def test_region_sankey(self):
+        result = self.client.execute('''
+            query regionSankey($regionId: Int!) {
+                regionSankey(regionId: $regionId) {
+                    nodes {
+                        name
+                        value
+                    }
+                    links {
+                        source
+                        target
+                        value
+                    }
+                }
+            }
+        ''', variables=dict(regionId=self.region.id))
+        assert not R.prop_or(None, 'errors', result), R.prop('errors', result)
+        region_sankey = R.item_path(['data', 'regionSankey'], result)
+        assert R.map(R.prop('name'), R.prop('nodes', region_sankey)) == R.map(R.prop('name'), self.graph['nodes'])
+        assert R.map(R.props(['source', 'target']), R.prop('links', region_sankey)) == \
+               R.map(R.props(['source', 'target']), self.graph['links'])
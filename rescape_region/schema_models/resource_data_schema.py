@@ -1,7 +1,10 @@
 from rescape_python_helpers import ramda as R
 from rescape_graphene import resolver_for_dict_field, resolver_for_dict_list
+from rescape_graphene.graphql_helpers.json_field_helpers import resolve_selections
 from graphene import ObjectType, String, Float, List, Field, Int, Boolean
 
+from rescape_region.helpers.sankey_helpers import is_compact_sankey_graph, expand_sankey_nodes, expand_sankey_links
+
 stage_data_fields = dict(
     key=dict(type=String),
     name=dict(type=String),
@@ -17,6 +20,20 @@ StageDataType = type(
         stage_data_fields)
 )
 
+number_format_data_fields = dict(
+    decimalSeparator=dict(type=String),
+    thousandsSeparator=dict(type=String)
+)
+
+NumberFormatDataType = type(
+    'NumberFormatDataType',
+    (ObjectType,),
+    R.map_with_obj(
+        # If we have a type_modifier function, pass the type to it, otherwise simply construct the type
+        lambda k, v: R.prop_or(lambda typ: typ(), 'type_modifier', v)(R.prop('type', v)),
+        number_format_data_fields)
+)
+
 resource_settings_data_fields = dict(
     defaultLocation=dict(type=Float, type_modifier=lambda typ: List(Float)),
     unit=dict(type=String),
@@ -27,6 +44,19 @@ resource_settings_data_fields = dict(
     nodeNameKey=dict(type=String),
     nodeColorKey=dict(type=String),
     linkColorKey=dict(type=String),
+    # How the nodes of the stages are linked, one of sankey_helpers.LINK_STRATEGIES. Defaults to 'all'
+    linkStrategy=dict(type=String),
+    # For the 'topTargets' linkStrategy, the number of nodes with the largest values to link to
+    linkTopTargets=dict(type=Int),
+    # The maximum number of links. Larger graphs fail to generate
+    maxLinks=dict(type=Int),
+    # The separators of the values. Defaults to a point for the decimal and commas for thousands
+    numberFormat=dict(
+        type=NumberFormatDataType,
+        graphene_type=NumberFormatDataType,
+        fields=number_format_data_fields,
+        type_modifier=lambda typ: Field(typ, resolver=resolver_for_dict_field)
+    ),
 
     stages=dict(
         type=StageDataType,
@@ -45,6 +75,41 @@ ResourceSettingsDataType = type(
         resource_settings_data_fields)
 )
 
+
+
+def resolver_for_graph_field(resource, context, **kwargs):
+    """
+        Resolver for data.graph. A compact graph (see compact_sankey_graph) is passed whole to the nodes and links
+        resolvers so they can expand only the selected fields. Other graphs are resolved like any dict field
+    :param resource:
+    :param context:
+    :params kwargs: Arguments to filter with
+    :return:
+    """
+    field_name = context.field_name
+    graph = R.prop(field_name, resource) if R.has(field_name, resource) else {}
+    return graph if is_compact_sankey_graph(graph) else resolver_for_dict_field(resource, context, **kwargs)
+
+
+def resolver_for_graph_list(expand):
+    """
+        Creates a resolver for graph.nodes or graph.links that expands a compact graph's nodes or links, limited to
+        the selected fields and to those matching the kwargs. Other graphs are resolved by resolver_for_dict_list
+    :param expand: expand_sankey_nodes or expand_sankey_links
+    :return: The resolver
+    """
+
+    def _resolver_for_graph_list(resource, context, **kwargs):
+        if not is_compact_sankey_graph(resource):
+            return resolver_for_dict_list(resource, context, **kwargs)
+        return R.filter(
+            lambda data: R.dict_matches_params_deep(kwargs, data),
+            expand(resource, R.concat(resolve_selections(context), list(R.keys(kwargs))))
+        ) if kwargs else expand(resource, resolve_selections(context))
+
+    return _resolver_for_graph_list
+
+
 geometry_data_fields = dict(
     type=dict(type=String),
     coordinates=dict(type=Float, type_modifier=lambda typ: List(typ))
@@ -103,8 +168,8 @@ LinkDataType = type(
 )
 
 graph_data_fields = dict(
-    links=dict(type=LinkDataType, graphene_type=LinkDataType, fields=link_data_fields, type_modifier=lambda typ: List(typ, resolver=resolver_for_dict_list)),
-    nodes=dict(type=NodeDataType, graphene_type=NodeDataType, fields=node_data_fields, type_modifier=lambda typ: List(typ, resolver=resolver_for_dict_list))
+    links=dict(type=LinkDataType, graphene_type=LinkDataType, fields=link_data_fields, type_modifier=lambda typ: List(typ, resolver=resolver_for_graph_list(expand_sankey_links))),
+    nodes=dict(type=NodeDataType, graphene_type=NodeDataType, fields=node_data_fields, type_modifier=lambda typ: List(typ, resolver=resolver_for_graph_list(expand_sankey_nodes)))
 )
 
 GraphDataType = type(
@@ -131,7 +196,7 @@ resource_data_fields = dict(
         type=GraphDataType,
         graphene_type=GraphDataType,
         fields=graph_data_fields,
-        type_modifier=lambda typ: Field(typ, resolver=resolver_for_dict_field)
+        type_modifier=lambda typ: Field(typ, resolver=resolver_for_graph_field)
     ),
     material=dict(type=String)
 )
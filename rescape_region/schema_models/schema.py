@@ -1,7 +1,9 @@
 import json
 import logging
+import random
 import traceback
 
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import QuerySet
 from django.db.models.base import Model
@@ -139,13 +141,101 @@ class MyDjangoJSONEncoder(DjangoJSONEncoder):
             return super().default(o)
 
 
+# Defaults of settings.GRAPHQL_REQUEST_LOG
+DEFAULT_GRAPHQL_REQUEST_LOG = dict(
+    # The fraction of requests whose top-level results are logged. Errors are always logged
+    SAMPLE_RATE=1.0,
+    # Results with more instances than this are logged without their ids
+    MAX_LOGGED_IDS=100
+)
+
+
+def graphql_request_log_settings():
+    """
+        DEFAULT_GRAPHQL_REQUEST_LOG merged with settings.GRAPHQL_REQUEST_LOG
+    :return: The settings dict
+    """
+    return R.merge(DEFAULT_GRAPHQL_REQUEST_LOG, getattr(settings, 'GRAPHQL_REQUEST_LOG', {}))
+
+
+def request_log_state(request):
+    """
+        The logging state of a request, created once per request. Whether the request is sampled is decided once
+        so that all of its top-level results are logged or none are
+    :param request: The Django request, info.context
+    :return: dict with sampled and the lazily parsed body
+    """
+    if not hasattr(request, 'graphql_request_log'):
+        request.graphql_request_log = dict(
+            sampled=random.random() < graphql_request_log_settings()['SAMPLE_RATE'],
+            body=None
+        )
+    return request.graphql_request_log
+
+
+def is_request_logged(request):
+    """
+        True if the top-level results of the request should be logged. Checked before attaching log_request_body
+        so that unsampled requests cost nothing
+    :param request: The Django request, info.context
+    :return: Boolean
+    """
+    return logger.isEnabledFor(logging.DEBUG) and request_log_state(request)['sampled']
+
+
+def request_json_body(request):
+    """
+        The request body parsed once per request
+    :param request: The Django request, info.context
+    :return: The json body
+    """
+    state = request_log_state(request)
+    if state['body'] is None:
+        state['body'] = json.loads(request.body.decode('utf-8'))
+    return state['body']
+
+
+def evaluated_instances(result):
+    """
+        The instances of a result if they are already loaded, so that logging them doesn't query
+    :param result: A list, QuerySet or other resolver result
+    :return: The instances or None if result is not a list or is an unevaluated QuerySet
+    """
+    if isinstance(result, QuerySet):
+        return result._result_cache
+    if isinstance(result, (list, tuple)):
+        return result
+    return None
+
+
+def describe_instances(instances):
+    """
+        Describes the count and ids of loaded instances
+    :param instances: A list of instances or None
+    :return: A description
+    """
+    if instances is None:
+        return 'an unevaluated query'
+    # Log up to MAX_LOGGED_IDS ids, don't log if it's a larger set because it might be a paging query
+    ids = R.join(' ', [
+        '', 'having ids:', R.join(', ', [str(getattr(instance, 'id', None)) for instance in instances])
+    ]) if len(instances) < graphql_request_log_settings()['MAX_LOGGED_IDS'] else ''
+    return f'{len(instances)} results{ids}'
+
+
 # https://stackoverflow.com/questions/52711580/how-to-see-graphene-django-debug-logs
 def log_request_body(info, response_or_error):
-    body = info.context._body.decode('utf-8')
+    """
+        Logs the request and its top-level result or error. This never queries: results are described only
+        if they are already loaded. Callers should check is_request_logged first for results, not for errors
+    :param info: The graphene ResolveInfo
+    :param response_or_error: The result or error of a top-level field
+    :return: None
+    """
     try:
-        json_body = json.loads(body)
-        (logger.error if isinstance(response_or_error, ErrorType) else logger.debug)(
-            f" User: {info.context.user} \n Action: {json_body['operationName']} \n Variables: {json_body['variables']} \n Body:  {json_body['query']}",
+        json_body = request_json_body(info.context)
+        (logger.error if isinstance(response_or_error, (ErrorType, Exception)) else logger.debug)(
+            f" User: {info.context.user} \n Action: {json_body.get('operationName')} \n Variables: {json_body.get('variables')} \n Body:  {json_body.get('query')}",
         )
         if hasattr(response_or_error, '_meta') and isinstance(response_or_error._meta, MutationOptions):
             # Just log top level types
@@ -167,24 +257,17 @@ def log_request_body(info, response_or_error):
                     logger.debug(f'Mutation returned {mutation_response}')
                 except:
                     logger.debug(f'Mutation returned {response_or_error.__class__}')
+        elif isinstance(response_or_error, Exception):
+            pass
+        elif hasattr(response_or_error, 'objects') and hasattr(response_or_error, 'page_size'):
+            logger.debug(
+                f'Paginated Query Page {response_or_error.page} of page size {response_or_error.page_size} out of total pages {response_or_error.pages} returned {describe_instances(evaluated_instances(response_or_error.objects))}'
+            )
+        elif isinstance(response_or_error, (QuerySet, list, tuple)):
+            logger.debug(f'Query returned {describe_instances(evaluated_instances(response_or_error))}')
         else:
-            if hasattr(response_or_error, 'objects'):
-                count = response_or_error.objects.count()
-                # Log up to 100 ids, don't log if it's a larger set because it might be a paging query
-                ids = R.join(' ',
-                             ['', 'having ids:',
-                              R.join(', ', R.map(R.prop("id"), response_or_error.objects.values('id')))]) if count < 100 else ""
-                logger.debug(f'Paginated Query Page {response_or_error.page} of page size {response_or_error.page_size} out of total pages {response_or_error.pages} returned {count} results{ids}')
-            elif hasattr(response_or_error, 'count'):
-                count = response_or_error.count()
-                # Log up to 100 ids, don't log if it's a larger set because it might be a paging query
-                ids = R.join(' ',
-                             ['', 'having ids:',
-                              R.join(', ', R.map(R.prop("id"), response_or_error.values('id')))]) if count < 100 else ""
-                logger.debug(f'Query returned {count} results{ids}')
-            else:
-                id = R.prop('id', response_or_error)
-                logger.debug(f'Query returned single result {id}')
+            id = getattr(response_or_error, 'id', None)
+            logger.debug(f'Query returned single result {id}')
 
     except Exception as e:
-        logging.error(body)
+        logging.error(info.context.body)
@@ -9,12 +9,19 @@ from rescape_graphene import graphql_update_or_create, graphql_query, guess_upda
     CREATE, UPDATE, input_type_parameters_for_update_or_create, input_type_fields, merge_with_django_properties, \
     create_paginated_type_mixin
 from rescape_graphene.django_helpers.pagination import resolve_paginated_for_type, pagination_allowed_filter_arguments
-from rescape_graphene.graphql_helpers.schema_helpers import update_or_create_with_revision, \
-    top_level_allowed_filter_arguments, delete_if_marked_for_delete, \
-    query_with_filter_and_order_kwargs
+from rescape_graphene.graphql_helpers.schema_helpers import top_level_allowed_filter_arguments, \
+    delete_if_marked_for_delete, query_with_filter_and_order_kwargs
 from rescape_python_helpers import ramda as R
 
 from rescape_region.models import Location
+from rescape_region.helpers.bulk_upsert import bulk_upsert_locations
+from rescape_region.helpers.jsonb_patch import update_or_create_with_revision_and_jsonb_patch
+from rescape_region.models.json_indexes import warn_unindexed_json_filters
+from rescape_region.models.revision_mixin import prefetch_revision_metadata, prefetch_paginated_revision_metadata
+from rescape_region.schema_models.geojson_filters import GEOJSON_FILTER_KEYS, geojson_filter_arguments, \
+    geojson_filter_q_expressions
+from rescape_region.schema_models.keyset_pagination import create_keyset_connection_type, keyset_connection_arguments, \
+    resolve_keyset_connection_for_type
 from rescape_region.schema_models.scope.location.location_schema_helpers import LocationType, raw_location_fields
 
 location_fields = merge_with_django_properties(LocationType, raw_location_fields(True))
@@ -24,33 +31,52 @@ location_fields = merge_with_django_properties(LocationType, raw_location_fields
     create_paginated_type_mixin(LocationType, location_fields)
 )
 
+# Cursor paginated version of LocationType
+(LocationConnectionType, location_connection_fields) = itemgetter('type', 'fields')(
+    create_keyset_connection_type(LocationType, location_fields)
+)
+
 
 class LocationQuery(ObjectType):
     locations = graphene.List(
         LocationType,
-        **top_level_allowed_filter_arguments(location_fields, LocationType)
+        # The spatial geojsonContains replaces the json containment filter of geojson
+        **R.merge(top_level_allowed_filter_arguments(location_fields, LocationType), geojson_filter_arguments())
     )
     locations_paginated = Field(
         LocationPaginatedType,
         **pagination_allowed_filter_arguments(location_paginated_fields, LocationPaginatedType)
     )
+    locations_connection = Field(
+        LocationConnectionType,
+        **keyset_connection_arguments(location_connection_fields, LocationConnectionType)
+    )
 
     @staticmethod
     def _resolve_locations(info, **kwargs):
         # Default to not deleted, it can be overridden by kwargs
-        return query_with_filter_and_order_kwargs(Location, **R.merge(dict(deleted__isnull=True), kwargs))
+        return warn_unindexed_json_filters(
+            query_with_filter_and_order_kwargs(Location, **R.merge(dict(deleted__isnull=True), kwargs))
+        )
 
     @login_required
     def resolve_locations(self, info, **kwargs):
-        return LocationQuery._resolve_locations(info, **kwargs)
+        return prefetch_revision_metadata(LocationQuery._resolve_locations(
+            info,
+            **R.omit(GEOJSON_FILTER_KEYS, kwargs)
+        ).filter(*geojson_filter_q_expressions(kwargs)), info)
 
     @login_required
     def resolve_locations_paginated(self, info, **kwargs):
-        return resolve_paginated_for_type(
+        return prefetch_paginated_revision_metadata(resolve_paginated_for_type(
             LocationPaginatedType,
             LocationQuery._resolve_locations,
             **kwargs
-        )
+        ), info)
+
+    @login_required
+    def resolve_locations_connection(self, info, **kwargs):
+        return resolve_keyset_connection_for_type(LocationQuery._resolve_locations, info, **kwargs)
 
 
 location_mutation_config = dict(
@@ -77,19 +103,12 @@ class UpsertLocation(Mutation):
             if deleted_location_response:
                 return deleted_location_response
 
-            # We must merge in existing location.data if we are updating data
-            if R.has('id', location_data) and R.has('data', location_data):
-                # New data gets priority, but this is a deep merge.
-                location_data['data'] = R.merge_deep(
-                    Location.objects.get(id=location_data['id']).data,
-                    location_data['data']
-                )
-
             # Make sure that all props are unique that must be, either by modifying values or erring.
             modified_location_data = enforce_unique_props(location_fields, location_data)
             update_or_create_values = input_type_parameters_for_update_or_create(location_fields, modified_location_data)
 
-            location, created = update_or_create_with_revision(Location, update_or_create_values)
+            # If we are updating data, it's deep merged into the existing location.data. New data gets priority
+            location, created = update_or_create_with_revision_and_jsonb_patch(Location, update_or_create_values)
             return UpsertLocation(location=location)
 
 
@@ -113,9 +132,51 @@ class UpdateLocation(UpsertLocation):
                              input_type_fields(location_fields, UPDATE, LocationType))(required=True)
 
 
+class BulkUpsertLocationResultType(ObjectType):
+    """
+        The outcome of one location of bulkUpsertLocations
+    """
+    # The id of the created or updated location. None if a create failed
+    id = graphene.Int()
+    # The key of the location, which may have been suffixed to make it unique
+    key = graphene.String()
+    # The error if the location wasn't saved
+    error = graphene.String()
+
+
+class BulkUpsertLocations(Mutation):
+    """
+        Creates the locations without an id and updates those with an id in chunks. See bulk_upsert_locations
+    """
+    results = graphene.List(BulkUpsertLocationResultType)
+
+    class Arguments:
+        # Nothing is required, since each location may be a create or an update
+        locations_data = graphene.List(type('BulkUpsertLocationInputType', (InputObjectType,), R.merge(
+            input_type_fields(R.omit(['id', 'projects'], location_fields), UPDATE, LocationType),
+            dict(id=graphene.Int())
+        )), required=True)
+
+    @login_required
+    def mutate(self, info, locations_data=None):
+        def instance_data(location_data):
+            # Convert the input as UpsertLocation does and flatten the update_or_create values
+            update_or_create_values = input_type_parameters_for_update_or_create(location_fields, location_data)
+            return R.merge(
+                R.omit(['defaults'], update_or_create_values),
+                R.prop_or({}, 'defaults', update_or_create_values)
+            )
+
+        return BulkUpsertLocations(results=R.map(
+            lambda result: BulkUpsertLocationResultType(**result),
+            bulk_upsert_locations(R.map(instance_data, locations_data))
+        ))
+
+
 class LocationMutation(graphene.ObjectType):
     create_location = CreateLocation.Field()
     update_location = UpdateLocation.Field()
+    bulk_upsert_locations = BulkUpsertLocations.Field()
 
 
 graphql_update_or_create_location = graphql_update_or_create(location_mutation_config, location_fields)
@@ -135,3 +196,9 @@ graphql_query_locations_paginated = graphql_query(
     location_paginated_fields,
     'locationsPaginated'
 )
+
+graphql_query_locations_connection = graphql_query(
+    LocationConnectionType,
+    location_connection_fields,
+    'locationsConnection'
+)
@@ -3,12 +3,12 @@ from graphene import Field, List
 from graphene_django.types import DjangoObjectType
 from rescape_graphene import REQUIRE, merge_with_django_properties, \
     DENY, FeatureCollectionDataType, resolver_for_dict_field
-from rescape_graphene import increment_prop_until_unique
 from rescape_graphene.schema_models.django_object_type_revisioned_mixin import reversion_and_safe_delete_types, \
     DjangoObjectTypeRevisionedMixin
 from rescape_graphene.schema_models.geojson.types.feature_collection import feature_collection_data_type_fields
 from rescape_python_helpers import ramda as R
 
+from rescape_region.helpers.unique_values import allocate_unique_prop
 from rescape_region.models import Location
 from rescape_region.schema_models.scope.location.location_data_schema import LocationDataType, location_data_fields
 
@@ -29,7 +29,7 @@ def raw_location_fields(with_reverse=True):
     return R.merge_all([
         dict(
             id=dict(create=DENY, update=REQUIRE),
-            key=dict(create=REQUIRE, unique_with=increment_prop_until_unique(Location, None, 'key', {})),
+            key=dict(create=REQUIRE, unique_with=allocate_unique_prop(Location, 'key', {})),
             name=dict(create=REQUIRE),
             # This refers to the LocationDataType, which is a representation of all the json fields of Location.data
             data=dict(
@@ -55,6 +55,8 @@ class LocationType(DjangoObjectType, DjangoObjectTypeRevisionedMixin):
 
     class Meta:
         model = Location
+        # The PostGIS copy of geojson. See GeojsonGeometryMixin
+        exclude = ('geometry',)
 
 # Modify data field to use the resolver.
 # I guess there's no way to specify a resolver upon field creation, since graphene just reads the underlying
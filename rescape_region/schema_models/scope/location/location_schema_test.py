@@ -17,8 +17,9 @@ django.setup()
 
 from rescape_region.model_helpers import get_location_schema
 from rescape_region.schema_models.scope.location.location_schema import graphql_update_or_create_location, graphql_query_locations, \
-    graphql_query_locations_paginated
+    graphql_query_locations_paginated, graphql_query_locations_connection
 from rescape_region.schema_models.schema import create_default_schema
+from rescape_region.schema_models.keyset_pagination import after_cursor, encode_cursor, KEYSET_ORDERING
 from rescape_graphene.graphql_helpers.schema_validating_helpers import quiz_model_query, quiz_model_mutation_create, \
     quiz_model_mutation_update, quiz_model_paginated_query
 from rescape_region.schema_models.user_sample import create_sample_users
@@ -82,6 +83,68 @@ class LocationSchemaTestCase(TestCase):
         )
         assert result['data']['locationsPaginated']['objects'][0]['name'] == "Petit Place"
 
+    def test_query_connection(self):
+        def query_page(after=None):
+            result = graphql_query_locations_connection(
+                self.client,
+                variables=dict(first=1, after=after, objects=[dict(nameContains='Place')])
+            )
+            assert not R.prop_or(None, 'errors', result), R.dump_json(R.prop('errors', result))
+            return R.item_path(['data', 'locationsConnection'], result)
+
+        first_page = query_page()
+        assert len(first_page['objects']) == 1
+        assert first_page['hasNext']
+        assert first_page['totalCount'] == 2
+        # The next page starts after the cursor of the first
+        last_page = query_page(first_page['endCursor'])
+        assert len(last_page['objects']) == 1
+        assert not last_page['hasNext']
+        assert last_page['objects'][0]['id'] != first_page['objects'][0]['id']
+
+    def test_after_cursor_row_comparison(self):
+        ordered = list(Location.objects.order_by(*KEYSET_ORDERING))
+        queryset = Location.objects.filter(after_cursor(encode_cursor(ordered[0]))).order_by(*KEYSET_ORDERING)
+        # A row comparison rather than an OR, so the keyset index serves the page as one range scan
+        assert '"updated_at", "rescape_region_location"."id") < (' in str(queryset.query)
+        assert list(queryset) == ordered[1:]
+
+    def test_query_geojson_filters(self):
+        query = '''query locations($intersects: JSONString, $withinDistance: WithinDistanceInputType) {
+            locations(geojsonIntersects: $intersects, withinDistance: $withinDistance) { key }
+        }'''
+
+        def query_keys(**variables):
+            result = self.client.execute(query, variables=variables)
+            assert not R.prop_or(None, 'errors', result), R.dump_json(R.prop('errors', result))
+            return sorted(R.map(R.prop('key'), R.item_path(['data', 'locations'], result)))
+
+        def point(lon, lat):
+            return R.dump_json(dict(type='Point', coordinates=[lon, lat]))
+
+        # The sample locations cover 49.5 to 51.5 east by 2.5 to 6.2 north
+        assert query_keys(intersects=point(50, 4)) == ['grandPlace', 'petitPlace']
+        assert query_keys(intersects=point(10, 10)) == []
+        # 52 east is about 58km east of the locations
+        assert query_keys(withinDistance=dict(geojson=point(52, 4), distance=100000)) == ['grandPlace', 'petitPlace']
+        assert query_keys(withinDistance=dict(geojson=point(52, 4), distance=10000)) == []
+
+    def test_bulk_upsert(self):
+        mutation = '''mutation bulkUpsertLocations($locationsData: [BulkUpsertLocationInputType]!) {
+            bulkUpsertLocations(locationsData: $locationsData) { results { id key error } }
+        }'''
+        result = self.client.execute(mutation, variables=dict(locationsData=[
+            dict(key='grandPlace', name='Grand Place'),
+            dict(id=self.locations[1].id, name='Petit Place Updated'),
+            dict(id=0, name='Missing')
+        ]))
+        assert not R.prop_or(None, 'errors', result), R.dump_json(R.prop('errors', result))
+        results = R.item_path(['data', 'bulkUpsertLocations', 'results'], result)
+        assert results[0]['key'] == 'grandPlace1'
+        assert results[1]['id'] == self.locations[1].id and not results[1]['error']
+        assert results[2]['error']
+        assert Location.objects.get(id=self.locations[1].id).name == 'Petit Place Updated'
+
     def test_query_order(self):
         result = quiz_model_query(
             self.client,
@@ -9,16 +9,22 @@ from rescape_graphene import REQUIRE, graphql_update_or_create, graphql_query, g
     CREATE, UPDATE, input_type_parameters_for_update_or_create, input_type_fields, merge_with_django_properties, \
     DENY, FeatureCollectionDataType, resolver_for_dict_field, UserType, user_fields, \
     create_paginated_type_mixin
-from rescape_graphene import increment_prop_until_unique, enforce_unique_props
+from rescape_graphene import enforce_unique_props
 from rescape_graphene.django_helpers.pagination import resolve_paginated_for_type, pagination_allowed_filter_arguments
 from rescape_graphene.graphql_helpers.schema_helpers import process_filter_kwargs, delete_if_marked_for_delete, \
-    update_or_create_with_revision, top_level_allowed_filter_arguments, ALLOW
+    top_level_allowed_filter_arguments, ALLOW
 from rescape_graphene.schema_models.django_object_type_revisioned_mixin import reversion_and_safe_delete_types, \
     DjangoObjectTypeRevisionedMixin
 from rescape_graphene.schema_models.geojson.types.feature_collection import feature_collection_data_type_fields
 from rescape_python_helpers import ramda as R
 
 from rescape_region.model_helpers import get_project_model, get_location_for_project_schema
+from rescape_region.helpers.jsonb_patch import update_or_create_with_revision_and_jsonb_patch
+from rescape_region.helpers.unique_values import allocate_unique_prop
+from rescape_region.models.json_indexes import warn_unindexed_json_filters
+from rescape_region.models.revision_mixin import prefetch_revision_metadata, prefetch_paginated_revision_metadata
+from rescape_region.schema_models.keyset_pagination import create_keyset_connection_type, keyset_connection_arguments, \
+    resolve_keyset_connection_for_type
 from rescape_region.schema_models.scope.region.region_schema import RegionType, region_fields
 from .project_data_schema import ProjectDataType, project_data_fields
 
@@ -29,7 +35,7 @@ raw_project_fields = dict(
     id=dict(create=DENY, update=REQUIRE),
     key=dict(
         create=REQUIRE,
-        unique_with=increment_prop_until_unique(get_project_model(), None, 'key', R.pick(['deleted', 'user_id'])),
+        unique_with=allocate_unique_prop(get_project_model(), 'key', R.pick(['deleted', 'user_id'])),
         # Allows UserState.data.userProjects to persist a new project
         related_input=ALLOW
     ),
@@ -107,6 +113,11 @@ project_mutation_config = dict(
     create_paginated_type_mixin(ProjectType, project_fields)
 )
 
+# Cursor paginated version of ProjectType
+(ProjectConnectionType, project_connection_fields) = itemgetter('type', 'fields')(
+    create_keyset_connection_type(ProjectType, project_fields)
+)
+
 
 class ProjectQuery(ObjectType):
     projects = graphene.List(
@@ -117,6 +128,10 @@ class ProjectQuery(ObjectType):
         ProjectPaginatedType,
         **pagination_allowed_filter_arguments(project_paginated_fields, ProjectPaginatedType)
     )
+    projects_connection = Field(
+        ProjectConnectionType,
+        **keyset_connection_arguments(project_connection_fields, ProjectConnectionType)
+    )
 
     @staticmethod
     def _resolve_projects(info, **kwargs):
@@ -124,15 +139,19 @@ class ProjectQuery(ObjectType):
 
     @login_required
     def resolve_projects(self, info, **kwargs):
-        return ProjectQuery._resolve_projects(info, **kwargs)
+        return prefetch_revision_metadata(ProjectQuery._resolve_projects(info, **kwargs), info)
 
     @login_required
     def resolve_projects_paginated(self, info, **kwargs):
-        return resolve_paginated_for_type(
+        return prefetch_paginated_revision_metadata(resolve_paginated_for_type(
             ProjectPaginatedType,
             ProjectQuery._resolve_projects,
             **kwargs
-        )
+        ), info)
+
+    @login_required
+    def resolve_projects_connection(self, info, **kwargs):
+        return resolve_keyset_connection_for_type(ProjectQuery._resolve_projects, info, **kwargs)
 
 
 def project_resolver(manager_method, **kwargs):
@@ -145,9 +164,8 @@ def project_resolver(manager_method, **kwargs):
     """
 
     q_expressions = process_filter_kwargs(get_project_model(), **R.merge(dict(deleted__isnull=True), kwargs))
-    return getattr(get_project_model().objects, manager_method)(
-        *q_expressions
-    )
+    queryset = warn_unindexed_json_filters(get_project_model().objects.filter(*q_expressions))
+    return getattr(queryset, manager_method)()
 
 
 class UpsertProject(Mutation):
@@ -164,15 +182,6 @@ class UpsertProject(Mutation):
         if deleted_project_response:
             return deleted_project_response
 
-        # We must merge in existing project.data if we are updating data
-        if R.has('id', project_data) and R.has('data', project_data):
-            # New data gets priority, but this is a deep merge.
-            # If anything is omitted from the new data, it's assumed that the existing value should remain
-            project_data['data'] = R.merge_deep(
-                get_project_model().objects.get(id=project_data['id']).data,
-                project_data['data']
-            )
-
         # Make sure that all props are unique that must be, either by modifying values or erring.
         modified_project_data = enforce_unique_props(project_fields, project_data)
 
@@ -182,7 +191,9 @@ class UpsertProject(Mutation):
             R.omit(['locations'], modified_project_data)
         )
 
-        project, created = update_or_create_with_revision(get_project_model(), update_or_create_values)
+        # If we are updating data, it's deep merged into the existing project.data. New data gets priority.
+        # If anything is omitted from the new data, it's assumed that the existing value should remain
+        project, created = update_or_create_with_revision_and_jsonb_patch(get_project_model(), update_or_create_values)
         locations = R.prop_or([], 'locations', modified_project_data)
         any_locations = R.compose(R.lt(0), R.length, locations)
         if not created and any_locations:
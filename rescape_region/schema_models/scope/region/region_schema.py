@@ -9,22 +9,31 @@ from rescape_graphene import REQUIRE, graphql_update_or_create, graphql_query, g
     CREATE, UPDATE, input_type_parameters_for_update_or_create, input_type_fields, merge_with_django_properties, \
     DENY, FeatureCollectionDataType, resolver_for_dict_field, create_paginated_type_mixin, \
     get_paginator
-from rescape_graphene import increment_prop_until_unique, enforce_unique_props
+from rescape_graphene import enforce_unique_props
 from rescape_graphene.django_helpers.pagination import resolve_paginated_for_type, pagination_allowed_filter_arguments
 from rescape_graphene.graphql_helpers.schema_helpers import process_filter_kwargs, delete_if_marked_for_delete, \
-    update_or_create_with_revision, top_level_allowed_filter_arguments, allowed_filter_arguments
+    top_level_allowed_filter_arguments, allowed_filter_arguments
 from rescape_graphene.schema_models.django_object_type_revisioned_mixin import reversion_and_safe_delete_types, \
     DjangoObjectTypeRevisionedMixin
 from rescape_graphene.schema_models.geojson.types.feature_collection import feature_collection_data_type_fields
 from rescape_python_helpers import ramda as R
 
+from rescape_region.helpers.jsonb_patch import update_or_create_with_revision_and_jsonb_patch
+from rescape_region.helpers.resolver_cache import cached_resolver
+from rescape_region.helpers.unique_values import allocate_unique_prop
 from rescape_region.model_helpers import get_region_model
 from rescape_region.models.region import Region
+from rescape_region.models.json_indexes import warn_unindexed_json_filters
+from rescape_region.models.revision_mixin import prefetch_revision_metadata, prefetch_paginated_revision_metadata
+from rescape_region.schema_models.geojson_filters import GEOJSON_FILTER_KEYS, geojson_filter_arguments, \
+    geojson_filter_q_expressions
+from rescape_region.schema_models.keyset_pagination import create_keyset_connection_type, keyset_connection_arguments, \
+    resolve_keyset_connection_for_type
 from .region_data_schema import RegionDataType, region_data_fields
 
 raw_region_fields = dict(
     id=dict(create=DENY, update=REQUIRE),
-    key=dict(create=REQUIRE, unique_with=increment_prop_until_unique(Region, None, 'key', R.pick(['deleted']))),
+    key=dict(create=REQUIRE, unique_with=allocate_unique_prop(Region, 'key', R.pick(['deleted']))),
     name=dict(create=REQUIRE),
     # This refers to the RegionDataType, which is a representation of all the json fields of Region.data
     data=dict(graphene_type=RegionDataType, fields=region_data_fields, default=lambda: dict()),
@@ -42,6 +51,8 @@ class RegionType(DjangoObjectType, DjangoObjectTypeRevisionedMixin):
 
     class Meta:
         model = get_region_model()
+        # The PostGIS copy of geojson. See GeojsonGeometryMixin
+        exclude = ('geometry',)
 
 
 # Modify data field to use the resolver.
@@ -65,32 +76,51 @@ region_fields = merge_with_django_properties(RegionType, raw_region_fields)
     create_paginated_type_mixin(RegionType, region_fields)
 )
 
+# Cursor paginated version of RegionType
+(RegionConnectionType, region_connection_fields) = itemgetter('type', 'fields')(
+    create_keyset_connection_type(RegionType, region_fields)
+)
+
 
 class RegionQuery(ObjectType):
     regions = graphene.List(
         RegionType,
-        **top_level_allowed_filter_arguments(region_fields, RegionType)
+        # The spatial geojsonContains replaces the json containment filter of geojson
+        **R.merge(top_level_allowed_filter_arguments(region_fields, RegionType), geojson_filter_arguments())
     )
     regions_paginated = Field(
         RegionPaginatedType,
         **pagination_allowed_filter_arguments(region_paginated_fields, RegionPaginatedType)
     )
+    regions_connection = Field(
+        RegionConnectionType,
+        **keyset_connection_arguments(region_connection_fields, RegionConnectionType)
+    )
 
     @staticmethod
     def _resolve_regions(info, **kwargs):
         return region_resolver('filter', **kwargs)
 
     @login_required
+    @cached_resolver(get_region_model())
     def resolve_regions(self, info, **kwargs):
-        return RegionQuery._resolve_regions(info, **kwargs)
+        # Cached results must be lists
+        return list(prefetch_revision_metadata(RegionQuery._resolve_regions(
+            info,
+            **R.omit(GEOJSON_FILTER_KEYS, kwargs)
+        ).filter(*geojson_filter_q_expressions(kwargs)), info))
 
     @login_required
     def resolve_regions_paginated(self, info, **kwargs):
-        return resolve_paginated_for_type(
+        return prefetch_paginated_revision_metadata(resolve_paginated_for_type(
             RegionPaginatedType,
             RegionQuery._resolve_regions,
             **kwargs
-        )
+        ), info)
+
+    @login_required
+    def resolve_regions_connection(self, info, **kwargs):
+        return resolve_keyset_connection_for_type(RegionQuery._resolve_regions, info, **kwargs)
 
 def region_resolver(manager_method, **kwargs):
     """
@@ -102,9 +132,8 @@ def region_resolver(manager_method, **kwargs):
     """
 
     q_expressions = process_filter_kwargs(get_region_model(), **R.merge(dict(deleted__isnull=True), kwargs))
-    return getattr(get_region_model().objects, manager_method)(
-        *q_expressions
-    )
+    queryset = warn_unindexed_json_filters(get_region_model().objects.filter(*q_expressions))
+    return getattr(queryset, manager_method)()
 
 
 region_mutation_config = dict(
@@ -131,18 +160,11 @@ class UpsertRegion(Mutation):
         if deleted_region_response:
             return deleted_region_response
 
-        # We must merge in existing region.data if we are updating data
-        if R.has('id', region_data) and R.has('data', region_data):
-            # New data gets priority, but this is a deep merge.
-            region_data['data'] = R.merge_deep(
-                Region.objects.get(id=region_data['id']).data,
-                region_data['data']
-            )
-
         # Make sure that all props are unique that must be, either by modifying values or erring.
         modified_region_data = enforce_unique_props(region_fields, region_data)
         update_or_create_values = input_type_parameters_for_update_or_create(region_fields, modified_region_data)
-        region, created = update_or_create_with_revision(Region, update_or_create_values)
+        # If we are updating data, it's deep merged into the existing region.data. New data gets priority
+        region, created = update_or_create_with_revision_and_jsonb_patch(Region, update_or_create_values)
 
         return UpsertRegion(region=region)
 
@@ -185,3 +207,9 @@ graphql_query_regions_paginated = graphql_query(
     region_paginated_fields,
     'regionsPaginated'
 )
+
+graphql_query_regions_connection = graphql_query(
+    RegionConnectionType,
+    region_connection_fields,
+    'regionsConnection'
+)
@@ -1,13 +1,19 @@
+import json
 import logging
+from types import SimpleNamespace
 
 from django.core.management import call_command
+from graphql import parse
 from rescape_python_helpers import ramda as R
 
 from rescape_graphene import client_for_testing
 import pytest
+import reversion
 from reversion.models import Version
 
 from rescape_region.models import Region
+from rescape_region.models.revision_mixin import prefetch_revision_metadata, selects_revision_metadata, \
+    REVISION_COLUMNS
 from rescape_region.schema_models.schema import create_default_schema
 from rescape_graphene.graphql_helpers.schema_validating_helpers import quiz_model_query, quiz_model_mutation_create, \
     quiz_model_mutation_update
@@ -23,6 +29,15 @@ omit_props = ['createdAt', 'updatedAt']
 schema = create_default_schema()
 
 
+def resolve_info(query):
+    # The parts of the ResolveInfo of the query's first field that selects_revision_metadata reads
+    document = parse(query)
+    return SimpleNamespace(
+        field_asts=R.head(document.definitions).selection_set.selections[:1],
+        fragments={definition.name.value: definition for definition in document.definitions[1:]}
+    )
+
+
 @pytest.mark.django_db
 class RegionSchemaTestCase(TestCase):
     client = None
@@ -132,3 +147,91 @@ class RegionSchemaTestCase(TestCase):
             id=R.item_str_path('data.updateRegion.region.id', update_result)
         ))
         assert len(versions) == 2
+
+    def test_prefetch_revision_metadata(self):
+        for region in self.regions:
+            # Give each region two versions
+            for name in [region.name, f'{region.name} Updated']:
+                with reversion.create_revision():
+                    region.name = name
+                    region.save()
+
+        expected = R.map(
+            lambda region: [region.created_at, region.updated_at, region.version_number, region.revision_id],
+            Region.objects.filter(id__in=R.map(R.prop('id'), self.regions)).order_by('id')
+        )
+        # One aggregate query and one query for the initial and latest versions, plus the regions query
+        with self.assertNumQueries(3):
+            regions = prefetch_revision_metadata(
+                Region.objects.filter(id__in=R.map(R.prop('id'), self.regions)).order_by('id')
+            )
+            actual = R.map(
+                lambda region: [region.created_at, region.updated_at, region.version_number, region.revision_id],
+                regions
+            )
+        assert actual == expected
+        assert R.map(lambda region: region.version_number, regions) == [2] * len(self.regions)
+
+        # Without revisionId in the selections the queryset is returned unqueried
+        queryset = Region.objects.filter(id__in=R.map(R.prop('id'), self.regions))
+        with self.assertNumQueries(0):
+            assert prefetch_revision_metadata(queryset, resolve_info('query { regions { id name } }')) is queryset
+
+    def test_selects_revision_metadata(self):
+        assert not selects_revision_metadata(resolve_info('query { regions { id name data { locations } } }'))
+        assert selects_revision_metadata(resolve_info('query { regions { id revisionId } }'))
+        assert selects_revision_metadata(resolve_info('query { regionsPaginated { objects { revisionId } } }'))
+        assert selects_revision_metadata(resolve_info('query { regionsConnection { edges { node { revisionId } } } }'))
+        assert selects_revision_metadata(resolve_info(
+            'query { regions { ...regionFields } } fragment regionFields on RegionType { revisionId }'
+        ))
+
+    def test_revision_columns_of_pre_existing_rows(self):
+        region = self.regions[0]
+        # Saves without a revision maintain the dates only
+        assert region.created_at and region.updated_at and region.version_number is None
+        # Saving twice in one revision records one version
+        with reversion.create_revision():
+            region.save()
+            region.save()
+        with reversion.create_revision():
+            region.name = f'{region.name} Updated'
+            region.save()
+        versions = list(Version.objects.get_for_object(region))
+        assert Region.objects.get(id=region.id).version_number == len(versions) == 2
+
+        # Remove the columns from the versions, like versions serialized before the columns existed
+        for version in versions:
+            serialized = json.loads(version.serialized_data)
+            for column in REVISION_COLUMNS:
+                serialized[0]['fields'].pop(column, None)
+            version.serialized_data = json.dumps(serialized)
+            version.save()
+
+        # Resolve the historical instances like the versioned types of rescape_graphene
+        historical = []
+        for version in Version.objects.get_for_object(region):
+            instance = version._object_version.object
+            instance._version = version
+            historical.append(instance)
+        assert R.map(lambda instance: instance.version_number, historical) == [2, 1]
+        assert R.map(lambda instance: instance.updated_at, historical) == \
+               R.map(lambda version: version.revision.date_created, versions)
+        assert all(instance.created_at == R.last(versions).revision.date_created for instance in historical)
+
+    def test_backfill_revision_columns(self):
+        region = self.regions[0]
+        for name in [region.name, f'{region.name} Updated']:
+            with reversion.create_revision():
+                region.name = name
+                region.save()
+        version_number = Region.objects.get(id=region.id).version_number
+        # Clear the columns like a row saved before they existed
+        Region.objects.filter(id=region.id).update(created_at=None, updated_at=None, version_number=None)
+
+        call_command('backfill_revision_columns', '--model', 'rescape_region.Region')
+        versions = Version.objects.get_for_object(region)
+        backfilled = Region.objects.get(id=region.id)
+        assert backfilled.version_number == version_number == 2
+        assert backfilled.created_at == R.last(list(versions)).revision.date_created
+        assert backfilled.updated_at == R.head(list(versions)).revision.date_created
@@ -15,6 +15,7 @@ from rescape_python_helpers import ramda as R
 
 from rescape_region.models import SearchJurisdiction
 from rescape_region.models.search_location import SearchLocation
+from rescape_region.models.revision_mixin import prefetch_revision_metadata
 from rescape_region.schema_models.jurisdiction.search_jurisdiction_schema import SearchJurisdictionType, \
     search_jurisdiction_fields
 from rescape_region.schema_models.location_street.search_location_street_data_schema import \
@@ -122,7 +123,7 @@ class SearchLocationQuery(ObjectType):
         return search_location_resolver('filter', **kwargs)
 
     def resolve_search_locations(self, info, **kwargs):
-        return search_location_resolver('filter', **kwargs)
+        return prefetch_revision_metadata(search_location_resolver('filter', **kwargs), info)
 
 
 def search_location_resolver(manager_method, **kwargs):
@@ -1,7 +1,8 @@
 from graphene import ObjectType, Field
-from rescape_graphene import resolver_for_dict_field, model_resolver_for_dict_field, type_modify_fields
+from rescape_graphene import resolver_for_dict_field, type_modify_fields
 
 from rescape_region.models.search_location import SearchLocation
+from rescape_region.schema_models.model_loaders import model_loader_resolver_for_dict_field
 from rescape_region.schema_models.search.search_location_schema import search_location_fields, SearchLocationType
 from rescape_region.schema_models.user_state.user_state_data_schema import ActivityDataType, \
     activity_data_fields
@@ -23,7 +24,7 @@ user_search_location_data_fields = dict(
         # References the model class
         type_modifier=lambda *type_and_args: Field(
             *type_and_args,
-            resolver=model_resolver_for_dict_field(SearchLocation)
+            resolver=model_loader_resolver_for_dict_field(SearchLocation)
         )
     ),
     # Indicates if this SearchLocation is active for the user
@@ -13,7 +13,9 @@ from rescape_graphene.schema_models.django_object_type_revisioned_mixin import r
     DjangoObjectTypeRevisionedMixin
 from rescape_python_helpers import ramda as R
 
+from rescape_region.helpers.resolver_cache import cached_resolver
 from rescape_region.models.settings import Settings
+from rescape_region.models.revision_mixin import prefetch_revision_metadata
 from rescape_region.schema_models.scope.region.region_schema import RegionType
 from .settings_data_schema import SettingsDataType, settings_data_fields
 
@@ -59,12 +61,14 @@ class SettingsQuery(ObjectType):
         **top_level_allowed_filter_arguments(settings_fields, RegionType)
     )
 
+    @cached_resolver(Settings)
     def resolve_settings(self, info, **kwargs):
         q_expressions = process_filter_kwargs(Settings, **R.merge(dict(deleted__isnull=True), kwargs))
 
-        return Settings.objects.filter(
+        # Cached results must be lists
+        return list(prefetch_revision_metadata(Settings.objects.filter(
             *q_expressions
-        )
+        ), info))
 
 
 class UpsertSettings(Mutation):
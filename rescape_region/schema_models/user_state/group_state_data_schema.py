@@ -2,7 +2,10 @@ from rescape_python_helpers import ramda as R
 from rescape_graphene import resolver_for_dict_list, type_modify_fields
 from graphene import ObjectType, List
 
+from rescape_region.schema_models.class_config import memoize_by_class_config
 
+
+@memoize_by_class_config
 def group_state_data_fields(class_config):
     return dict(
         group_regions=dict(
@@ -15,6 +18,7 @@ def group_state_data_fields(class_config):
     )
 
 
+@memoize_by_class_config
 def GroupStateDataType(class_config):
     return type(
         'GroupStateDataType',
@@ -13,6 +13,8 @@ from rescape_graphene.schema_models.django_object_type_revisioned_mixin import r
 from rescape_python_helpers import ramda as R
 
 from rescape_region.models import GroupState
+from rescape_region.models.revision_mixin import prefetch_revision_metadata
+from rescape_region.schema_models.class_config import memoize_by_class_config
 from rescape_region.schema_models.user_state.group_state_data_schema import GroupStateDataType, group_state_data_fields
 
 def create_group_state_mutation(group_state_config):
@@ -34,13 +36,14 @@ def create_group_state_query(group_state_config):
         def resolve_group_states(self, info, **kwargs):
             q_expressions = process_filter_kwargs(GroupState, **R.merge(dict(deleted__isnull=True), kwargs))
 
-            return R.prop('model_class', group_state_config).objects.filter(
+            return prefetch_revision_metadata(R.prop('model_class', group_state_config).objects.filter(
                 *q_expressions
-            )
+            ), info)
 
     return GroupStateQuery
 
 
+@memoize_by_class_config
 def create_group_state_query_and_mutation_classes(class_config):
     group_state_config = create_group_state_config(class_config)
     return dict(
@@ -49,6 +52,7 @@ def create_group_state_query_and_mutation_classes(class_config):
     )
 
 
+@memoize_by_class_config
 def create_group_state_config(class_config):
     """
         Creates the GroupStateType based on specific class_config
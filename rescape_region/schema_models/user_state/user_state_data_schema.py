@@ -1,10 +1,12 @@
 from graphene import ObjectType, Float, List, Field, Int, Boolean
 from rescape_graphene import resolver_for_dict_field, \
-    resolver_for_dict_list, model_resolver_for_dict_field, type_modify_fields, FeatureCollectionDataType
+    resolver_for_dict_list, type_modify_fields, FeatureCollectionDataType
 from rescape_graphene.schema_models.geojson.types.feature_collection import feature_collection_data_type_fields
 from rescape_python_helpers import ramda as R
 
+from rescape_region.schema_models.class_config import memoize_by_class_config
 from rescape_region.schema_models.mapbox.mapbox_data_schema import MapboxDataType, mapbox_data_fields
+from rescape_region.schema_models.model_loaders import model_loader_resolver_for_dict_field
 
 activity_data_fields = dict(
     isActive=dict(type=Boolean)
@@ -17,6 +19,7 @@ ActivityDataType = type(
 )
 
 
+@memoize_by_class_config
 def user_global_data_fields(class_config):
     return dict(
         # The mapbox state for the user's Global settings
@@ -32,6 +35,7 @@ def user_global_data_fields(class_config):
 # References the Global instance, dictating settings imposed on or chosen by a user globally
 # to which they have some level of access. This also adds settings like mapbox that are particular to the User's use
 # of the Region but that the Region itself doesn't care about
+@memoize_by_class_config
 def UserGlobalDataType(class_config):
     return type(
         'UserGlobalDataType',
@@ -63,6 +67,7 @@ def user_search_field_for_user_state_scopes(user_search_graphene_class, user_sea
     )
 
 
+@memoize_by_class_config
 def user_region_data_fields(class_config):
     region_class_config = R.prop('region', class_config)
     additional_user_scope_schemas = R.prop('additional_user_scope_schemas', class_config)\
@@ -76,7 +81,7 @@ def user_region_data_fields(class_config):
             fields=R.prop('graphene_fields', region_class_config),
             type_modifier=lambda *type_and_args: Field(
                 *type_and_args,
-                resolver=model_resolver_for_dict_field(R.prop('model_class', region_class_config))
+                resolver=model_loader_resolver_for_dict_field(R.prop('model_class', region_class_config))
             )
         ),
         # The mapbox state for the user's use of this Region
@@ -104,6 +109,7 @@ def user_region_data_fields(class_config):
 # References a Region model instance, dictating settings imposed on or chosen by a user for a particular Region
 # to which they have some level of access. This also adds settings like mapbox that are particular to the User's use
 # of the Region but that the Region itself doesn't care about
+@memoize_by_class_config
 def UserRegionDataType(class_config):
     return type(
         'UserRegionDataType',
@@ -112,6 +118,7 @@ def UserRegionDataType(class_config):
     )
 
 
+@memoize_by_class_config
 def user_project_data_fields(class_config):
     project_class_config = R.prop('project', class_config)
     location_class_config = R.prop('location', class_config)
@@ -126,7 +133,7 @@ def user_project_data_fields(class_config):
             fields=R.prop('graphene_fields', project_class_config),
             type_modifier=lambda *type_and_args: Field(
                 *type_and_args,
-                resolver=model_resolver_for_dict_field(R.prop('model_class', project_class_config))
+                resolver=model_loader_resolver_for_dict_field(R.prop('model_class', project_class_config))
             )
         ),
         # The mapbox state for the user's use of this Project
@@ -160,6 +167,7 @@ def user_project_data_fields(class_config):
 # References a Project model instance, dictating settings imposed on or chosen by a user for a particular Project
 # to which they have some level of access. This also adds settings like mapbox that are particular to the User's use
 # of the Project but that the Project itself doesn't care about
+@memoize_by_class_config
 def UserProjectDataType(class_config):
     return type(
         'UserProjectDataType',
@@ -169,6 +177,7 @@ def UserProjectDataType(class_config):
 
 
 # User State for their use of Regions, Projects, etc
+@memoize_by_class_config
 def user_state_data_fields(class_config):
 
 
@@ -195,6 +204,7 @@ def user_state_data_fields(class_config):
     )
 
 
+@memoize_by_class_config
 def UserStateDataType(class_config):
     return type(
         'UserStateDataType',
@@ -0,0 +1,59 @@
+from rescape_python_helpers import ramda as R
+
+from rescape_region.helpers.structural_merge import merge_structurally, plain, override_non_null_list
+
+# The user scope lists of UserState.data and the key of the scope instance of their items
+scope_key_lookup = dict(userProjects='project', userRegions='region')
+
+
+def user_scope_instances_by_id(user_scope_key, user_state_data):
+    # Resolve the user scope instances
+    return R.from_pairs(
+        R.map(
+            lambda user_scope: [
+                R.item_path_or(None, [scope_key_lookup[user_scope_key], 'id'], user_scope),
+                user_scope
+            ],
+            R.prop_or([], user_scope_key, user_state_data)
+        )
+    )
+
+
+def merge_user_scopes_by_id(user_scope_key, existing_data, new_data):
+    """
+        Merges the user scopes of new_data into those of existing_data that have the same scope instance id,
+        keeping the existing user scopes that new_data lacks. Lists within the user scopes are replaced unless empty
+    :param user_scope_key: 'userProjects' or 'userRegions'
+    :param existing_data: The existing UserState.data
+    :param new_data: The new UserState.data
+    :return: The merged list of user scopes, existing ones first
+    """
+    existing_user_scopes_by_id = user_scope_instances_by_id(user_scope_key, existing_data)
+    merged_user_scopes_by_id = dict(existing_user_scopes_by_id)
+    for id, user_scope in user_scope_instances_by_id(user_scope_key, new_data).items():
+        merged_user_scopes_by_id[id] = merge_structurally(
+            existing_user_scopes_by_id[id], user_scope, override_non_null_list
+        ) if id in existing_user_scopes_by_id else plain(user_scope)
+    return list(merged_user_scopes_by_id.values())
+
+
+def merge_user_state_data(existing_data, new_data, merge_user_scopes=False):
+    """
+        Merges the data of an UpsertUserState mutation into the existing UserState.data in a single pass with
+        merge_structurally, so the unchanged parts of large states are shared with the existing data, not copied.
+        Dicts are merged and lists are replaced
+    :param existing_data: The existing UserState.data or None when creating
+    :param new_data: The new data
+    :param merge_user_scopes: Default False. If True, as when an update omits userProjects or userRegions,
+    the user scopes of each are instead merged by merge_user_scopes_by_id, so an update can change one user scope
+    without repeating the others
+    :return: The merged data
+    """
+    if existing_data is None:
+        return plain(new_data)
+    if not merge_user_scopes:
+        return merge_structurally(existing_data, new_data)
+    merged_data = merge_structurally(existing_data, R.omit(R.keys(scope_key_lookup), new_data))
+    for user_scope_key in scope_key_lookup:
+        merged_data[user_scope_key] = merge_user_scopes_by_id(user_scope_key, existing_data, new_data)
+    return merged_data
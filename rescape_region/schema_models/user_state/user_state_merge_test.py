@@ -0,0 +1,32 @@
+from snapshottest import TestCase
+
+from rescape_region.schema_models.user_state.user_state_merge import merge_user_state_data
+
+existing_data = dict(
+    userRegions=[
+        dict(region=dict(id=1), mapbox=dict(viewport=dict(zoom=7)), userSearch=dict(userSearchLocations=[])),
+        dict(region=dict(id=2), mapbox=dict(viewport=dict(zoom=8)))
+    ],
+    userProjects=[dict(project=dict(id=1), mapbox=dict(viewport=dict(zoom=9)))]
+)
+
+
+class UserStateMergeTestCase(TestCase):
+
+    def test_merge_user_state_data(self):
+        new_data = dict(userRegions=[dict(region=dict(id=1), mapbox=dict(viewport=dict(zoom=15)))])
+        # Lists replace the existing ones
+        assert merge_user_state_data(existing_data, new_data) == dict(
+            userRegions=new_data['userRegions'],
+            userProjects=existing_data['userProjects']
+        )
+
+        # User scopes merge by id and keep the existing ones that the update omits
+        merged = merge_user_state_data(existing_data, new_data, merge_user_scopes=True)
+        assert merged['userRegions'] == [
+            dict(region=dict(id=1), mapbox=dict(viewport=dict(zoom=15)), userSearch=dict(userSearchLocations=[])),
+            existing_data['userRegions'][1]
+        ]
+        assert merged['userRegions'][1] is existing_data['userRegions'][1]
+        assert merged['userProjects'] == existing_data['userProjects']
+        assert existing_data['userRegions'][0]['mapbox']['viewport']['zoom'] == 7
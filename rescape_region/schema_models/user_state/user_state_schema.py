@@ -1,10 +1,8 @@
-import copy
 from collections import namedtuple
 
 import graphene
-from deepmerge import Merger
-from deepmerge.strategy.dict import DictStrategies
-from deepmerge.strategy.list import ListStrategies
+import reversion
+from django.db import transaction
 from graphene import Field, Mutation, InputObjectType, ObjectType
 from graphene_django.types import DjangoObjectType
 from graphql_jwt.decorators import login_required
@@ -14,7 +12,7 @@ from rescape_graphene import input_type_fields, REQUIRE, DENY, CREATE, \
     enforce_unique_props, user_fields
 from rescape_graphene.graphql_helpers.json_field_helpers import resolve_selections, pick_selections
 from rescape_graphene.graphql_helpers.mutate_related_helpers import validate_and_mutate_scope_instances
-from rescape_graphene.graphql_helpers.schema_helpers import merge_data_fields_on_update, update_or_create_with_revision, \
+from rescape_graphene.graphql_helpers.schema_helpers import update_or_create_with_revision, \
     top_level_allowed_filter_arguments, process_filter_kwargs
 from rescape_graphene.schema_models.django_object_type_revisioned_mixin import reversion_and_safe_delete_types, \
     DjangoObjectTypeRevisionedMixin
@@ -22,40 +20,15 @@ from rescape_python_helpers import ramda as R
 
 from rescape_region.model_helpers import get_region_model, get_project_model, get_search_location_schema
 from rescape_region.models import UserState
+from rescape_region.models.json_indexes import warn_unindexed_json_filters
+from rescape_region.models.revision_mixin import prefetch_revision_metadata
+from rescape_region.schema_models.class_config import memoize_by_class_config
 from rescape_region.schema_models.scope.project.project_schema import project_fields
 from rescape_region.schema_models.user_state.user_state_data_schema import UserStateDataType, user_state_data_fields
+from rescape_region.schema_models.user_state.user_state_merge import merge_user_state_data
 
 
-class MyListStrategies(ListStrategies):
-    @staticmethod
-    def strategy_override_non_null(config, path, base, nxt):
-        """ use the list nxt. """
-        return nxt if nxt else base
-
-
-class MyMerger(Merger):
-    PROVIDED_TYPE_STRATEGIES = {
-        list: MyListStrategies,
-        dict: DictStrategies
-    }
-    # def __init__(self,
-    #              type_strategies,
-    #              fallback_strategies,
-    #              type_conflict_strategies):
-    #     self._fallback_strategy = FallbackStrategies(fallback_strategies)
-    #
-    #     expanded_type_strategies = []
-    #     for typ, strategy in type_strategies:
-    #         if typ in self.PROVIDED_TYPE_STRATEGIES:
-    #             strategy = self.PROVIDED_TYPE_STRATEGIES[typ](strategy)
-    #         expanded_type_strategies.append((typ, strategy))
-    #     self._type_strategies = expanded_type_strategies
-    #
-    #     self._type_conflict_strategy = TypeConflictStrategies(
-    #         type_conflict_strategies
-    #     )
-
-
+@memoize_by_class_config
 def create_user_state_query_and_mutation_classes(class_config):
     user_state_config = create_user_state_config(class_config)
     return dict(
@@ -102,9 +75,9 @@ def create_user_state_query(user_state_config):
                 ])
             )
 
-            return UserState.objects.filter(
+            return prefetch_revision_metadata(warn_unindexed_json_filters(UserState.objects.filter(
                 *q_expressions
-            )
+            )), info)
 
     return UserStateQuery
 
@@ -133,22 +106,7 @@ def resolver_for_data_field(resource, context, **kwargs):
     return pick_selections(selections, data) if passes else namedtuple('DataTuple', [])()
 
 
-scope_key_lookup = dict(userProjects='project', userRegions='region')
-
-
-def user_scope_instances_by_id(user_scope_key, user_state_data):
-    # Resolve the user scope instances
-    return R.from_pairs(
-        R.map(
-            lambda user_scope: [
-                R.item_path_or(None, [scope_key_lookup[user_scope_key], 'id'], user_scope),
-                user_scope
-            ],
-            R.prop_or([], user_scope_key, user_state_data)
-        )
-    )
-
-
+@memoize_by_class_config
 def create_user_state_config(class_config):
     """
         Creates the UserStateType based on specific class_config
@@ -320,6 +278,7 @@ def create_user_state_config(class_config):
         """
         user_state = Field(UserStateType)
 
+        @transaction.atomic
         def mutate(self, info, user_state_data=None):
             """
                 Update or create the user state
@@ -328,13 +287,22 @@ def create_user_state_config(class_config):
             :return:
             """
 
+            # id or user.id can be used to identify the existing instance
+            id_props = R.compact_dict(
+                dict(
+                    id=R.prop_or(None, 'id', user_state_data),
+                    user_id=R.item_str_path_or(None, 'user.id', user_state_data)
+                )
+            )
+            # The only read of the existing instance, locked until the update commits so concurrent mutations
+            # of the same user state merge into each other's results
+            existing = UserState.objects.select_for_update().filter(**id_props).first() if id_props else None
+            if R.prop_or(None, 'id', user_state_data) and not existing:
+                raise UserState.DoesNotExist(f'UserState matching id {user_state_data["id"]} does not exist')
+
             # Check that all the scope instances in user_state.data exist. We permit deleted instances for now.
+            # new_data isn't copied, since neither this nor the merge modifies it
             new_data = R.prop_or({}, 'data', user_state_data)
-            # Copy since Graphene reuses this data
-            copied_new_data = copy.deepcopy(new_data)
-            old_user_state_data = UserState.objects.get(
-                id=user_state_data['id']
-            ).data if R.prop_or(None, 'id', user_state_data) else None
 
             # Inspect the data and find all scope instances within UserState.data
             # This includes userRegions[*].region, userProject[*].project and within userRegions and userProjects
@@ -342,89 +310,42 @@ def create_user_state_config(class_config):
             # in addition
             updated_new_data = validate_and_mutate_scope_instances(
                 user_state_scope_instances_config,
-                copied_new_data
+                new_data
             )
 
             # If either userProjects or userRegions are null, it means those scope instances aren't part
-            # of the update, so merge in the old values
-            if R.prop_or(None, 'id', user_state_data) and R.any_satisfy(
+            # of the update, so the user scopes are merged by id with the existing ones, which remain
+            merged_data = merge_user_state_data(
+                existing.data if existing else None,
+                updated_new_data,
+                merge_user_scopes=R.prop_or(None, 'id', user_state_data) and R.any_satisfy(
                     lambda user_scope_key: not R.prop_or(None, user_scope_key, updated_new_data),
                     ['userProjects', 'userRegions']
-            ):
-                # The special update case where one userScope collection is null,
-                # indicates that we are only updating one userScope object. The rest
-                # should remain the same and not be removed
-                for user_scope_key in ['userProjects', 'userRegions']:
-                    # Database values
-                    old_user_scopes_by_id = user_scope_instances_by_id(
-                        user_scope_key,
-                        old_user_state_data
-                    )
-                    # New values with updates applied
-                    new_user_scopes_by_id = user_scope_instances_by_id(
-                        user_scope_key,
-                        updated_new_data
-                    )
-                    # Prefer the old over the new, merging all objects but overriding lists
-                    # We override lists because a non-null list always replaces the old list in the database
-                    updated_new_data[user_scope_key] = R.values(R.merge_deep(
-                        old_user_scopes_by_id,
-                        new_user_scopes_by_id,
-                        MyMerger(
-                            # pass in a list of tuples,with the
-                            # strategies you are looking to apply
-                            # to each type.
-                            [
-                                (list, ["override_non_null"]),
-                                (dict, ["merge"])
-                            ],
-                            # next, choose the fallback strategies,
-                            # applied to all other types:
-                            ["override"],
-                            # finally, choose the strategies in
-                            # the case where the types conflict:
-                            ["override"]
-                        )
-                    ))
-
-            # Update user_state_data the updated data
-            modified_user_state_data = R.merge(user_state_data, dict(data=updated_new_data))
-
-            # id or user.id can be used to identify the existing instance
-            id_props = R.compact_dict(
-                dict(
-                    id=R.prop_or(None, 'id', modified_user_state_data),
-                    user_id=R.item_str_path_or(None, 'user.id', modified_user_state_data)
                 )
             )
 
-            def fetch_and_merge(modified_user_state_data, props):
-                existing = UserState.objects.filter(**props)
-                # If the user doesn't have a user state yet
-                if not R.length(existing):
-                    return modified_user_state_data
-
-                return merge_data_fields_on_update(
-                    ['data'],
-                    R.head(existing),
-                    # Merge existing's id in case it wasn't in user_state_data
-                    R.merge(modified_user_state_data, R.pick(['id'], existing))
-                )
-
-            modified_data = R.if_else(
-                R.compose(R.length, R.keys),
-                lambda props: fetch_and_merge(modified_user_state_data, props),
-                lambda _: modified_user_state_data
-            )(id_props)
+            # Update user_state_data with the merged data and existing's id in case it wasn't in user_state_data
+            modified_user_state_data = R.merge(
+                user_state_data,
+                R.merge(dict(data=merged_data), dict(id=existing.id) if existing else {})
+            )
 
             update_or_create_values = input_type_parameters_for_update_or_create(
                 user_state_fields,
                 # Make sure that all props are unique that must be, either by modifying values or erring.
                 enforce_unique_props(
                     user_state_fields,
-                    modified_data)
+                    modified_user_state_data)
             )
 
+            if existing:
+                # Update the locked instance rather than reading it again with update_or_create
+                with reversion.create_revision():
+                    for prop, value in R.prop_or({}, 'defaults', update_or_create_values).items():
+                        setattr(existing, prop, value)
+                    existing.save()
+                return UpsertUserState(user_state=existing)
+
             user_state, created = update_or_create_with_revision(UserState, update_or_create_values)
             return UpsertUserState(user_state=user_state)
 
@@ -3,6 +3,8 @@ from copy import deepcopy
 
 import pytest
 from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rescape_graphene import client_for_testing
 from rescape_graphene.graphql_helpers.schema_validating_helpers import quiz_model_query, quiz_model_mutation_create, \
     quiz_model_mutation_update
@@ -274,6 +276,28 @@ class UserStateSchemaTestCase(TestCase):
         ))
         assert len(versions) == 2
 
+    def test_query_references_batched(self):
+        region_table = get_region_model()._meta.db_table
+        project_table = get_project_model()._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.execute('''query {
+                userStates {
+                    id
+                    data {
+                        userRegions { region { id name } }
+                        userProjects { project { id name } }
+                    }
+                }
+            }''')
+        assert not R.prop_or(None, 'errors', result), R.dump_json(R.prop_or(None, 'errors', result))
+
+        def queries_of_table(table):
+            return R.filter(lambda query: f'FROM "{table}"' in query['sql'], queries.captured_queries)
+
+        # Every referenced region and project is loaded by one id__in query of its model
+        assert len(queries_of_table(region_table)) == 1
+        assert len(queries_of_table(project_table)) == 1
+
     # def test_delete(self):
     #     self.assertMatchSnapshot(self.client.execute('''{
     #         user_states {
@@ -1,10 +1,12 @@
 from django.conf.urls import url
 from django.urls import include
 from django.views.decorators.csrf import csrf_exempt
-from rescape_graphene.graphql_helpers.views import SafeGraphQLView
 from rest_framework.routers import DefaultRouter
 from django.contrib import admin
 
+from rescape_region.views import ResourceRawDataView, GraphQLInstrumentationView, PersistedQueryGraphQLView, \
+    GraphQLResolverCacheStatsView
+
 router = DefaultRouter()
 
 urlpatterns = [
@@ -12,5 +14,12 @@ urlpatterns = [
     url('^', include('django.contrib.auth.urls')),
     url(r'^admin/', admin.site.urls),
     url(r'^admin/', include('loginas.urls')),
-    url(r'^graphql', csrf_exempt(SafeGraphQLView.as_view(graphiql=True))),
+    # Histograms of the top-level GraphQL fields and resolver cache counts.
+    # Must precede the graphql pattern, which matches them as a prefix
+    url(r'^graphql-instrumentation/?$', GraphQLInstrumentationView.as_view()),
+    url(r'^graphql-resolver-cache/?$', GraphQLResolverCacheStatsView.as_view()),
+    # Parsed and validated documents are cached, and clients can send the hash of a cached query instead of the query
+    url(r'^graphql', csrf_exempt(PersistedQueryGraphQLView.as_view(graphiql=True))),
+    # Streams a csv file into Resource.data.rawData and regenerates the Sankey graph
+    url(r'^resources/(?P<id>\d+)/raw-data/?$', ResourceRawDataView.as_view()),
 ]
@@ -0,0 +1,95 @@
+import codecs
+
+from django.shortcuts import get_object_or_404
+from graphql import GraphQLError
+from graphql.execution import ExecutionResult
+from rescape_graphene.graphql_helpers.views import SafeGraphQLView
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from rescape_region.helpers.persisted_queries import persisted_query_backend, persisted_query_hash, query_hash
+from rescape_region.helpers.resolver_cache import resolver_cache_stats
+from rescape_region.helpers.resource_raw_data_helpers import ingest_resource_raw_data, raw_data_summary
+from rescape_region.helpers.sankey_helpers import DEFAULT_RAW_DATA_CHUNK_SIZE
+from rescape_region.middleware.instrumentation_middleware import graphql_instrumentation_histograms
+from rescape_region.models.resource import Resource
+
+
+class ResourceRawDataView(APIView):
+    """
+        Replaces Resource.data.rawData with an uploaded csv file and regenerates Resource.data.graph.
+        This avoids sending large raw data as a list of strings in the resourceData.data.rawData GraphQL input.
+        POST the file as the 'file' field of a multipart form. Query params:
+            header: 'true' to skip the first row of the file
+            chunkSize: The number of rows to convert to nodes at a time
+        Django writes large uploads to a temporary file, which is then read a chunk of rows at a time
+    """
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, id):
+        resource = get_object_or_404(Resource, id=id)
+        upload = request.data.get('file')
+        if not upload:
+            return Response(dict(error="Expected a csv file in the 'file' field"), status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunk_size = int(request.query_params.get('chunkSize', DEFAULT_RAW_DATA_CHUNK_SIZE))
+        except ValueError:
+            return Response(dict(error='chunkSize must be an integer'), status=status.HTTP_400_BAD_REQUEST)
+        resource = ingest_resource_raw_data(
+            resource,
+            # Iterating an uploaded file gives lines of bytes
+            codecs.iterdecode(upload, upload.charset or 'utf-8'),
+            max(1, chunk_size),
+            request.query_params.get('header') == 'true'
+        )
+        return Response(raw_data_summary(resource))
+
+
+class GraphQLInstrumentationView(APIView):
+    """
+        Serves the in-process histograms of the wall time, SQL time and query count of each top-level GraphQL field
+        and of the response size of the requests recorded by GraphQLInstrumentationMiddleware. The histograms are
+        per process, so scrape each worker process. Staff only
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(graphql_instrumentation_histograms())
+
+
+class GraphQLResolverCacheStatsView(APIView):
+    """
+        Serves the hits, misses and hit ratio of each field cached with cached_resolver and the invalidations
+        of each model. The counts are per process. Staff only
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(resolver_cache_stats())
+
+
+class PersistedQueryGraphQLView(SafeGraphQLView):
+    """
+        SafeGraphQLView that serves persisted queries. Clients send the sha256 hash of the query in
+        extensions.persistedQuery.sha256Hash, as in Apollo's automatic persisted queries, with or without the query.
+        Documents are parsed and validated once and then served from the LRU cache of persisted_query_backend.
+        A hash that isn't cached is answered with a PersistedQueryNotFound error, after which the client resends
+        the hash with the query, which is parsed, validated and cached. Requests without a hash are cached the same
+        way by the hash of their query
+    """
+
+    def get_backend(self, request):
+        return persisted_query_backend
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        hash = persisted_query_hash(request, data)
+        if hash:
+            if query and query_hash(query) != hash:
+                return ExecutionResult(errors=[GraphQLError('provided sha does not match query')], invalid=True)
+            query = query or persisted_query_backend.query_for_hash(self.schema, hash)
+            if not query:
+                return ExecutionResult(errors=[GraphQLError('PersistedQueryNotFound')], invalid=True)
+        return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
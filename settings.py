@@ -53,7 +53,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware'
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'rescape_region.middleware.instrumentation_middleware.GraphQLInstrumentationMiddleware'
 ]
 
 DATABASES = {
@@ -108,9 +109,22 @@ CACHES = {
     'db': {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'db_cache',
+    },
+    # Generated Sankey graphs keyed by the fingerprint of their resource's data.
+    # LocMemCache evicts the least recently used graphs beyond MAX_ENTRIES
+    'sankey_graphs': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sankey-graphs',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100
+        }
     }
 }
 
+# The cache of rescape_region.helpers.sankey_graph_cache
+SANKEY_GRAPH_CACHE = 'sankey_graphs'
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -225,10 +239,36 @@ GRAPHENE = {
     'MIDDLEWARE': [
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
         # TODO This does not work
-        'rescape_region.middleware.debug_middleware.DebugMiddleware'
+        'rescape_region.middleware.debug_middleware.DebugMiddleware',
+        'rescape_region.middleware.instrumentation_middleware.InstrumentationMiddleware'
     ]
 }
 
+# See rescape_region.schema_models.schema.log_request_body. Lower SAMPLE_RATE in production
+GRAPHQL_REQUEST_LOG = {
+    'SAMPLE_RATE': 1.0,
+    'MAX_LOGGED_IDS': 100
+}
+
+# The number of parsed and validated GraphQL documents cached per process. See rescape_region.helpers.persisted_queries
+GRAPHQL_PERSISTED_QUERY_CACHE_SIZE = 256
+
+# Caches the results of the regions, settings and jurisdictions resolvers. See rescape_region.helpers.resolver_cache
+# Saves only invalidate the results in other processes if CACHE is shared by them, like Redis or Memcached.
+# The default LocMemCache is private to each process, so enabling with it also requires ALLOW_LOCAL_MEMORY_CACHE
+GRAPHQL_RESOLVER_CACHE = {
+    'ENABLED': False,
+    'CACHE': 'default',
+    'ALLOW_LOCAL_MEMORY_CACHE': False,
+    'TIMEOUT': 300
+}
+
+# See rescape_region.middleware.instrumentation_middleware
+GRAPHQL_INSTRUMENTATION = {
+    'PATH': '/graphql',
+    'QUERY_COUNT_THRESHOLD': 50
+}
+
 JWT_AUTH = {
     'JWT_ALLOW_REFRESH': True,
     'JWT_REFRESH_EXPIRATION_DELTA': datetime.timedelta(days=7)
@@ -40,6 +40,7 @@ setuptools.setup(
     install_requires=[
         'pyramda',
         'inflection',
-        'deepmerge'
+        'deepmerge',
+        'pandas'
     ],
 )